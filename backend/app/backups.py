@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import UTC, datetime
+
+import aiosqlite
+
+from . import metrics, readers, shards
+from .config import settings
+from .database import now_iso
+from .locks import file_lock
+from .storage import engine
+
+logger = logging.getLogger(__name__)
+
+# Online backups through SQLite's backup API. Each database (main, then the
+# shards) is copied BACKUP_PAGES_PER_STEP pages at a time with a pause of
+# BACKUP_STEP_SLEEP_MS between steps, from a read-only connection pinned to
+# one WAL snapshot: the copy is consistent as of its start and checkout
+# keeps committing meanwhile. (Unpinned, every commit would restart the
+# copy from the first page.) Every copy must pass `PRAGMA integrity_check`
+# before the set is published as BACKUP_DIR/<UTC timestamp>/; only the
+# newest BACKUP_KEEP sets are kept. Shards are snapshotted one by one, so a
+# set is consistent per file, not across files.
+#
+# The memory engine has no WAL to pin a snapshot in, so there each
+# database is copied in one step.
+
+NAME_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+class BackupBusy(RuntimeError):
+    """Another worker is taking a backup."""
+
+
+# Progress/report of the most recent backup run
+status: dict = {"status": "idle"}
+
+
+@contextmanager
+def _lock():
+    # One backup at a time across workers
+    with ExitStack() as stack:
+        try:
+            stack.enter_context(file_lock(os.path.join(settings.backup_dir, ".lock"), blocking=False))
+        except BlockingIOError:
+            raise BackupBusy("Another worker is taking a backup") from None
+        yield
+
+
+def _taken_at(name: str) -> datetime | None:
+    try:
+        return datetime.strptime(name, NAME_FORMAT).replace(tzinfo=UTC)
+    except ValueError:
+        return None  # Not a backup set (a `.partial` one, the lock file, ...)
+
+
+def backup_sets() -> list[str]:
+    """Names of the published backup sets, oldest first."""
+    try:
+        names = os.listdir(settings.backup_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        name
+        for name in names
+        if _taken_at(name) and os.path.isdir(os.path.join(settings.backup_dir, name))
+    )
+
+
+def list_sets() -> list[dict]:
+    sets = []
+    for name in reversed(backup_sets()):
+        directory = os.path.join(settings.backup_dir, name)
+        files = [
+            {"database": file, "bytes": os.path.getsize(os.path.join(directory, file))}
+            for file in sorted(os.listdir(directory))
+        ]
+        sets.append(
+            {
+                "name": name,
+                "path": directory,
+                "bytes": sum(file["bytes"] for file in files),
+                "files": files,
+            }
+        )
+    return sets
+
+
+async def _copy(path: str, target_path: str) -> dict:
+    pause = settings.backup_step_sleep_ms / 1000
+
+    def progress(_: int, remaining: int, total: int) -> None:
+        # Runs on the source connection's thread after every step; the
+        # `sleep` argument of backup() only applies when a step is busy
+        status["pages_remaining"], status["pages_total"] = remaining, total
+        if remaining:
+            time.sleep(pause)
+
+    started = time.perf_counter()
+    async with readers.connection(path) as source:
+        target = await aiosqlite.connect(target_path)
+        try:
+            await source.backup(
+                target,
+                pages=settings.backup_pages_per_step if engine.snapshot_reads else -1,
+                progress=progress,
+            )
+        finally:
+            await target.close()
+    copy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    check = await aiosqlite.connect(target_path)
+    try:
+        problems = [
+            row[0] for row in await (await check.execute("PRAGMA integrity_check")).fetchall()
+        ]
+    finally:
+        await check.close()
+    if problems != ["ok"]:
+        raise RuntimeError(f"Backup of {path} failed its integrity check: {problems[:5]}")
+    verify_seconds = time.perf_counter() - started
+
+    size = os.path.getsize(target_path)
+    mb_per_second = size / 1e6 / copy_seconds if copy_seconds else 0.0
+    metrics.observe("backups.copy_ms", copy_seconds * 1000)
+    metrics.observe("backups.mb_per_second", mb_per_second)
+    return {
+        "database": os.path.basename(target_path),
+        "bytes": size,
+        "copy_seconds": round(copy_seconds, 3),
+        "verify_seconds": round(verify_seconds, 3),
+        "mb_per_second": round(mb_per_second, 1),
+    }
+
+
+def _rotate(keep: int) -> None:
+    for name in backup_sets()[:-keep]:
+        shutil.rmtree(os.path.join(settings.backup_dir, name), ignore_errors=True)
+        logger.info("Removed old backup set %s", name)
+
+
+async def run_backup() -> dict:
+    """Copy and verify every database into a new backup set; returns its report."""
+    os.makedirs(settings.backup_dir, exist_ok=True)
+    with _lock():
+        # Sets left half-written by a crash are never published
+        for name in os.listdir(settings.backup_dir):
+            if name.endswith(".partial"):
+                shutil.rmtree(os.path.join(settings.backup_dir, name), ignore_errors=True)
+
+        name = datetime.now(UTC).strftime(NAME_FORMAT)
+        partial = os.path.join(settings.backup_dir, f"{name}.partial")
+        os.makedirs(partial)
+        started = time.perf_counter()
+        files = status["files"] = []
+        try:
+            for shard in await shards.covering():
+                files.append(
+                    await _copy(shard.path, os.path.join(partial, os.path.basename(shard.path)))
+                )
+            os.rename(partial, os.path.join(settings.backup_dir, name))
+        except BaseException:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+        _rotate(max(settings.backup_keep, 1))
+
+    seconds = time.perf_counter() - started
+    size = sum(file["bytes"] for file in files)
+    metrics.increment("backups.completed")
+    metrics.observe("backups.duration_ms", seconds * 1000)
+    logger.info("Backup %s: %d bytes in %.1fs", name, size, seconds)
+    return {
+        "name": name,
+        "path": os.path.join(settings.backup_dir, name),
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        "mb_per_second": round(size / 1e6 / seconds, 1) if seconds else 0.0,
+        "files": files,
+    }
+
+
+async def _run() -> None:
+    try:
+        status.update(await run_backup(), status="done")
+    except Exception as exc:
+        status.update(status="failed", error=str(exc))
+        metrics.increment("backups.failures")
+        if not isinstance(exc, BackupBusy):
+            logger.exception("Backup failed")
+    finally:
+        status["finished_at"] = now_iso()
+
+
+def start() -> dict:
+    """Start a backup in the background unless one is already running."""
+    if status["status"] != "running":
+        status.clear()
+        status.update(status="running", started_at=now_iso())
+        status["task"] = asyncio.create_task(_run())
+    return report()
+
+
+def report() -> dict:
+    return {k: v for k, v in status.items() if k != "task"}
+
+
+def _due_in() -> float:
+    sets = backup_sets()
+    if not sets:
+        return 0.0
+    age = (datetime.now(UTC) - _taken_at(sets[-1])).total_seconds()
+    return settings.backup_interval_seconds - age
+
+
+async def run() -> None:
+    """Take a backup whenever the newest set is BACKUP_INTERVAL_SECONDS old."""
+    while True:
+        # Never straight after startup, and never twice when workers race
+        await asyncio.sleep(max(_due_in(), 60.0))
+        if _due_in() <= 0 and status["status"] != "running":
+            start()
+            await status["task"]
@@ -0,0 +1,135 @@
+import base64
+import math
+from datetime import UTC
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+
+_public_keys: dict[int, ec.EllipticCurvePublicKey] = {}
+
+
+def _js_round(value: float) -> int:
+    # Matches JavaScript's Math.round (half up), unlike Python's round()
+    return math.floor(value + 0.5)
+
+
+# Every stored field of a sale, in signing order, per payment detail group
+_PAYMENT_GROUPS = {
+    "credit_card": ("card_number", "card_type", "expiry_month", "expiry_year"),
+    "swish": ("phone_number", "transaction_id"),
+    "mobile_pay": ("device_id", "transaction_token"),
+    "invoice": ("customer_email", "membership_number", "is_member"),
+}
+
+
+def _field(value) -> str:
+    # Length-prefixed (UTF-8 bytes), so no value can run into the next one
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        value = int(value)
+    text = str(value)
+    return f"{len(text.encode('utf-8'))}:{text}"
+
+
+def _ore(amount: float | None) -> int | None:
+    return None if amount is None else _js_round(amount * 100)
+
+
+def _group(obj, names: tuple[str, ...]) -> str:
+    if obj is None:
+        return "-"
+    return "+" + "".join(_field(getattr(obj, name)) for name in names)
+
+
+def canonical_batch(transactions) -> bytes:
+    """Canonical byte form of an offline batch that terminals sign.
+
+    A sequence of tokens covering every field that gets stored: a value is
+    `<UTF-8 byte length>:<text>`, a missing value `-`, and an optional group
+    of values `-` or `+` followed by its values. In order: "batch-v2", the
+    number of transactions, then per transaction idempotency_key, total_öre,
+    occurred_at (UTC epoch ms), the number of items, per item product_id,
+    name, quantity and price_öre, and the payment group: payment_type, the
+    credit_card, swish, mobile_pay and invoice groups (fields as in
+    _PAYMENT_GROUPS) and cash_tendered/cash_change in öre. Booleans are 1/0.
+
+    Amounts are integer öre (see money.to_ore) and timestamps are rounded to
+    UTC milliseconds so that the JavaScript and Python sides serialise
+    identically; frontend/src/App.jsx (`canonicalBatch`) must match.
+    """
+    tokens = [_field("batch-v2"), _field(len(transactions))]
+    for tx in transactions:
+        occurred_at = tx.occurred_at
+        if occurred_at.tzinfo is None:
+            occurred_at = occurred_at.replace(tzinfo=UTC)
+        tokens += [
+            _field(tx.idempotency_key),
+            _field(tx.total_ore),
+            _field(_js_round(occurred_at.timestamp() * 1000)),
+            _field(len(tx.items)),
+        ]
+        for it in tx.items:
+            tokens += [
+                _field(it.product_id),
+                _field(it.name),
+                _field(it.quantity),
+                _field(it.price_ore),
+            ]
+        payment = tx.payment
+        if payment is None:
+            tokens.append("-")
+            continue
+        tokens.append("+" + _field(payment.payment_type))
+        tokens += [
+            _group(getattr(payment, name), fields) for name, fields in _PAYMENT_GROUPS.items()
+        ]
+        tokens += [_field(_ore(payment.cash_tendered)), _field(_ore(payment.cash_change))]
+    return "".join(tokens).encode("utf-8")
+
+
+def cached_public_key(terminal_id: int) -> ec.EllipticCurvePublicKey | None:
+    return _public_keys.get(terminal_id)
+
+
+def cache_public_key(terminal_id: int, public_key_pem: str) -> ec.EllipticCurvePublicKey:
+    key = serialization.load_pem_public_key(
+        public_key_pem.encode("utf-8"), backend=default_backend()
+    )
+    _public_keys[terminal_id] = key
+    return key
+
+
+def forget_public_key(terminal_id: int) -> None:
+    _public_keys.pop(terminal_id, None)
+
+
+def forget_public_keys() -> None:
+    _public_keys.clear()
+
+
+def verify_batch(
+    public_key: ec.EllipticCurvePublicKey, transactions, signature_b64: str
+) -> bool:
+    """Check one ECDSA P-256/SHA-256 signature over the whole batch.
+
+    Accepts IEEE P1363 (r || s, as produced by Web Crypto) or DER signatures.
+    """
+    try:
+        signature = base64.b64decode(signature_b64)
+    except ValueError:
+        return False
+    if len(signature) == 64:
+        signature = encode_dss_signature(
+            int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big")
+        )
+    try:
+        public_key.verify(
+            signature, canonical_batch(transactions), ec.ECDSA(hashes.SHA256())
+        )
+    except (InvalidSignature, ValueError):
+        return False
+    return True
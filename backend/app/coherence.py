@@ -0,0 +1,60 @@
+from collections.abc import Awaitable, Callable
+
+import aiosqlite
+
+# In-process caches derived from the database (sealed months, payload
+# dictionaries, per-terminal keys) are invalidated across worker processes
+# through generation counters in `cache_generations`. Whoever changes the
+# underlying data bumps the counter in the same transaction; every process
+# compares generations when SQLite's `PRAGMA data_version` says another
+# connection has committed, and reloads what changed. Each database file
+# (the main one and every store shard) keeps its own generations.
+
+Handler = Callable[[aiosqlite.Connection, str], Awaitable[None]]
+
+_handlers: dict[str, Handler] = {}
+_seen: dict[tuple[str, str], int] = {}
+
+
+def on_change(name: str, handler: Handler) -> None:
+    """Reload a cache when generation `name` moves (in any process).
+
+    The handler gets a connection to, and the path of, the database it moved in.
+    """
+    _handlers[name] = handler
+
+
+async def bump(db: aiosqlite.Connection, name: str) -> None:
+    """Mark `name` changed; call inside the transaction that changes it."""
+    await db.execute(
+        """
+        INSERT INTO cache_generations (name, generation) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET generation = generation + 1
+        """,
+        (name,),
+    )
+
+
+async def data_version(db: aiosqlite.Connection) -> int:
+    """Changes whenever another connection commits to the database."""
+    return (await (await db.execute("PRAGMA data_version")).fetchone())[0]
+
+
+async def sync(db: aiosqlite.Connection, database: str) -> list[str]:
+    """Run handlers for generations of `database` changed since the last call.
+
+    Returns the names that changed.
+    """
+    rows = await (
+        await db.execute("SELECT name, generation FROM cache_generations")
+    ).fetchall()
+    changed = []
+    for name, generation in rows:
+        if _seen.get((database, name)) == generation:
+            continue
+        _seen[database, name] = generation
+        handler = _handlers.get(name)
+        if handler is not None:
+            await handler(db, database)
+        changed.append(name)
+    return changed
@@ -0,0 +1,232 @@
+import gzip
+import io
+import zlib
+
+from . import metrics
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def supported_encodings() -> list[str]:
+    """Content codings this process can decode/encode, most preferred first."""
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def decompress(body: bytes, encoding: str, limit: int) -> bytes:
+    """Decode a request body, refusing to inflate past `limit` bytes.
+
+    Every gzip member / zstd frame is decoded and must be complete; a
+    truncated body or trailing garbage raises ValueError (or a codec error).
+    """
+    if encoding == "gzip":
+        chunks = []
+        size = 0
+        while body:
+            decoder = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+            data = decoder.decompress(body, limit - size + 1)
+            size += len(data)
+            if size > limit or decoder.unconsumed_tail:
+                raise BodyTooLarge
+            if not decoder.eof:
+                raise ValueError("Truncated gzip body")
+            chunks.append(data)
+            body = decoder.unused_data
+        return b"".join(chunks)
+    if encoding == "zstd" and zstandard is not None:
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            io.BytesIO(body), read_across_frames=True
+        )
+        chunks = []
+        size = 0
+        while chunk := reader.read(limit - size + 1):
+            size += len(chunk)
+            if size > limit:
+                raise BodyTooLarge
+            chunks.append(chunk)
+        # The reader stops quietly at a cut-off frame. The output is known to
+        # be within the limit now, so walk the frames again to check each ends.
+        rest = body
+        while rest:
+            decoder = zstandard.ZstdDecompressor().decompressobj()
+            decoder.decompress(rest)
+            if not decoder.eof:
+                raise ValueError("Truncated zstd body")
+            rest = decoder.unused_data
+        return b"".join(chunks)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return gzip.compress(body, compresslevel=6)
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """Pick the best supported coding from an Accept-Encoding header."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+async def _send_plain_error(send, status_code: int, detail: str) -> None:
+    body = ('{"detail":"%s"}' % detail).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class CompressionMiddleware:
+    """Decode compressed request bodies and compress large responses.
+
+    Request decoding is limited to `request_paths` (sync uploads), response
+    compression to `response_paths`; every other route passes through as-is.
+    """
+
+    def __init__(
+        self,
+        app,
+        request_paths: set[str],
+        response_paths: set[str],
+        max_decompressed_bytes: int,
+        minimum_size: int,
+    ) -> None:
+        self.app = app
+        self.request_paths = request_paths
+        self.response_paths = response_paths
+        self.max_decompressed_bytes = max_decompressed_bytes
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+
+        content_encoding = headers.get("content-encoding", "").strip().lower()
+        if path in self.request_paths and content_encoding not in ("", "identity"):
+            if content_encoding not in supported_encodings():
+                await _send_plain_error(send, 415, "Unsupported Content-Encoding")
+                return
+
+            chunks = []
+            received = 0
+            more_body = True
+            while more_body:
+                message = await receive()
+                chunk = message.get("body", b"")
+                received += len(chunk)
+                # A compressed body can't be larger than its decoded form limit
+                if received > self.max_decompressed_bytes:
+                    await _send_plain_error(send, 413, "Request body too large")
+                    return
+                chunks.append(chunk)
+                more_body = message.get("more_body", False)
+            compressed = b"".join(chunks)
+
+            try:
+                body = decompress(compressed, content_encoding, self.max_decompressed_bytes)
+            except BodyTooLarge:
+                metrics.increment("compression.request_rejected_too_large")
+                await _send_plain_error(send, 413, "Decompressed body too large")
+                return
+            except Exception:
+                await _send_plain_error(send, 400, "Malformed compressed body")
+                return
+
+            metrics.increment(f"compression.request_{content_encoding}_count")
+            metrics.increment("compression.request_bytes_wire", len(compressed))
+            metrics.increment("compression.request_bytes_decoded", len(body))
+
+            scope = dict(scope)
+            scope["headers"] = [
+                (k, v)
+                for k, v in scope["headers"]
+                if k not in (b"content-encoding", b"content-length")
+            ] + [(b"content-length", str(len(body)).encode())]
+
+            delivered = False
+
+            async def receive():
+                nonlocal delivered
+                if delivered:
+                    return {"type": "http.disconnect"}
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+
+        encoding = (
+            negotiate(headers.get("accept-encoding", ""))
+            if path in self.response_paths
+            else None
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            response_headers = list(start_message.get("headers", []))
+            already_encoded = any(k == b"content-encoding" for k, _ in response_headers)
+
+            # Streaming responses and small bodies go out untouched
+            if message.get("more_body") or already_encoded or len(body) < self.minimum_size:
+                await send(start_message)
+                start_message = None
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            metrics.increment(f"compression.response_{encoding}_count")
+            metrics.increment("compression.response_bytes_raw", len(body))
+            metrics.increment("compression.response_bytes_wire", len(compressed))
+
+            response_headers = [
+                (k, v) for k, v in response_headers if k != b"content-length"
+            ] + [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start_message, "headers": response_headers})
+            start_message = None
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
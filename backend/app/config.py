@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -34,11 +36,87 @@ class Settings(BaseSettings):
     smtp_password: str = ""
     smtp_from_email: str = ""
 
+    # Reject offline sync batches without a valid terminal batch signature
+    require_batch_signature: bool = False
+
+    # HTTP body compression (gzip always, zstd when `zstandard` is installed)
+    max_decompressed_body_bytes: int = 10 * 1024 * 1024
+    compression_min_size: int = 1024
+
+    # Reject sales whose total_amount differs from the sum of their items (in öre)
+    verify_transaction_totals: bool = True
+
+    # Recently committed idempotency keys kept in memory for duplicate checks
+    idempotency_cache_per_terminal: int = 2048
+    idempotency_cache_max_terminals: int = 1024
+
+    # Request writes go through one writer connection; writes queued within
+    # this window of the first share a transaction (group commit)
+    writer_max_batch: int = 256
+    writer_max_delay_ms: float = 1.0
+
+    # Multi-worker mode: workers share metrics through snapshot files here
+    # (set by `python main.py --workers N`); empty for a single process
+    metrics_dir: str = ""
+    metrics_flush_seconds: float = 5.0
+
+    # Storage engine: "sqlite" (files on disk) or "memory" (in-process SQLite,
+    # snapshotted to DATABASE_PATH every SNAPSHOT_SECONDS and on shutdown)
+    storage_engine: Literal["sqlite", "memory"] = "sqlite"
+    snapshot_seconds: float = 60.0
+
+    # Store sharding: each store's sales go to their own database file in this
+    # directory, the main database keeps terminals and settings; empty disables
+    shard_dir: str = ""
+
+    # Idle read-only connections kept per database for dashboard/admin reads
+    reader_pool_size: int = 4
+
+    # Maintenance (see app/maintenance.py); an interval of 0 disables it
+    maintenance_interval_seconds: float = 30.0
+    maintenance_quiet_seconds: float = 60.0
+    wal_checkpoint_bytes: int = 64 * 1024 * 1024
+    vacuum_pages_per_run: int = 1000
+    analyze_after_writes: int = 10_000
+
+    # Online backups (see app/backups.py); an interval of 0 means on demand only
+    backup_dir: str = "./backups"
+    backup_interval_seconds: float = 0.0
+    backup_keep: int = 7
+    backup_pages_per_step: int = 1024
+    backup_step_sleep_ms: float = 10.0
+
+    # Terminal deletion purges sales in chunks this size, pausing in between
+    purge_chunk_size: int = 500
+    purge_pause_ms: float = 20.0
+
+    # Edge relay: run in the store and forward stored sales to this upstream
+    # backend's /sync/offline (which must share JWT_SECRET); empty disables
+    relay_upstream_url: str = ""
+    relay_batch_size: int = 500
+    relay_interval_seconds: float = 5.0
+    relay_max_backoff_seconds: float = 300.0
+
+    # Monthly partitions: months older than this are sealed by /admin/partitions/archive
+    partition_live_months: int = 3
+    archive_dir: str = "./archive"
+    # Rows moved per writer op while archiving a month, and the pause between
+    archive_chunk_size: int = 500
+    archive_pause_ms: float = 20.0
+
+    # zstd dictionary trained on recent payloads before compacting them
+    payload_dictionary_size: int = 16 * 1024
+    payload_dictionary_samples: int = 5000
+
     # Couchbase Cloud
     couchbase_connection_string: str = ""
     couchbase_username: str = ""
     couchbase_password: str = ""
     couchbase_bucket: str = ""
+    # Startup doesn't wait for Couchbase: it connects in the background
+    couchbase_connect_timeout_seconds: float = 10.0
+    couchbase_retry_seconds: float = 30.0
+    couchbase_max_backoff_seconds: float = 600.0
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
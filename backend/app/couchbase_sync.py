@@ -1,43 +1,81 @@
+import asyncio
 import logging
 from datetime import timedelta
 
-from couchbase.auth import PasswordAuthenticator
-from couchbase.cluster import Cluster
-from couchbase.options import ClusterOptions
-
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
+# Couchbase sync is best-effort and must not hold up startup, least of all
+# on an edge box restarting while the cloud is unreachable. `connect()` runs
+# as a background task: the SDK is imported (it is heavy) and the cluster
+# awaited in a thread, retrying with backoff until it answers. The sync
+# calls are no-ops until then; /ready reports the state.
+
 _cluster = None
 _bucket = None
 _collection = None
 
+status: dict = {"status": "disabled", "last_error": None}
+
 
-def init_couchbase():
-    """Connect to Couchbase Cloud. Call once at startup."""
+def _connect() -> None:
     global _cluster, _bucket, _collection
 
+    from couchbase.auth import PasswordAuthenticator
+    from couchbase.cluster import Cluster
+    from couchbase.options import ClusterOptions, ClusterTimeoutOptions
+
+    auth = PasswordAuthenticator(
+        settings.couchbase_username,
+        settings.couchbase_password,
+    )
+    # The constructor connects too, so it needs the timeout as well: that
+    # bounds both a retry and how long shutdown can wait on this thread
+    timeout = timedelta(seconds=settings.couchbase_connect_timeout_seconds)
+    cluster = Cluster(
+        settings.couchbase_connection_string,
+        ClusterOptions(
+            auth,
+            timeout_options=ClusterTimeoutOptions(
+                connect_timeout=timeout, bootstrap_timeout=timeout
+            ),
+        ),
+    )
+    try:
+        cluster.wait_until_ready(timeout)
+        bucket = cluster.bucket(settings.couchbase_bucket)
+        collection = bucket.default_collection()
+    except Exception:
+        cluster.close()
+        raise
+    _cluster, _bucket, _collection = cluster, bucket, collection
+
+
+async def connect() -> None:
+    """Connect to Couchbase Cloud, retrying until connected (or cancelled)."""
     if not settings.couchbase_connection_string:
         logger.warning("Couchbase not configured — sync disabled")
         return
 
-    try:
-        auth = PasswordAuthenticator(
-            settings.couchbase_username,
-            settings.couchbase_password,
-        )
-        _cluster = Cluster(
-            settings.couchbase_connection_string,
-            ClusterOptions(auth),
-        )
-        _cluster.wait_until_ready(timedelta(seconds=10))
-        _bucket = _cluster.bucket(settings.couchbase_bucket)
-        _collection = _bucket.default_collection()
+    delay = settings.couchbase_retry_seconds
+    status["status"] = "connecting"
+    while True:
+        try:
+            await asyncio.to_thread(_connect)
+        except ImportError as exc:
+            logger.error("Couchbase SDK not installed — sync disabled")
+            status.update(status="unavailable", last_error=repr(exc))
+            return
+        except Exception as exc:
+            logger.warning("Couchbase not reachable, retrying in %.0fs: %r", delay, exc)
+            status["last_error"] = repr(exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.couchbase_max_backoff_seconds)
+            continue
+        status.update(status="connected", last_error=None)
         logger.info("Connected to Couchbase bucket '%s'", settings.couchbase_bucket)
-    except Exception:
-        logger.exception("Failed to connect to Couchbase — sync disabled")
-        _collection = None
+        return
 
 
 def sync_transaction(transaction_id: int, terminal_code: str, doc: dict) -> None:
@@ -1,18 +1,81 @@
-from datetime import UTC, datetime, timedelta
+import asyncio
+from contextlib import ExitStack, asynccontextmanager
+from datetime import UTC, datetime
 
 import aiosqlite
 
+from . import coherence
 from .config import settings
+from .line_items import backfill_items
+from .locks import file_lock
+from .money import backfill_total_ore
+from .timestamps import backfill_epoch_columns, now_us
+from .partitions import load_sealed_months, refresh_partitions
+from .payloads import load_dictionaries
+from .reconciliation import rebuild_buckets
+from .rollups import rebuild_rollups
+from .storage import engine
 
 
-async def get_db() -> aiosqlite.Connection:
-    db = await aiosqlite.connect(settings.database_path)
+async def get_db(path: str | None = None) -> aiosqlite.Connection:
+    """Connect to the main database, or to the one at `path` (a store shard)."""
+    db = await engine.connect(path or settings.database_path)
     db.row_factory = aiosqlite.Row
     return db
 
 
-async def init_db() -> None:
-    db = await get_db()
+@asynccontextmanager
+async def _init_lock(path: str):
+    # Workers start together; only one migrates at a time
+    with ExitStack() as stack:
+        await asyncio.to_thread(stack.enter_context, file_lock(f"{path}.init-lock"))
+        yield
+
+
+async def init_db(path: str | None = None) -> None:
+    """Create and migrate the schema and load caches; safe to run in every worker."""
+    path = path or settings.database_path
+    async with _init_lock(path):
+        await _migrate(path)
+
+
+# Bump whenever _upgrade changes the schema or backfills. A database already
+# at this version (PRAGMA user_version) skips it at startup: one pragma read
+# instead of the script, the setting seeds and the ALTER attempts.
+SCHEMA_VERSION = 4
+
+
+async def _migrate(path: str) -> None:
+    db = await get_db(path)
+    version = (await (await db.execute("PRAGMA user_version")).fetchone())[0]
+    if version == SCHEMA_VERSION:
+        await _load_caches(db, path)
+    else:
+        await _upgrade(db, path)
+    await coherence.sync(db, path)
+    await db.close()
+
+
+async def _load_caches(db: aiosqlite.Connection, path: str) -> None:
+    await load_sealed_months(db, path)
+    if path == settings.database_path:
+        await load_dictionaries(db)  # Store shards share the main database's dictionaries
+
+
+async def _upgrade(db: aiosqlite.Connection, path: str) -> None:
+    # Only takes effect on a new database; existing ones need a VACUUM to convert
+    await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    # Derived tables from before integer öre amounts are dropped and rebuilt below
+    for table, column in [
+        ("transaction_items", "line_total_ore"),
+        ("sales_rollup_hourly", "total_ore"),
+        ("sales_rollup_daily", "total_ore"),
+    ]:
+        columns = await (await db.execute(f"PRAGMA table_info({table})")).fetchall()
+        if columns and column not in {c[1] for c in columns}:
+            await db.execute(f"DROP TABLE {table}")
+
     await db.executescript(
         """
         PRAGMA journal_mode=WAL;
@@ -50,6 +113,126 @@ async def init_db() -> None:
             FOREIGN KEY (terminal_id) REFERENCES terminals(id)
         );
 
+        CREATE TABLE IF NOT EXISTS reconciliation_buckets (
+            terminal_id INTEGER NOT NULL,
+            bucket_hour TEXT NOT NULL,
+            tx_count INTEGER NOT NULL DEFAULT 0,
+            digest_hi INTEGER NOT NULL DEFAULT 0,
+            digest_lo INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (terminal_id, bucket_hour)
+        );
+
+        CREATE TABLE IF NOT EXISTS transaction_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id INTEGER NOT NULL,
+            terminal_id INTEGER NOT NULL,
+            product_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            unit_price_ore INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            line_total_ore INTEGER NOT NULL,
+            occurred_at TEXT NOT NULL,
+            FOREIGN KEY (transaction_id) REFERENCES transactions(id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_transaction_items_product_time
+            ON transaction_items (product_id, occurred_at);
+        CREATE INDEX IF NOT EXISTS idx_transaction_items_time
+            ON transaction_items (occurred_at);
+        CREATE INDEX IF NOT EXISTS idx_transaction_items_terminal_time
+            ON transaction_items (terminal_id, occurred_at);
+        CREATE INDEX IF NOT EXISTS idx_transaction_items_transaction
+            ON transaction_items (transaction_id);
+
+        CREATE TABLE IF NOT EXISTS sales_rollup_hourly (
+            bucket TEXT NOT NULL,
+            store_name TEXT NOT NULL,
+            terminal_id INTEGER NOT NULL,
+            payment_type TEXT NOT NULL,
+            tx_count INTEGER NOT NULL DEFAULT 0,
+            total_ore INTEGER NOT NULL DEFAULT 0,
+            offline_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (bucket, store_name, terminal_id, payment_type)
+        );
+
+        CREATE TABLE IF NOT EXISTS sales_rollup_daily (
+            bucket TEXT NOT NULL,
+            store_name TEXT NOT NULL,
+            terminal_id INTEGER NOT NULL,
+            payment_type TEXT NOT NULL,
+            tx_count INTEGER NOT NULL DEFAULT 0,
+            total_ore INTEGER NOT NULL DEFAULT 0,
+            offline_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (bucket, store_name, terminal_id, payment_type)
+        );
+
+        CREATE TABLE IF NOT EXISTS transaction_partitions (
+            month TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            min_id INTEGER,
+            max_id INTEGER,
+            sealed_at TEXT NOT NULL,
+            archive_path TEXT,
+            archive_bytes INTEGER,
+            archived_at TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS payload_dictionaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dict_data BLOB NOT NULL,
+            sample_count INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS cache_generations (
+            name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS store_shards (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            store_name TEXT UNIQUE NOT NULL,
+            created_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS relay_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            terminal_code TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            body TEXT NOT NULL,
+            queued_us INTEGER NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_relay_outbox_terminal
+            ON relay_outbox(terminal_code, id);
+
+        CREATE TABLE IF NOT EXISTS relay_dead_letters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            terminal_code TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            body TEXT NOT NULL,
+            queued_us INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            reason TEXT,
+            failed_us INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS terminal_purges (
+            terminal_id INTEGER PRIMARY KEY,
+            terminal_code TEXT NOT NULL,
+            store_name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            rows_total INTEGER NOT NULL,
+            rows_deleted INTEGER NOT NULL DEFAULT 0,
+            worker_pid INTEGER,
+            started_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            finished_at TEXT,
+            error TEXT
+        );
+
         CREATE TABLE IF NOT EXISTS admin_settings (
             key TEXT PRIMARY KEY,
             value TEXT NOT NULL,
@@ -81,30 +264,93 @@ async def init_db() -> None:
             (key, value, now),
         )
 
-    # Add invoice columns to transactions (idempotent ALTER TABLE)
+    # Add invoice, idempotency and money columns to transactions (idempotent ALTER TABLE)
+    added = set()
     for col, col_def in [
         ("customer_email", "TEXT"),
         ("membership_number", "TEXT"),
         ("is_invoice", "INTEGER DEFAULT 0"),
+        ("payload_hash", "TEXT"),
+        ("signature_status", "TEXT"),
+        ("payload_blob", "BLOB"),
+        ("total_ore", "INTEGER"),
+        ("occurred_us", "INTEGER"),
+        ("created_us", "INTEGER"),
+        ("paid_us", "INTEGER"),
     ]:
         try:
             await db.execute(f"ALTER TABLE transactions ADD COLUMN {col} {col_def}")
+            added.add(col)
         except Exception:
             pass  # Column already exists
+    terminal_added = False
+    for col in ("created_us", "last_seen_us", "last_synced_us"):
+        try:
+            await db.execute(f"ALTER TABLE terminals ADD COLUMN {col} INTEGER")
+            terminal_added = True
+        except Exception:
+            pass  # Column already exists
+    try:
+        await db.execute("ALTER TABLE terminals ADD COLUMN deleted_at TEXT")
+    except Exception:
+        pass  # Column already exists
+
+    # Epoch-microsecond twins of the ISO columns, for range filters and ordering
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transactions_occurred_us ON transactions (occurred_us)"
+    )
+    await db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_terminal_occurred_us
+            ON transactions (terminal_id, occurred_us)
+        """
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transactions_created_us ON transactions (created_us, id)"
+    )
+
+    # Sealed monthly partitions follow the live schema; `transactions_all` spans both
+    await refresh_partitions(db)
+    await _load_caches(db, path)
+    if "total_ore" in added:
+        await backfill_total_ore(db)
+    if "occurred_us" in added:
+        await backfill_epoch_columns(db, "transactions")
+    if terminal_added:
+        await backfill_epoch_columns(db, "terminals")
 
+    # Backfill derived tables for databases created before they existed
+    has_transactions = await (
+        await db.execute("SELECT 1 FROM transactions_all LIMIT 1")
+    ).fetchone()
+    has_buckets = await (
+        await db.execute("SELECT 1 FROM reconciliation_buckets LIMIT 1")
+    ).fetchone()
+    if has_transactions and not has_buckets:
+        await rebuild_buckets(db)
+    has_items = await (
+        await db.execute("SELECT 1 FROM transaction_items LIMIT 1")
+    ).fetchone()
+    if has_transactions and not has_items:
+        await backfill_items(db)
+    has_rollups = await (
+        await db.execute("SELECT 1 FROM sales_rollup_daily LIMIT 1")
+    ).fetchone()
+    if has_transactions and not has_rollups:
+        await rebuild_rollups(db)
+
+    await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     await db.commit()
-    await db.close()
 
 
 def now_iso() -> str:
     return datetime.now(UTC).isoformat()
 
 
-def terminal_status(last_seen_at_iso: str | None) -> str:
-    if not last_seen_at_iso:
+def terminal_status(last_seen_us: int | None) -> str:
+    if last_seen_us is None:
         return "offline"
 
-    last_seen = datetime.fromisoformat(last_seen_at_iso)
-    if datetime.now(UTC) - last_seen <= timedelta(seconds=30):
+    if now_us() - last_seen_us <= 30_000_000:
         return "online"
     return "offline"
@@ -2,8 +2,6 @@ import asyncio
 import logging
 from email.message import EmailMessage
 
-import aiosmtplib
-
 from .config import settings
 
 logger = logging.getLogger(__name__)
@@ -26,6 +24,8 @@ async def send_invoice_email(
 
     import json
 
+    import aiosmtplib
+
     items = json.loads(items_json).get("items", [])
     items_lines = "\n".join(
         f"  {it['name']} x{it['quantity']}  —  {it['price'] * it['quantity']:.2f} SEK"
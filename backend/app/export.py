@@ -0,0 +1,235 @@
+import argparse
+import asyncio
+import csv
+import heapq
+import io
+import json
+import sys
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+import aiosqlite
+
+from .partitions import partition_tables
+from .timestamps import EPOCH_COLUMNS, format_us, to_us
+
+COLUMNS = [
+    "id",
+    "terminal_code",
+    "store_name",
+    "idempotency_key",
+    "occurred_at",
+    "created_at",
+    "total_amount",
+    "total_ore",
+    "item_count",
+    "payment_type",
+    "payment_status",
+    "paid_at",
+    "synced_from_offline",
+    "is_invoice",
+    "membership_number",
+    "customer_email",
+]
+
+# Timestamps are read from their epoch-microsecond twins and written as UTC
+# "...Z", whatever offset the ISO text column was stored with
+_EPOCH = EPOCH_COLUMNS["transactions"]
+_EPOCH_POSITIONS = [COLUMNS.index(c) for c in _EPOCH]
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "columns": "application/x-ndjson",
+}
+
+
+def export_query(
+    table: str = "transactions",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    store_name: str | None = None,
+    payment_type: str | None = None,
+    sort_key: bool = False,
+) -> tuple[str, list]:
+    """SELECT over one live or sealed table, oldest sale first.
+
+    Rows come in the table's occurred_us index order, so the first row is
+    ready without sorting the range. With `sort_key`, rows end in an extra
+    `occurred_us` column for `merge_batches`.
+    """
+    clauses, params = [], []
+    if start:
+        clauses.append("tx.occurred_us >= ?")
+        params.append(to_us(start))
+    if end:
+        clauses.append("tx.occurred_us < ?")
+        params.append(to_us(end))
+    if store_name:
+        clauses.append("t.store_name = ?")
+        params.append(store_name)
+    if payment_type:
+        clauses.append("tx.payment_type = ?")
+        params.append(payment_type)
+    columns = ", ".join(
+        f"t.{c}" if c in ("terminal_code", "store_name") else f"tx.{_EPOCH.get(c, c)}"
+        for c in COLUMNS
+    )
+    if sort_key:
+        columns += ", tx.occurred_us"
+    sql = f"""
+        SELECT {columns}
+        FROM {table} tx CROSS JOIN terminals t ON t.id = tx.terminal_id
+        WHERE {" AND ".join(clauses) or "1 = 1"}
+        ORDER BY tx.occurred_us, tx.id
+    """
+    return sql, params
+
+
+async def export_batches(
+    dbs: list[aiosqlite.Connection],
+    start: datetime | None = None,
+    end: datetime | None = None,
+    store_name: str | None = None,
+    payment_type: str | None = None,
+    batch_size: int = 1000,
+) -> AsyncIterator[list[tuple]]:
+    """Matching rows from every live and sealed table of `dbs`, oldest sale first.
+
+    Each table is stepped through in index order and the streams are merged,
+    like `recent_transactions`, instead of sorting the `transactions_all` view.
+    """
+    targets = [(db, table) for db in dbs for table in ["transactions", *await partition_tables(db)]]
+    sort_key = len(targets) > 1
+    streams = []
+    for db, table in targets:
+        sql, params = export_query(table, start, end, store_name, payment_type, sort_key)
+        streams.append(iter_batches(db, sql, params, batch_size))
+    batches = merge_batches(streams, batch_size) if sort_key else streams[0]
+    async for batch in batches:
+        yield [_format_row(row) for row in batch]
+
+
+def _format_row(row: tuple) -> tuple:
+    row = list(row)
+    for i in _EPOCH_POSITIONS:
+        row[i] = format_us(row[i])
+    return tuple(row)
+
+
+async def iter_batches(
+    db: aiosqlite.Connection, sql: str, params: list, batch_size: int = 1000
+) -> AsyncIterator[list[tuple]]:
+    """Step one cursor through the result, `batch_size` rows at a time."""
+    async with db.execute(sql, params) as cur:
+        while True:
+            rows = await cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [tuple(row) for row in rows]
+
+
+async def merge_batches(
+    streams: list[AsyncIterator[list[tuple]]], batch_size: int = 1000
+) -> AsyncIterator[list[tuple]]:
+    """Merge `sort_key` streams (tables, store shards) into one, oldest sale first.
+
+    Only one batch per stream is held at a time; the sort key is dropped.
+    """
+    heads: list[tuple] = []
+    batches: dict[int, list[tuple]] = {}
+
+    async def pull(i: int) -> None:
+        batch = await anext(streams[i], None)
+        if batch:
+            batches[i] = batch
+            heapq.heappush(heads, (batch[0][-1], batch[0][0], i, 0))
+
+    for i in range(len(streams)):
+        await pull(i)
+    out = []
+    while heads:
+        _, _, i, pos = heapq.heappop(heads)
+        batch = batches[i]
+        out.append(batch[pos][:-1])
+        if pos + 1 < len(batch):
+            heapq.heappush(heads, (batch[pos + 1][-1], batch[pos + 1][0], i, pos + 1))
+        else:
+            await pull(i)
+        if len(out) >= batch_size:
+            yield out
+            out = []
+    if out:
+        yield out
+
+
+async def csv_chunks(batches: AsyncIterator[list[tuple]]) -> AsyncIterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    async for rows in batches:
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+async def column_chunks(batches: AsyncIterator[list[tuple]]) -> AsyncIterator[bytes]:
+    """Newline-delimited JSON: a header line, then one column block per batch.
+
+        {"columns": [...]}
+        {"rows": n, "data": {"id": [...], "total_amount": [...], ...}}
+    """
+    yield (json.dumps({"columns": COLUMNS}) + "\n").encode("utf-8")
+    async for rows in batches:
+        block = {"rows": len(rows), "data": dict(zip(COLUMNS, map(list, zip(*rows))))}
+        yield (json.dumps(block) + "\n").encode("utf-8")
+
+
+def encode(fmt: str, batches: AsyncIterator[list[tuple]]) -> AsyncIterator[bytes]:
+    return csv_chunks(batches) if fmt == "csv" else column_chunks(batches)
+
+
+async def _export_file(args: argparse.Namespace) -> int:
+    db = await aiosqlite.connect(f"file:{args.database}?mode=ro", uri=True)
+    out = open(args.output, "wb") if args.output != "-" else sys.stdout.buffer
+    rows = 0
+    try:
+        async def counted():
+            nonlocal rows
+            async for batch in export_batches(
+                [db], args.start, args.end, args.store, args.payment_type, args.batch_size
+            ):
+                rows += len(batch)
+                yield batch
+
+        async for chunk in encode(args.format, counted()):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        await db.close()
+    return rows
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Nightly export straight from the SQLite file: `python -m app.export`."""
+    from .config import settings
+
+    parser = argparse.ArgumentParser(description="Export transactions for accounting")
+    parser.add_argument("--database", default=settings.database_path)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    parser.add_argument("--store")
+    parser.add_argument("--payment-type")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--output", "-o", default="-")
+    args = parser.parse_args(argv)
+    rows = asyncio.run(_export_file(args))
+    print(f"Exported {rows} transactions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+from .config import settings
+
+
+def payload_hash(fields: dict) -> str:
+    """Stable hash of what a sale *is*, used to spot conflicting key reuse.
+
+    `fields` is the sale's request dump (`model_dump()` or a sync record
+    dump). `offline_created` is excluded: the same sale may first be
+    attempted online and later arrive through an offline sync batch.
+    """
+    canonical = json.dumps(
+        {key: value for key, value in fields.items() if key != "offline_created"},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class RecentKeys:
+    """Bounded per-terminal LRU of committed idempotency keys.
+
+    Lets retried syncs be answered without touching the database. Only keys
+    that are known to be committed are added, so a hit is always a true
+    duplicate; a miss falls through to the INSERT ... ON CONFLICT path.
+    """
+
+    def __init__(self, per_terminal: int, max_terminals: int) -> None:
+        self.per_terminal = per_terminal
+        self.max_terminals = max_terminals
+        self._terminals: OrderedDict[int, OrderedDict[str, tuple[int, str | None]]] = (
+            OrderedDict()
+        )
+
+    def get(self, terminal_id: int, key: str) -> tuple[int, str | None] | None:
+        keys = self._terminals.get(terminal_id)
+        if keys is None or key not in keys:
+            return None
+        keys.move_to_end(key)
+        return keys[key]
+
+    def add(
+        self, terminal_id: int, key: str, transaction_id: int, digest: str | None
+    ) -> None:
+        keys = self._terminals.get(terminal_id)
+        if keys is None:
+            keys = self._terminals[terminal_id] = OrderedDict()
+            if len(self._terminals) > self.max_terminals:
+                self._terminals.popitem(last=False)
+        else:
+            self._terminals.move_to_end(terminal_id)
+        keys[key] = (transaction_id, digest)
+        keys.move_to_end(key)
+        if len(keys) > self.per_terminal:
+            keys.popitem(last=False)
+
+    def forget_terminal(self, terminal_id: int) -> None:
+        self._terminals.pop(terminal_id, None)
+
+    def clear(self) -> None:
+        self._terminals.clear()
+
+
+recent_keys = RecentKeys(
+    settings.idempotency_cache_per_terminal, settings.idempotency_cache_max_terminals
+)
@@ -0,0 +1,199 @@
+from datetime import UTC, datetime
+
+import aiosqlite
+
+from .money import to_ore
+from .payloads import read_payload
+
+
+def utc_iso(value: datetime) -> str:
+    """Normalise a timestamp to UTC so ISO strings compare lexically."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.astimezone(UTC).isoformat()
+
+
+def item_rows(
+    transaction_id: int, terminal_id: int, occurred_at: datetime, items
+) -> list[tuple]:
+    """Rows for `transaction_items` from request models or raw item dicts."""
+    occurred = utc_iso(occurred_at)
+    rows = []
+    for item in items:
+        if isinstance(item, dict):
+            product_id = str(item.get("product_id") or item.get("id") or item.get("name"))
+            name = item.get("name") or product_id
+            price_ore = to_ore(item.get("price", 0))
+            quantity = int(item.get("quantity", 1))
+        else:
+            product_id, name, price_ore, quantity = (
+                item.product_id,
+                item.name,
+                item.price_ore,
+                item.quantity,
+            )
+        rows.append(
+            (
+                transaction_id,
+                terminal_id,
+                product_id,
+                name,
+                price_ore,
+                quantity,
+                price_ore * quantity,
+                occurred,
+            )
+        )
+    return rows
+
+
+async def insert_items(db: aiosqlite.Connection, rows: list[tuple]) -> None:
+    await db.executemany(
+        """
+        INSERT INTO transaction_items
+        (transaction_id, terminal_id, product_id, name, unit_price_ore, quantity, line_total_ore, occurred_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+
+
+async def backfill_items(db: aiosqlite.Connection, batch_size: int = 500) -> int:
+    """Populate `transaction_items` from the stored payloads of existing rows."""
+    inserted = 0
+    last_id = 0
+    while True:
+        rows = await (
+            await db.execute(
+                """
+                SELECT id, terminal_id, payload_blob, payload_json, occurred_at FROM transactions_all
+                WHERE id > ? ORDER BY id LIMIT ?
+                """,
+                (last_id, batch_size),
+            )
+        ).fetchall()
+        if not rows:
+            return inserted
+        batch = []
+        for row in rows:
+            payload = await read_payload(db, row["payload_blob"], row["payload_json"])
+            # Regular sales store the request; Scan & Pay stores the raw item list
+            items = payload.get("items", []) if isinstance(payload, dict) else payload
+            batch.extend(
+                item_rows(
+                    row["id"],
+                    row["terminal_id"],
+                    datetime.fromisoformat(row["occurred_at"]),
+                    items,
+                )
+            )
+        await insert_items(db, batch)
+        inserted += len(batch)
+        last_id = rows[-1]["id"]
+
+
+def _filters(
+    store_name: str | None,
+    terminal_id: int | None,
+    start: datetime | None,
+    end: datetime | None,
+) -> tuple[str, list]:
+    clauses, params = [], []
+    if store_name:
+        clauses.append("t.store_name = ?")
+        params.append(store_name)
+    if terminal_id is not None:
+        clauses.append("i.terminal_id = ?")
+        params.append(terminal_id)
+    if start:
+        clauses.append("i.occurred_at >= ?")
+        params.append(utc_iso(start))
+    if end:
+        clauses.append("i.occurred_at < ?")
+        params.append(utc_iso(end))
+    return (" AND ".join(clauses) or "1 = 1"), params
+
+
+async def top_products(
+    db: aiosqlite.Connection,
+    limit: int = 10,
+    order_by: str = "revenue",
+    store_name: str | None = None,
+    terminal_id: int | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> list[dict]:
+    where, params = _filters(store_name, terminal_id, start, end)
+    order = "units" if order_by == "units" else "revenue"
+    rows = await (
+        await db.execute(
+            f"""
+            SELECT i.product_id, MAX(i.name) AS name,
+                   SUM(i.quantity) AS units, SUM(i.line_total_ore) / 100.0 AS revenue,
+                   COUNT(DISTINCT i.transaction_id) AS transactions
+            FROM transaction_items i JOIN terminals t ON t.id = i.terminal_id
+            WHERE {where}
+            GROUP BY i.product_id
+            ORDER BY {order} DESC
+            LIMIT ?
+            """,
+            (*params, limit),
+        )
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+_GROUPS = {
+    "store": "t.store_name",
+    "terminal": "t.terminal_code",
+    "hour": "substr(i.occurred_at, 1, 13)",
+    "day": "substr(i.occurred_at, 1, 10)",
+}
+
+
+async def product_sales(
+    db: aiosqlite.Connection,
+    product_id: str,
+    group_by: str = "day",
+    store_name: str | None = None,
+    terminal_id: int | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> list[dict]:
+    where, params = _filters(store_name, terminal_id, start, end)
+    group = _GROUPS[group_by]
+    rows = await (
+        await db.execute(
+            f"""
+            SELECT {group} AS bucket,
+                   SUM(i.quantity) AS units, SUM(i.line_total_ore) / 100.0 AS revenue,
+                   COUNT(DISTINCT i.transaction_id) AS transactions
+            FROM transaction_items i JOIN terminals t ON t.id = i.terminal_id
+            WHERE i.product_id = ? AND {where}
+            GROUP BY bucket
+            ORDER BY bucket
+            """,
+            (product_id, *params),
+        )
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def merge_product_rows(results: list[list[dict]], key: str) -> list[dict]:
+    """Add up `top_products` or `product_sales` rows from several store shards by `key`.
+
+    A sale never spans shards, so the distinct transaction counts add up too.
+    """
+    merged: dict[str, dict] = {}
+    for rows in results:
+        for row in rows:
+            acc = merged.get(row[key])
+            if acc is None:
+                merged[row[key]] = dict(row)
+                continue
+            acc["units"] += row["units"]
+            acc["revenue"] = round(acc["revenue"] + row["revenue"], 2)
+            acc["transactions"] += row["transactions"]
+            if "name" in row:
+                acc["name"] = max(acc["name"], row["name"])
+    return list(merged.values())
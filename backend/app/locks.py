@@ -0,0 +1,25 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single worker only
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True) -> Iterator[None]:
+    """Hold an exclusive lock on `path` across worker processes (POSIX only).
+
+    Without `blocking`, raises BlockingIOError if another process holds it.
+    Where flock is unavailable this is a no-op.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -1,35 +1,127 @@
 import asyncio
+import heapq
 import json
 import base64
+import logging
 from contextlib import asynccontextmanager
-from datetime import datetime
+from datetime import UTC, datetime, timedelta
+from typing import Literal, NamedTuple
 
+import aiosqlite
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.backends import default_backend
 from cryptography.exceptions import InvalidSignature
-from fastapi import Depends, FastAPI, HTTPException, status, Query
+from fastapi import Depends, FastAPI, HTTPException, Request, status, Query
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from pydantic import ValidationError
+
+from . import (
+    backups,
+    coherence,
+    couchbase_sync,
+    maintenance,
+    metrics,
+    purge,
+    readers,
+    relay,
+    shards,
+    storage,
+)
+from .batch_signing import (
+    cache_public_key,
+    cached_public_key,
+    forget_public_keys,
+    verify_batch,
+)
+from .compression import CompressionMiddleware
 from .database import get_db, init_db, now_iso, terminal_status
 from .config import settings
-from .couchbase_sync import init_couchbase, sync_transaction, sync_heartbeat, is_connected
+from .couchbase_sync import sync_transaction, sync_heartbeat, is_connected
 from .email import send_invoice_email
+from .export import FORMATS, encode, export_batches
+from .idempotency import payload_hash, recent_keys
+from .line_items import (
+    insert_items,
+    item_rows,
+    merge_product_rows,
+    product_sales,
+    top_products,
+)
+from .partitions import (
+    archivable_months,
+    archive_chunk,
+    archive_cutoff,
+    archived_transaction,
+    close_month,
+    export_partition,
+    mark_sealed,
+    newest_first,
+    open_month,
+    partition_tables,
+    recent_transactions,
+    record_export,
+)
+from .money import MAX_QUANTITY, from_ore, to_ore
+from .payloads import (
+    compact_payloads,
+    encode_payload,
+    load_dictionaries,
+    store_dictionary,
+    train_dictionary,
+)
+from .reconciliation import bucket_digests, bucket_keys, merge_digests, record_bucket
+from .rollups import comparison_windows, record_sale, window_rows, window_summary
+from .serialization import (
+    SYNC_STATUS_COLUMNS,
+    TERMINAL_COLUMNS,
+    TRANSACTION_COLUMNS,
+    sync_status_json,
+    terminals_json,
+    transactions_json,
+)
+from .sync_validation import (
+    InvalidItem,
+    TransactionRecord,
+    dump_transactions,
+    validate_sync_batch,
+)
+from .timestamps import format_us, iso_to_us, to_us
+from .writer import writer
 from .models import (
     AdminSettingsResponse,
     AdminSettingsUpdateRequest,
     DashboardStatsResponse,
+    DatabaseHealth,
     HeartbeatRequest,
+    HistoryComparisonResponse,
+    HistoryWindow,
     InvoiceStatsResponse,
     LoginRequest,
+    ProductSalesBucket,
+    ProductSalesRow,
+    ReconciliationCompareRequest,
+    ReconciliationCompareResponse,
+    ReconciliationDigest,
+    ReconciliationKeysResponse,
+    ReconciliationLevel,
+    ReconciliationMismatch,
+    SyncAckMode,
     SyncBatchRequest,
+    SyncBitmapAckResponse,
+    SyncCompactAckResponse,
     SyncStatusResponse,
     TerminalCreateRequest,
     TerminalCreateResponse,
+    TerminalDeletionResponse,
     TerminalResponse,
+    TimeSeries,
+    TimeSeriesResponse,
     TokenResponse,
     TransactionCreateRequest,
+    TransactionPartition,
     TransactionResponse,
 )
 from .security import (
@@ -41,15 +133,84 @@ from .security import (
     verify_password,
 )
 
+logger = logging.getLogger(__name__)
+
+
+async def _forget_terminals(_: aiosqlite.Connection, database: str) -> None:
+    # A terminal was deleted, possibly by another worker
+    recent_keys.clear()
+    forget_public_keys()
+
+
+coherence.on_change("terminals", _forget_terminals)
+
+
+async def _flush_metrics() -> None:
+    while True:
+        metrics.write_snapshot(settings.metrics_dir)
+        await asyncio.sleep(settings.metrics_flush_seconds)
+
+
+async def _snapshot() -> None:
+    while True:
+        await asyncio.sleep(settings.snapshot_seconds)
+        try:
+            await storage.engine.snapshot()
+        except Exception:
+            logger.exception("Snapshot failed")
+
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     await init_db()
-    init_couchbase()
+    # In the background: startup doesn't wait for the cloud (see /ready)
+    couchbase_connector = asyncio.create_task(couchbase_sync.connect())
+    await writer.start()
+    await shards.start()
+    await purge.resume()
+    flusher = asyncio.create_task(_flush_metrics()) if settings.metrics_dir else None
+    snapshotter = (
+        asyncio.create_task(_snapshot()) if storage.engine.name == "memory" else None
+    )
+    forwarder = asyncio.create_task(relay.run()) if relay.enabled() else None
+    maintainer = (
+        asyncio.create_task(maintenance.run())
+        if settings.maintenance_interval_seconds > 0
+        else None
+    )
+    backup_scheduler = (
+        asyncio.create_task(backups.run()) if settings.backup_interval_seconds > 0 else None
+    )
     yield
+    couchbase_connector.cancel()
+    if backup_scheduler is not None:
+        backup_scheduler.cancel()
+    if maintainer is not None:
+        maintainer.cancel()
+    if forwarder is not None:
+        forwarder.cancel()
+    if flusher is not None:
+        flusher.cancel()
+        metrics.remove_snapshot(settings.metrics_dir)
+    if snapshotter is not None:
+        snapshotter.cancel()
+    await purge.stop()
+    await readers.close()
+    await maintenance.close()
+    await shards.stop()
+    await writer.stop()
+    await storage.engine.close()
 
 
 app = FastAPI(title="ICA Edge-First Checkout", lifespan=lifespan)
+# Added first so CORS stays outermost and also wraps 413/415 replies
+app.add_middleware(
+    CompressionMiddleware,
+    request_paths={"/transactions", "/sync/offline"},
+    response_paths={"/sync/offline", "/dashboard/transactions"},
+    max_decompressed_bytes=settings.max_decompressed_body_bytes,
+    minimum_size=settings.compression_min_size,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -61,61 +222,119 @@ app.add_middleware(
 
 @app.get("/health")
 async def health() -> dict:
+    """Liveness: the process answers. Checks nothing else."""
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """Readiness: every database's writer is running and the database answers reads.
+
+    Couchbase is reported but not required; checkout works without it.
+    """
+    problems = []
+    for shard in await shards.covering():
+        if not shard.writer.running:
+            problems.append(f"{shard.path}: writer not running")
+            continue
+        try:
+            async with readers.connection(shard.path) as db:
+                await db.execute("SELECT 1")
+        except Exception as exc:
+            problems.append(f"{shard.path}: {exc!r}")
+    return JSONResponse(
+        {
+            "status": "not_ready" if problems else "ready",
+            "problems": problems,
+            "couchbase": couchbase_sync.status["status"],
+        },
+        status_code=503 if problems else 200,
+    )
+
+
+@app.get("/relay/status")
+async def relay_status() -> dict:
+    """Edge relay uplink: sales still queued for upstream and the last attempt."""
+    return {
+        "enabled": relay.enabled(),
+        "upstream": settings.relay_upstream_url or None,
+        "backlog": await relay.backlog(),
+        "dead_letters": await relay.dead_letters(),
+        **relay.status,
+    }
+
+
 @app.get("/dashboard/couchbase-status")
 async def couchbase_status() -> dict:
     return {
         "connected": is_connected(),
         "bucket": settings.couchbase_bucket or None,
+        **couchbase_sync.status,
     }
 
 
+@app.get("/dashboard/metrics")
+async def get_metrics() -> dict:
+    """Metrics of this process, or of all workers in multi-worker mode."""
+    if settings.metrics_dir:
+        metrics.write_snapshot(settings.metrics_dir)
+        snapshot = metrics.merge(metrics.worker_snapshots(settings.metrics_dir))
+    else:
+        snapshot = metrics.snapshot()
+    counters = snapshot["counters"]
+    snapshot["compression_ratio"] = {
+        "request": metrics.ratio(
+            "compression.request_bytes_decoded", "compression.request_bytes_wire", counters
+        ),
+        "response": metrics.ratio(
+            "compression.response_bytes_raw", "compression.response_bytes_wire", counters
+        ),
+    }
+    return snapshot
+
+
 @app.post("/terminals", response_model=TerminalCreateResponse)
 async def create_terminal(payload: TerminalCreateRequest):
-    db = await get_db()
     now = now_iso()
 
     # Generate ECDSA key pair for this terminal
     private_key_pem, public_key_pem = generate_terminal_ecdsa_keypair()
 
-    try:
+    async def write(db: aiosqlite.Connection) -> aiosqlite.Row:
         cur = await db.execute(
             """
-            INSERT INTO terminals (terminal_code, password_hash, store_name, created_at, updated_at, ecdsa_private_key, ecdsa_public_key)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO terminals (terminal_code, password_hash, store_name, created_at, created_us, updated_at, ecdsa_private_key, ecdsa_public_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 payload.terminal_code,
                 hash_password(payload.password),
                 payload.store_name,
                 now,
+                iso_to_us(now),
                 now,
                 private_key_pem,
                 public_key_pem,
             ),
         )
-        await db.commit()
-        terminal_id = cur.lastrowid
-        row = await (
-            await db.execute("SELECT * FROM terminals WHERE id = ?", (terminal_id,))
+        return await (
+            await db.execute("SELECT * FROM terminals WHERE id = ?", (cur.lastrowid,))
         ).fetchone()
+
+    try:
+        row = await writer.submit(write)
     except Exception as exc:
-        await db.close()
         raise HTTPException(status_code=409, detail="Terminal already exists") from exc
+    await shards.mirror_terminal(row)
 
-    await db.close()
     return TerminalCreateResponse(
         id=row["id"],
         terminal_code=row["terminal_code"],
         store_name=row["store_name"],
         active=bool(row["active"]),
-        created_at=datetime.fromisoformat(row["created_at"]),
-        last_seen_at=datetime.fromisoformat(row["last_seen_at"])
-        if row["last_seen_at"]
-        else None,
-        status=terminal_status(row["last_seen_at"]),
+        created_at=format_us(row["created_us"]),
+        last_seen_at=format_us(row["last_seen_us"]),
+        status=terminal_status(row["last_seen_us"]),
         ecdsa_private_key=row["ecdsa_private_key"],
         ecdsa_public_key=row["ecdsa_public_key"],
     )
@@ -143,50 +362,183 @@ async def login(payload: LoginRequest):
     return TokenResponse(access_token=token)
 
 
-async def _resolve_terminal_id(terminal_code: str) -> tuple[int, str]:
+async def _resolve_terminal(terminal_code: str) -> aiosqlite.Row:
     db = await get_db()
     row = await (
         await db.execute(
-            "SELECT id, terminal_code FROM terminals WHERE terminal_code = ?",
+            """
+            SELECT id, terminal_code, store_name FROM terminals
+            WHERE terminal_code = ? AND deleted_at IS NULL
+            """,
             (terminal_code,),
         )
     ).fetchone()
     await db.close()
     if not row:
         raise HTTPException(status_code=404, detail="Terminal not found")
+    return row
+
+
+async def _resolve_terminal_id(terminal_code: str) -> tuple[int, str]:
+    row = await _resolve_terminal(terminal_code)
     return row["id"], row["terminal_code"]
 
 
+async def _covering(
+    store_name: str | None, terminal: aiosqlite.Row | None
+) -> list[shards.Shard]:
+    """Store shards a dashboard query filtered by store and/or terminal has to read."""
+    return await shards.covering(terminal["store_name"] if terminal else store_name)
+
+
 def _tx_response(row) -> TransactionResponse:
     return TransactionResponse(
         id=row["id"],
         terminal_id=row["terminal_id"],
         idempotency_key=row["idempotency_key"],
-        total_amount=row["total_amount"],
+        total_amount=from_ore(row["total_ore"]),
         item_count=row["item_count"],
-        occurred_at=datetime.fromisoformat(row["occurred_at"]),
-        created_at=datetime.fromisoformat(row["created_at"]),
+        occurred_at=format_us(row["occurred_us"]),
+        created_at=format_us(row["created_us"]),
         synced_from_offline=bool(row["synced_from_offline"]),
         payment_type=row["payment_type"],
         customer_email=row["customer_email"],
         membership_number=row["membership_number"],
         is_invoice=bool(row["is_invoice"]),
+        signature_status=row["signature_status"],
     )
 
 
-async def _record_transaction(
-    terminal_id: int, payload: TransactionCreateRequest
-) -> TransactionResponse:
-    db = await get_db()
+class TransactionRejected(HTTPException):
+    """A policy rejection of a single sale, carrying a machine-readable reason."""
+
+    def __init__(self, reason: str, detail: str, status_code: int = 403) -> None:
+        super().__init__(status_code=status_code, detail=detail)
+        self.reason = reason
+
+
+class IngestResult(NamedTuple):
+    transaction_id: int
+    status: str  # "created", "duplicate" or "conflict"
+    row: aiosqlite.Row | None  # Only fetched when a full response is wanted
+
+
+class IngestSession:
+    """A run of sales written inside one writer op (see writer.Writer).
+
+    Line items are bulk-inserted on `flush` and side effects (idempotency
+    cache, Couchbase, invoice email) fire only once the writer has committed.
+    Created outside the op (which sets `db`), so that the handler can
+    `finish` it: writes to the main database that a store shard's op could
+    not make in its own transaction.
+    """
+
+    def __init__(self, terminal: aiosqlite.Row, shard: shards.Shard) -> None:
+        self.db: aiosqlite.Connection | None = None
+        self.shard = shard
+        self.terminal_code = terminal["terminal_code"]
+        self.store_name = terminal["store_name"]
+        self.item_rows: list[tuple] = []
+        self.disable_non_member_invoices = False
+
+    async def flush(self) -> None:
+        if self.item_rows:
+            await insert_items(self.db, self.item_rows)
+            self.item_rows = []
+
+    async def finish(self) -> None:
+        """Run deferred main-database writes; call once the op has returned."""
+        if self.disable_non_member_invoices:
+            await writer.submit(_disable_non_member_invoices)
+            self.disable_non_member_invoices = False
+
+
+def _duplicate_result(
+    terminal_id: int,
+    payload: TransactionCreateRequest | TransactionRecord,
+    transaction_id: int,
+    stored_hash: str | None,
+    new_hash: str,
+    row: aiosqlite.Row | None,
+) -> IngestResult:
+    # Rows written before payload hashing have no hash and can't conflict
+    if stored_hash is not None and stored_hash != new_hash:
+        metrics.increment("idempotency.conflicts")
+        logger.warning(
+            "Idempotency key %s reused by terminal %s with a different payload",
+            payload.idempotency_key,
+            terminal_id,
+        )
+        return IngestResult(transaction_id, "conflict", row)
+    return IngestResult(transaction_id, "duplicate", row)
+
+
+async def _ingest_transaction(
+    session: IngestSession,
+    terminal_id: int,
+    payload: TransactionCreateRequest | TransactionRecord,
+    want_row: bool = True,
+    signature_status: str | None = None,
+    fields: dict | None = None,
+) -> IngestResult:
+    """Write one sale into the writer's open transaction (not committed).
+
+    `fields` is the sale's request dump when the caller already has it; it
+    is computed once here otherwise and reused for hashing and side effects.
+    """
+    db = session.db
+    if fields is None:
+        fields = payload.model_dump()
+    digest = payload_hash(fields)
+
+    # Retried syncs are usually answered from memory without a write attempt
+    cached = recent_keys.get(terminal_id, payload.idempotency_key)
+    if cached is not None:
+        metrics.increment("idempotency.cache_hits")
+        transaction_id, stored_hash = cached
+        row = None
+        if want_row:
+            row = await (
+                await db.execute(
+                    "SELECT * FROM transactions_all WHERE id = ?", (transaction_id,)
+                )
+            ).fetchone()
+        return _duplicate_result(
+            terminal_id, payload, transaction_id, stored_hash, digest, row
+        )
+
+    # Keys older than the live window are only unique within their sealed month
+    archived = await archived_transaction(
+        db, session.shard.path, terminal_id, payload.idempotency_key, payload.occurred_at
+    )
+    if archived is not None:
+        metrics.increment("idempotency.archived_duplicates")
+        return _duplicate_result(
+            terminal_id,
+            payload,
+            archived["id"],
+            archived["payload_hash"],
+            digest,
+            archived if want_row else None,
+        )
+
+    # Amounts are integer öre, so the item total has to match exactly
+    items_ore = sum(item.price_ore * item.quantity for item in payload.items)
+    if settings.verify_transaction_totals and items_ore != payload.total_ore:
+        raise TransactionRejected(
+            "total_mismatch",
+            f"total_amount {from_ore(payload.total_ore):.2f} does not match "
+            f"the item total {from_ore(items_ore):.2f}",
+            status_code=422,
+        )
+
     created_at = now_iso()
     item_count = sum(item.quantity for item in payload.items)
 
     # Extract payment information
     payment_type = payload.payment.payment_type if payload.payment else None
     payment_details_json = (
-        json.dumps(payload.payment.model_dump(), default=str)
-        if payload.payment
-        else None
+        json.dumps(fields["payment"], default=str) if payload.payment else None
     )
 
     # Extract invoice fields
@@ -201,125 +553,206 @@ async def _record_transaction(
 
         # Check admin settings for invoice permissions
         is_member = inv.is_member
-        settings_rows = await (
-            await db.execute("SELECT key, value FROM admin_settings")
-        ).fetchall()
-        admin = {r["key"]: r["value"] for r in settings_rows}
+        admin = await _admin_settings(session)
 
         if is_member and admin.get("allow_invoice_members") != "true":
-            await db.close()
-            raise HTTPException(
-                status_code=403, detail="Member invoices are currently disabled"
+            raise TransactionRejected(
+                "invoice_members_disabled", "Member invoices are currently disabled"
             )
         if not is_member and admin.get("allow_invoice_non_members") != "true":
-            await db.close()
-            raise HTTPException(
-                status_code=403, detail="Non-member invoices are currently disabled"
+            raise TransactionRejected(
+                "invoice_non_members_disabled",
+                "Non-member invoices are currently disabled",
             )
 
         # Check threshold for non-members
         if not is_member:
             threshold = int(admin.get("non_member_invoice_threshold", "10"))
-            count_row = await (
-                await db.execute(
-                    "SELECT COUNT(*) as cnt FROM transactions WHERE is_invoice = 1 AND membership_number IS NULL"
-                )
-            ).fetchone()
-            current_count = count_row["cnt"]
+            current_count = await _count_non_member_invoices(session)
             if current_count >= threshold:
-                # Auto-disable non-member invoices
-                await db.execute(
-                    "UPDATE admin_settings SET value = 'false', updated_at = ? WHERE key = 'allow_invoice_non_members'",
-                    (now_iso(),),
-                )
-                await db.commit()
-                await db.close()
-                raise HTTPException(
-                    status_code=403,
-                    detail="Non-member invoice threshold exceeded. Non-member invoices have been auto-disabled.",
+                # Auto-disable non-member invoices; a store shard's op can't
+                # wait on the main writer, so its handler does it afterwards
+                if session.shard is shards.main:
+                    await _disable_non_member_invoices(db)
+                else:
+                    session.disable_non_member_invoices = True
+                raise TransactionRejected(
+                    "invoice_threshold_exceeded",
+                    "Non-member invoice threshold exceeded. Non-member invoices have been auto-disabled.",
                 )
 
     try:
-        cur = await db.execute(
-            """
-            INSERT INTO transactions
-            (terminal_id, idempotency_key, total_amount, item_count, payload_json, occurred_at, created_at, synced_from_offline, payment_type, payment_details_json, customer_email, membership_number, is_invoice)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                terminal_id,
-                payload.idempotency_key,
-                payload.total_amount,
-                item_count,
-                json.dumps(payload.model_dump(), default=str),
-                payload.occurred_at.isoformat(),
-                created_at,
-                1 if payload.offline_created else 0,
-                payment_type,
-                payment_details_json,
-                customer_email,
-                membership_number,
-                is_invoice,
-            ),
-        )
-        await db.commit()
-        transaction_id = cur.lastrowid
-    except Exception:
-        existing = await (
+        inserted = await (
             await db.execute(
-                "SELECT * FROM transactions WHERE terminal_id = ? AND idempotency_key = ?",
-                (terminal_id, payload.idempotency_key),
+                """
+                INSERT INTO transactions
+                (terminal_id, idempotency_key, total_amount, total_ore, item_count, payload_json, payload_blob, occurred_at, occurred_us, created_at, created_us, synced_from_offline, payment_type, payment_details_json, customer_email, membership_number, is_invoice, payload_hash, signature_status)
+                VALUES (?, ?, ?, ?, ?, '', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(terminal_id, idempotency_key) DO NOTHING
+                RETURNING id
+                """,
+                (
+                    terminal_id,
+                    payload.idempotency_key,
+                    from_ore(payload.total_ore),
+                    payload.total_ore,
+                    item_count,
+                    encode_payload(payload.items),
+                    payload.occurred_at.isoformat(),
+                    to_us(payload.occurred_at),
+                    created_at,
+                    iso_to_us(created_at),
+                    1 if payload.offline_created else 0,
+                    payment_type,
+                    payment_details_json,
+                    customer_email,
+                    membership_number,
+                    is_invoice,
+                    digest,
+                    signature_status,
+                ),
+            )
+        ).fetchall()
+
+        if not inserted:
+            existing = await (
+                await db.execute(
+                    f"SELECT {'*' if want_row else 'id, payload_hash'} FROM transactions WHERE terminal_id = ? AND idempotency_key = ?",
+                    (terminal_id, payload.idempotency_key),
+                )
+            ).fetchone()
+            metrics.increment("idempotency.db_duplicates")
+            # The row may be an earlier sale of this group, not committed yet
+            session.shard.writer.after_commit(
+                lambda: recent_keys.add(
+                    terminal_id,
+                    payload.idempotency_key,
+                    existing["id"],
+                    existing["payload_hash"],
+                )
             )
+            return _duplicate_result(
+                terminal_id,
+                payload,
+                existing["id"],
+                existing["payload_hash"],
+                digest,
+                existing if want_row else None,
+            )
+
+        transaction_id = inserted[0]["id"]
+        await record_bucket(
+            db, terminal_id, payload.idempotency_key, payload.occurred_at
+        )
+        await record_sale(
+            db,
+            payload.occurred_at,
+            session.store_name,
+            terminal_id,
+            payment_type,
+            payload.total_ore,
+            payload.offline_created,
+        )
+        if relay.enabled():
+            await relay.enqueue(db, session.terminal_code, payload.idempotency_key, fields)
+    except aiosqlite.OperationalError as exc:
+        # Locked/busy database: a real failure the terminal should retry
+        logger.exception("Failed to record transaction %s", payload.idempotency_key)
+        raise HTTPException(
+            status_code=503, detail="Database busy, please retry"
+        ) from exc
+
+    session.item_rows.extend(
+        item_rows(transaction_id, terminal_id, payload.occurred_at, payload.items)
+    )
+
+    row = None
+    if want_row:
+        row = await (
+            await db.execute("SELECT * FROM transactions WHERE id = ?", (transaction_id,))
         ).fetchone()
+
+    def after_commit() -> None:
+        recent_keys.add(terminal_id, payload.idempotency_key, transaction_id, digest)
+
+        # Sync to Couchbase (best-effort, non-blocking)
+        t_code = session.terminal_code
+        sync_transaction(transaction_id, t_code, {
+            "type": "transaction",
+            "transaction_id": transaction_id,
+            "terminal_id": terminal_id,
+            "terminal_code": t_code,
+            "idempotency_key": payload.idempotency_key,
+            "total_amount": from_ore(payload.total_ore),
+            "item_count": item_count,
+            "items": fields["items"],
+            "occurred_at": payload.occurred_at.isoformat(),
+            "created_at": created_at,
+            "synced_from_offline": bool(payload.offline_created),
+            "payment_type": payment_type,
+            "is_invoice": bool(is_invoice),
+            "customer_email": customer_email,
+            "membership_number": membership_number,
+        })
+
+        # Send invoice email in the background (non-blocking)
+        if is_invoice and customer_email:
+            asyncio.create_task(
+                send_invoice_email(
+                    to_email=customer_email,
+                    transaction_id=transaction_id,
+                    total_amount=from_ore(payload.total_ore),
+                    item_count=item_count,
+                    items_json=json.dumps({"items": fields["items"]}),
+                    terminal_code=t_code,
+                    occurred_at=payload.occurred_at.isoformat(),
+                    membership_number=membership_number,
+                )
+            )
+
+    session.shard.writer.after_commit(after_commit)
+    return IngestResult(transaction_id, "created", row)
+
+
+# Invoice settings and limits are global. With store sharding the catalog
+# (main database) is read on its own connection and non-member invoices are
+# counted across all shards; otherwise everything runs in the writer's
+# transaction as before.
+
+
+async def _admin_settings(session: IngestSession) -> dict[str, str]:
+    if session.shard is shards.main:
+        db = session.db
+        rows = await (await db.execute("SELECT key, value FROM admin_settings")).fetchall()
+    else:
+        db = await get_db()
+        rows = await (await db.execute("SELECT key, value FROM admin_settings")).fetchall()
         await db.close()
-        return _tx_response(existing)
+    return {r["key"]: r["value"] for r in rows}
 
+
+async def _non_member_invoice_count(db: aiosqlite.Connection) -> int:
     row = await (
-        await db.execute("SELECT * FROM transactions WHERE id = ?", (transaction_id,))
+        await db.execute(
+            "SELECT COUNT(*) as cnt FROM transactions_all WHERE is_invoice = 1 AND membership_number IS NULL"
+        )
     ).fetchone()
+    return row["cnt"]
 
-    # Look up terminal code for the email
-    terminal_row = await (
-        await db.execute("SELECT terminal_code FROM terminals WHERE id = ?", (terminal_id,))
-    ).fetchone()
-    await db.close()
 
-    # Sync to Couchbase (best-effort, non-blocking)
-    t_code = terminal_row["terminal_code"] if terminal_row else "unknown"
-    sync_transaction(transaction_id, t_code, {
-        "type": "transaction",
-        "transaction_id": transaction_id,
-        "terminal_id": terminal_id,
-        "terminal_code": t_code,
-        "idempotency_key": payload.idempotency_key,
-        "total_amount": payload.total_amount,
-        "item_count": item_count,
-        "items": [it.model_dump() for it in payload.items],
-        "occurred_at": payload.occurred_at.isoformat(),
-        "created_at": created_at,
-        "synced_from_offline": bool(payload.offline_created),
-        "payment_type": payment_type,
-        "is_invoice": bool(is_invoice),
-        "customer_email": customer_email,
-        "membership_number": membership_number,
-    })
-
-    # Send invoice email in the background (non-blocking)
-    if is_invoice and customer_email:
-        asyncio.create_task(
-            send_invoice_email(
-                to_email=customer_email,
-                transaction_id=transaction_id,
-                total_amount=payload.total_amount,
-                item_count=item_count,
-                items_json=json.dumps({"items": [it.model_dump() for it in payload.items]}),
-                terminal_code=terminal_row["terminal_code"] if terminal_row else "unknown",
-                occurred_at=payload.occurred_at.isoformat(),
-                membership_number=membership_number,
-            )
-        )
+async def _count_non_member_invoices(session: IngestSession) -> int:
+    count = await _non_member_invoice_count(session.db)
+    if session.shard is not shards.main:
+        others = [s for s in await shards.covering() if s is not session.shard]
+        count += sum(await shards.fan_out(_non_member_invoice_count, others))
+    return count
+
 
-    return _tx_response(row)
+async def _disable_non_member_invoices(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        "UPDATE admin_settings SET value = 'false', updated_at = ? WHERE key = 'allow_invoice_non_members'",
+        (now_iso(),),
+    )
 
 
 @app.post("/transactions", response_model=TransactionResponse)
@@ -327,32 +760,228 @@ async def create_transaction(
     payload: TransactionCreateRequest,
     terminal_code: str = Depends(get_current_terminal_code),
 ):
-    terminal_id, _ = await _resolve_terminal_id(terminal_code)
-    response = await _record_transaction(terminal_id, payload)
-    return response
+    terminal = await _resolve_terminal(terminal_code)
+    terminal_id = terminal["id"]
+    shard = await shards.for_store(terminal["store_name"])
+
+    session = IngestSession(terminal, shard)
+
+    async def write(db: aiosqlite.Connection) -> IngestResult | TransactionRejected:
+        session.db = db
+        try:
+            result = await _ingest_transaction(session, terminal_id, payload)
+        except TransactionRejected as exc:
+            return exc  # Committed all the same: it may have auto-disabled invoices
+        await session.flush()
+        return result
+
+    result = await shard.writer.submit(write)
+    await session.finish()
+    if isinstance(result, TransactionRejected):
+        raise result
+    if result.status == "conflict":
+        raise HTTPException(
+            status_code=409,
+            detail="Idempotency key already used for a different transaction",
+        )
+    return _tx_response(result.row)
 
 
-@app.post("/sync/offline", response_model=list[TransactionResponse])
+# The body is read raw for bulk validation; document it as SyncBatchRequest
+_SYNC_BATCH_SCHEMA = SyncBatchRequest.model_json_schema(
+    ref_template="#/components/schemas/{model}"
+)
+_SYNC_BATCH_SCHEMA.pop("$defs", None)
+
+
+@app.post(
+    "/sync/offline",
+    response_model=None,
+    responses={
+        200: {
+            "model": list[TransactionResponse] | SyncCompactAckResponse | SyncBitmapAckResponse,
+            "description": "Stored rows (ack=full), per-item acks (compact) or bitmaps (bitmap)",
+        }
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _SYNC_BATCH_SCHEMA}},
+        }
+    },
+)
 async def sync_offline_transactions(
-    payload: SyncBatchRequest,
+    request: Request,
+    ack: SyncAckMode = "full",
     terminal_code: str = Depends(get_current_terminal_code),
 ):
-    terminal_id, _ = await _resolve_terminal_id(terminal_code)
-    responses: list[TransactionResponse] = []
+    """Ingest an offline batch in a single SQLite transaction.
 
-    for tx in payload.transactions:
-        tx.offline_created = True
-        responses.append(await _record_transaction(terminal_id, tx))
+    `ack=full` (default) echoes a TransactionResponse per item. `ack=compact`
+    returns a `SyncCompactAckResponse` and `ack=bitmap` a
+    `SyncBitmapAckResponse`; both report policy rejections per item instead
+    of failing the batch, and skip building full response objects.
 
-    db = await get_db()
-    await db.execute(
-        "UPDATE terminals SET pending_sync_count = 0, last_synced_at = ?, updated_at = ? WHERE id = ?",
-        (now_iso(), now_iso(), terminal_id),
+    The body is validated in bulk (see sync_validation). With `ack=full` any
+    invalid sale fails the whole batch with 422 as before; the other modes
+    reject just that sale with reason `invalid` and its validation errors.
+    """
+    terminal = await _resolve_terminal(terminal_code)
+    terminal_id = terminal["id"]
+    try:
+        batch = validate_sync_batch(await request.body())
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [{**e, "loc": ("body", *e["loc"])} for e in exc.errors(include_url=False)]
+        ) from exc
+    if ack == "full" and len(batch.valid) < len(batch.transactions):
+        raise RequestValidationError(
+            [
+                {**e, "loc": ("body", "transactions", i, *e["loc"])}
+                for i, tx in enumerate(batch.transactions)
+                if isinstance(tx, InvalidItem)
+                for e in tx.errors
+            ]
+        )
+
+    valid = batch.valid
+    signature_status = await _verify_batch_signature(
+        terminal_id, valid, batch.batch_signature
     )
-    await db.commit()
-    await db.close()
+    dumped = iter(dump_transactions(valid))
+    shard = await shards.for_store(terminal["store_name"])
+
+    session = IngestSession(terminal, shard)
+
+    async def write(db: aiosqlite.Connection) -> tuple[list, list, TransactionRejected | None]:
+        rows: list[aiosqlite.Row] = []
+        acks: list[dict] = []
+        session.db = db
+        for tx in batch.transactions:
+            if isinstance(tx, InvalidItem):
+                acks.append(
+                    {
+                        "idempotency_key": tx.idempotency_key,
+                        "id": None,
+                        "status": "rejected",
+                        "reason": "invalid",
+                        "errors": tx.errors,
+                    }
+                )
+                continue
+            tx.offline_created = True
+            try:
+                result = await _ingest_transaction(
+                    session,
+                    terminal_id,
+                    tx,
+                    want_row=ack == "full",
+                    signature_status=signature_status,
+                    fields=next(dumped),
+                )
+            except TransactionRejected as exc:
+                if ack == "full":
+                    # Keep what was accepted before the rejected sale
+                    await session.flush()
+                    return rows, acks, exc
+                acks.append(
+                    {
+                        "idempotency_key": tx.idempotency_key,
+                        "id": None,
+                        "status": "rejected",
+                        "reason": exc.reason,
+                    }
+                )
+                continue
+            if ack == "full":
+                rows.append(result.row)
+                continue
+            acks.append(
+                {
+                    "idempotency_key": tx.idempotency_key,
+                    "id": result.transaction_id,
+                    "status": result.status,
+                    "reason": "payload_mismatch" if result.status == "conflict" else None,
+                }
+            )
+
+        await session.flush()
+        return rows, acks, None
 
-    return responses
+    async def mark_synced(db: aiosqlite.Connection) -> None:
+        synced_at = now_iso()
+        await db.execute(
+            "UPDATE terminals SET pending_sync_count = 0, last_synced_at = ?, last_synced_us = ?, updated_at = ? WHERE id = ?",
+            (synced_at, iso_to_us(synced_at), synced_at, terminal_id),
+        )
+
+    rows, acks, rejected = await shard.writer.submit(write)
+    await session.finish()
+    if rejected is not None:
+        raise rejected
+    await writer.submit(mark_synced)  # Terminals live in the main database
+
+    if ack == "compact":
+        reply = SyncCompactAckResponse(acks=acks)
+    elif ack == "bitmap":
+        reply = _bitmap_acks(acks)
+    else:
+        return [_tx_response(row) for row in rows]
+    # Unset fields (errors, outside invalid rejections) are left out of the reply
+    return Response(reply.model_dump_json(exclude_unset=True), media_type="application/json")
+
+
+async def _verify_batch_signature(
+    terminal_id: int, transactions: list[TransactionRecord], batch_signature: str | None
+) -> str | None:
+    """Verify the batch signature once; returns the status stored per row."""
+    if not batch_signature:
+        if settings.require_batch_signature:
+            raise HTTPException(status_code=403, detail="Batch signature required")
+        return None
+
+    public_key = cached_public_key(terminal_id)
+    if public_key is None:
+        db = await get_db()
+        row = await (
+            await db.execute(
+                "SELECT ecdsa_public_key FROM terminals WHERE id = ?", (terminal_id,)
+            )
+        ).fetchone()
+        await db.close()
+        if not row or not row["ecdsa_public_key"]:
+            raise HTTPException(status_code=403, detail="Terminal has no public key")
+        public_key = cache_public_key(terminal_id, row["ecdsa_public_key"])
+
+    if verify_batch(public_key, transactions, batch_signature):
+        metrics.increment("sync.batch_signatures_verified")
+        return "verified"
+
+    metrics.increment("sync.batch_signatures_invalid")
+    logger.warning("Invalid batch signature from terminal %s", terminal_id)
+    if settings.require_batch_signature:
+        raise HTTPException(status_code=403, detail="Invalid batch signature")
+    return "invalid"
+
+
+def _bitmap_acks(acks: list[dict]) -> SyncBitmapAckResponse:
+    """Pack per-position statuses into base64 bitmaps (bit i = batch item i)."""
+    size = (len(acks) + 7) // 8
+    bitmaps = {
+        status: bytearray(size)
+        for status in ("created", "duplicate", "conflict", "rejected")
+    }
+    reasons = {}
+    for i, item in enumerate(acks):
+        bitmaps[item["status"]][i // 8] |= 1 << (i % 8)
+        if item["reason"]:
+            reasons[str(i)] = item["reason"]
+    return SyncBitmapAckResponse(
+        count=len(acks),
+        **{status: base64.b64encode(bits).decode("ascii") for status, bits in bitmaps.items()},
+        ids=[item["id"] for item in acks],
+        reasons=reasons,
+    )
 
 
 @app.post("/heartbeat")
@@ -362,17 +991,18 @@ async def heartbeat(
 ) -> dict:
     terminal_id, _ = await _resolve_terminal_id(terminal_code)
     now = now_iso()
-    db = await get_db()
-    await db.execute(
-        """
-        UPDATE terminals
-        SET last_seen_at = ?, pending_sync_count = ?, updated_at = ?
-        WHERE id = ?
-        """,
-        (now, payload.current_load, now, terminal_id),
-    )
-    await db.commit()
-    await db.close()
+
+    async def write(db: aiosqlite.Connection) -> None:
+        await db.execute(
+            """
+            UPDATE terminals
+            SET last_seen_at = ?, last_seen_us = ?, pending_sync_count = ?, updated_at = ?
+            WHERE id = ?
+            """,
+            (now, iso_to_us(now), payload.current_load, now, terminal_id),
+        )
+
+    await writer.submit(write)
     sync_heartbeat(terminal_code, now, payload.current_load)
     return {"status": "alive"}
 
@@ -384,95 +1014,106 @@ async def get_system_public_key() -> dict:
 
 
 @app.get("/dashboard/terminals", response_model=list[TerminalResponse])
-async def list_terminals() -> list[TerminalResponse]:
-    db = await get_db()
-    rows = await (
-        await db.execute("SELECT * FROM terminals ORDER BY id DESC")
-    ).fetchall()
-    await db.close()
+async def list_terminals() -> Response:
+    async with readers.connection() as db:
+        rows = await (
+            await db.execute(
+                f"SELECT {TERMINAL_COLUMNS} FROM terminals WHERE deleted_at IS NULL ORDER BY id DESC"
+            )
+        ).fetchall()
 
-    return [
-        TerminalResponse(
-            id=row["id"],
-            terminal_code=row["terminal_code"],
-            store_name=row["store_name"],
-            active=bool(row["active"]),
-            created_at=datetime.fromisoformat(row["created_at"]),
-            last_seen_at=datetime.fromisoformat(row["last_seen_at"])
-            if row["last_seen_at"]
-            else None,
-            status=terminal_status(row["last_seen_at"]),
-            ecdsa_public_key=row["ecdsa_public_key"],
-        )
-        for row in rows
-    ]
+    return Response(terminals_json(rows), media_type="application/json")
 
 
 @app.get("/dashboard/stats", response_model=DashboardStatsResponse)
 async def dashboard_stats() -> DashboardStatsResponse:
-    db = await get_db()
-    sales_row = await (
-        await db.execute(
-            "SELECT COALESCE(SUM(total_amount), 0) AS total_sales, COUNT(*) AS total_transactions FROM transactions"
-        )
-    ).fetchone()
-    offline_row = await (
-        await db.execute(
-            "SELECT COUNT(*) AS count FROM transactions WHERE synced_from_offline = 1"
-        )
-    ).fetchone()
-    terminals = await (
-        await db.execute("SELECT last_seen_at FROM terminals")
-    ).fetchall()
-    await db.close()
+    async def sales(db: aiosqlite.Connection) -> tuple[int, int, int]:
+        row = await (
+            await db.execute(
+                """
+                SELECT COALESCE(SUM(total_ore), 0), COUNT(*),
+                       COALESCE(SUM(synced_from_offline = 1), 0)
+                FROM transactions_all
+                """
+            )
+        ).fetchone()
+        return tuple(row)
+
+    async with readers.snapshot() as snapshot:
+        totals = [
+            sum(column)
+            for column in zip(*await shards.fan_out(sales, snapshot=snapshot))
+        ]
+        db = await snapshot.connection()
+        terminals = await (
+            await db.execute("SELECT last_seen_us FROM terminals WHERE deleted_at IS NULL")
+        ).fetchall()
 
     online_count = sum(
-        1 for row in terminals if terminal_status(row["last_seen_at"]) == "online"
+        1 for row in terminals if terminal_status(row["last_seen_us"]) == "online"
     )
     offline_count = len(terminals) - online_count
 
     return DashboardStatsResponse(
-        total_sales=float(sales_row["total_sales"]),
-        total_transactions=int(sales_row["total_transactions"]),
-        offline_synced_transactions=int(offline_row["count"]),
+        total_sales=from_ore(totals[0]),
+        total_transactions=totals[1],
+        offline_synced_transactions=totals[2],
         online_terminals=online_count,
         offline_terminals=offline_count,
     )
 
 
 @app.get("/dashboard/sync-status", response_model=list[SyncStatusResponse])
-async def sync_status() -> list[SyncStatusResponse]:
-    db = await get_db()
-    rows = await (
-        await db.execute(
-            "SELECT terminal_code, pending_sync_count, last_synced_at FROM terminals ORDER BY terminal_code"
-        )
-    ).fetchall()
-    await db.close()
+async def sync_status() -> Response:
+    async with readers.connection() as db:
+        rows = await (
+            await db.execute(
+                f"""
+                SELECT {SYNC_STATUS_COLUMNS} FROM terminals
+                WHERE deleted_at IS NULL ORDER BY terminal_code
+                """
+            )
+        ).fetchall()
 
-    return [
-        SyncStatusResponse(
-            terminal_code=row["terminal_code"],
-            pending_sync_count=row["pending_sync_count"],
-            last_synced_at=datetime.fromisoformat(row["last_synced_at"])
-            if row["last_synced_at"]
-            else None,
-        )
-        for row in rows
-    ]
+    return Response(sync_status_json(rows), media_type="application/json")
 
 
 @app.get("/dashboard/transactions", response_model=list[TransactionResponse])
-async def list_transactions(limit: int = 100) -> list[TransactionResponse]:
-    db = await get_db()
-    rows = await (
-        await db.execute(
-            "SELECT * FROM transactions ORDER BY id DESC LIMIT ?", (limit,)
-        )
-    ).fetchall()
-    await db.close()
-
-    return [_tx_response(row) for row in rows]
+async def list_transactions(limit: int = 100) -> Response:
+    results = await shards.fan_out(
+        lambda db: recent_transactions(db, limit, TRANSACTION_COLUMNS)
+    )
+    # Newest first by creation time across store shards (ids are per shard)
+    merged = heapq.merge(*results, key=newest_first, reverse=True)
+    rows = [row for _, row in zip(range(limit), merged)]
+
+    return Response(transactions_json(rows), media_type="application/json")
+
+
+@app.get("/export/transactions")
+async def export_transactions(
+    format: Literal["csv", "columns"] = "csv",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    store_name: str | None = None,
+    payment_type: str | None = None,
+) -> StreamingResponse:
+    """Stream matching transactions for accounting without buffering the range"""
+    targets = await shards.covering(store_name)
+
+    async def body():
+        async with readers.snapshot() as snapshot:
+            dbs = [await snapshot.connection(shard.path) for shard in targets]
+            batches = export_batches(dbs, start, end, store_name, payment_type)
+            async for chunk in encode(format, batches):
+                yield chunk
+
+    extension = "csv" if format == "csv" else "ndjson"
+    return StreamingResponse(
+        body(),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="transactions.{extension}"'},
+    )
 
 
 @app.get("/dashboard/terminals/{terminal_id}/private-key")
@@ -492,30 +1133,308 @@ async def get_terminal_private_key(terminal_id: int) -> dict:
     return {"ecdsa_private_key": row["ecdsa_private_key"]}
 
 
-@app.delete("/dashboard/terminals/{terminal_id}")
+async def _terminal_deletion(terminal_id: int) -> aiosqlite.Row:
+    async with readers.connection() as db:
+        row = await (
+            await db.execute(
+                f"SELECT {purge.PURGE_COLUMNS} FROM terminal_purges WHERE terminal_id = ?",
+                (terminal_id,),
+            )
+        ).fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="No deletion for this terminal")
+    return row
+
+
+@app.delete(
+    "/dashboard/terminals/{terminal_id}",
+    response_model=TerminalDeletionResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def delete_terminal(terminal_id: int) -> dict:
-    """Delete a terminal and all its transactions"""
+    """Deactivate a terminal at once and delete it with its sales in the background"""
     db = await get_db()
-
-    # Check if terminal exists
     row = await (
-        await db.execute("SELECT id FROM terminals WHERE id = ?", (terminal_id,))
+        await db.execute(
+            "SELECT id, terminal_code, store_name FROM terminals WHERE id = ?", (terminal_id,)
+        )
     ).fetchone()
-
+    await db.close()
     if not row:
-        await db.close()
         raise HTTPException(status_code=404, detail="Terminal not found")
 
-    # Delete associated transactions first
-    await db.execute("DELETE FROM transactions WHERE terminal_id = ?", (terminal_id,))
+    await purge.start(row)
+    return dict(await _terminal_deletion(terminal_id))
 
-    # Delete the terminal
-    await db.execute("DELETE FROM terminals WHERE id = ?", (terminal_id,))
 
-    await db.commit()
-    await db.close()
+@app.get(
+    "/dashboard/terminals/{terminal_id}/deletion", response_model=TerminalDeletionResponse
+)
+async def get_terminal_deletion(terminal_id: int) -> dict:
+    return dict(await _terminal_deletion(terminal_id))
+
+
+@app.post(
+    "/dashboard/terminals/{terminal_id}/deletion/cancel",
+    response_model=TerminalDeletionResponse,
+)
+async def cancel_terminal_deletion(terminal_id: int) -> dict:
+    """Stop a deletion after its current chunk; the terminal stays deactivated"""
+    await _terminal_deletion(terminal_id)
+    await purge.cancel(terminal_id)
+    return dict(await _terminal_deletion(terminal_id))
+
+
+@app.get("/dashboard/history", response_model=HistoryComparisonResponse)
+async def sales_history(
+    period: Literal["day", "week"] = "week",
+    reference: datetime | None = None,
+    store_name: str | None = None,
+    terminal_code: str | None = None,
+    payment_type: str | None = None,
+) -> HistoryComparisonResponse:
+    """Compare a day or week (ending at `reference`, default now) with the
+    same window one week earlier. Served from the rollup tables only."""
+    terminal = await _resolve_terminal(terminal_code) if terminal_code else None
+    terminal_id = terminal["id"] if terminal else None
+    granularity, current, previous = comparison_windows(period, reference)
+
+    async def rows(db: aiosqlite.Connection) -> list[list]:
+        return [
+            await window_rows(
+                db, granularity, start, end, store_name, terminal_id, payment_type
+            )
+            for start, end in (current, previous)
+        ]
+
+    results = await shards.fan_out(rows, await _covering(store_name, terminal))
+    windows = [
+        window_summary([row for result in results for row in result[i]], start, end)
+        for i, (start, end) in enumerate((current, previous))
+    ]
+
+    def change(now: float, before: float) -> float | None:
+        return round((now - before) / before * 100, 2) if before else None
+
+    return HistoryComparisonResponse(
+        period=period,
+        granularity=granularity,
+        current=HistoryWindow(**windows[0]),
+        previous=HistoryWindow(**windows[1]),
+        sales_change_pct=change(windows[0]["total_sales"], windows[1]["total_sales"]),
+        transactions_change_pct=change(
+            windows[0]["transactions"], windows[1]["transactions"]
+        ),
+    )
+
+
+@app.get("/dashboard/timeseries", response_model=TimeSeriesResponse)
+async def sales_timeseries(
+    metrics_: list[Literal["sales", "transactions", "offline_share"]] = Query(
+        ["sales", "transactions", "offline_share"], alias="metric"
+    ),
+    start: datetime | None = None,
+    end: datetime | None = None,
+    resolution: Literal["auto", "hour", "day"] = "auto",
+    points: int = Query(200, ge=3, le=5000),
+    method: Literal["lttb", "minmax"] = "lttb",
+    store_name: str | None = None,
+    terminal_code: str | None = None,
+) -> TimeSeriesResponse:
+    """Chart series computed from the rollups and downsampled to `points`.
+
+    Cost depends on the number of rollup buckets in range, not on the
+    number of transactions, so a month costs about the same as a day.
+    """
+    # numpy is imported on first use; it is a large part of import time
+    import numpy as np
+
+    from .timeseries import (
+        MAX_BUCKETS,
+        bucket_count,
+        derive,
+        downsample,
+        load_grid,
+        pick_resolution,
+    )
+
+    end = end or datetime.now(UTC)
+    start = start or end - timedelta(days=1)
+    if resolution == "auto":
+        resolution = pick_resolution(start, end)
+    # The grid is dense, so its size is the caller's to choose: cap it
+    if bucket_count(resolution, start, end) > MAX_BUCKETS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Range spans more than {MAX_BUCKETS} {resolution} buckets; "
+            "narrow it or use a coarser resolution",
+        )
+    terminal = await _resolve_terminal(terminal_code) if terminal_code else None
+    terminal_id = terminal["id"] if terminal else None
+
+    results = await shards.fan_out(
+        lambda db: load_grid(db, resolution, start, end, store_name, terminal_id),
+        await _covering(store_name, terminal),
+    )
+    timestamps = results[0][0]
+    grid = {name: sum(g[name] for _, g in results) for name in results[0][1]}
+
+    series = {}
+    for metric in metrics_:
+        x, y = downsample(method, timestamps, derive(metric, grid), points)
+        series[metric] = TimeSeries(
+            timestamps=[datetime.fromtimestamp(int(t), UTC) for t in x],
+            values=np.round(y, 4).tolist(),
+        )
+    return TimeSeriesResponse(
+        resolution=resolution,
+        method=method,
+        start=start,
+        end=end,
+        source_points=len(timestamps),
+        series=series,
+    )
+
+
+# ============================================
+# Product Analytics Endpoints
+# ============================================
+
 
-    return {"status": "deleted", "terminal_id": terminal_id}
+@app.get("/dashboard/products/top", response_model=list[ProductSalesRow])
+async def top_products_endpoint(
+    limit: int = Query(10, ge=1, le=500),
+    order_by: Literal["revenue", "units"] = "revenue",
+    store_name: str | None = None,
+    terminal_code: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> list[ProductSalesRow]:
+    terminal = await _resolve_terminal(terminal_code) if terminal_code else None
+    terminal_id = terminal["id"] if terminal else None
+    targets = await _covering(store_name, terminal)
+    # Per-shard top lists can't be merged exactly, so shards return every product
+    shard_limit = limit if len(targets) == 1 else -1
+    results = await shards.fan_out(
+        lambda db: top_products(
+            db, shard_limit, order_by, store_name, terminal_id, start, end
+        ),
+        targets,
+    )
+    rows = merge_product_rows(results, "product_id")
+    rows.sort(key=lambda row: row[order_by], reverse=True)
+    return [ProductSalesRow(**row) for row in rows[:limit]]
+
+
+@app.get(
+    "/dashboard/products/{product_id}/sales", response_model=list[ProductSalesBucket]
+)
+async def product_sales_endpoint(
+    product_id: str,
+    group_by: Literal["store", "terminal", "hour", "day"] = "day",
+    store_name: str | None = None,
+    terminal_code: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> list[ProductSalesBucket]:
+    """Units and revenue for one product, e.g. bananas per store during an outage."""
+    terminal = await _resolve_terminal(terminal_code) if terminal_code else None
+    terminal_id = terminal["id"] if terminal else None
+    results = await shards.fan_out(
+        lambda db: product_sales(
+            db, product_id, group_by, store_name, terminal_id, start, end
+        ),
+        await _covering(store_name, terminal),
+    )
+    rows = sorted(merge_product_rows(results, "bucket"), key=lambda row: row["bucket"])
+    return [ProductSalesBucket(**row) for row in rows]
+
+
+# ============================================
+# Reconciliation Endpoints
+# ============================================
+
+
+@app.get(
+    "/dashboard/reconciliation/digests", response_model=list[ReconciliationDigest]
+)
+async def reconciliation_digests(
+    level: ReconciliationLevel = "day",
+    terminal_code: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+) -> list[ReconciliationDigest]:
+    """Digests per terminal, day or hour bucket for auditing zero lost sales.
+
+    Compare at the terminal level first and drill down into mismatching days
+    and hours; only a mismatching hour needs its key list fetched.
+    """
+    terminal = await _resolve_terminal(terminal_code) if terminal_code else None
+    terminal_id = terminal["id"] if terminal else None
+    digests = merge_digests(
+        await shards.fan_out(
+            lambda db: bucket_digests(db, level, terminal_id, start, end),
+            await _covering(None, terminal),
+        )
+    )
+    return [ReconciliationDigest(**d) for d in digests]
+
+
+@app.get("/dashboard/reconciliation/keys", response_model=ReconciliationKeysResponse)
+async def reconciliation_keys(
+    terminal_code: str,
+    bucket: str = Query(pattern=r"^\d{4}(-\d{2}(-\d{2}(T\d{2})?)?)?$"),
+) -> ReconciliationKeysResponse:
+    terminal = await _resolve_terminal(terminal_code)
+    terminal_id = terminal["id"]
+    results = await shards.fan_out(
+        lambda db: bucket_keys(db, terminal_id, bucket), await _covering(None, terminal)
+    )
+    keys = sorted(key for result in results for key in result)
+    return ReconciliationKeysResponse(
+        terminal_id=terminal_id, bucket=bucket, idempotency_keys=keys
+    )
+
+
+@app.post("/reconciliation/compare", response_model=ReconciliationCompareResponse)
+async def reconciliation_compare(
+    payload: ReconciliationCompareRequest,
+    terminal_code: str = Depends(get_current_terminal_code),
+) -> ReconciliationCompareResponse:
+    """Compare a terminal's own bucket digests against the backend's."""
+    terminal = await _resolve_terminal(terminal_code)
+    terminal_id = terminal["id"]
+    buckets = [d.bucket for d in payload.digests]
+    start = min(buckets) if buckets and payload.level != "terminal" else None
+    end = max(buckets) if buckets and payload.level != "terminal" else None
+
+    results = await shards.fan_out(
+        lambda db: bucket_digests(db, payload.level, terminal_id, start, end),
+        await _covering(None, terminal),
+    )
+    server = {d["bucket"]: d for d in merge_digests(results)}
+
+    client = {d.bucket: d for d in payload.digests}
+    mismatched = []
+    matched = 0
+    for bucket in sorted(set(server) | set(client)):
+        s, c = server.get(bucket), client.get(bucket)
+        if s and c and s["digest"] == c.digest and s["tx_count"] == c.tx_count:
+            matched += 1
+            continue
+        mismatched.append(
+            ReconciliationMismatch(
+                bucket=bucket,
+                server_count=s["tx_count"] if s else 0,
+                client_count=c.tx_count if c else 0,
+                server_digest=s["digest"] if s else None,
+                client_digest=c.digest if c else None,
+            )
+        )
+
+    return ReconciliationCompareResponse(
+        level=payload.level, matched=matched, mismatched=mismatched
+    )
 
 
 # ============================================
@@ -525,9 +1444,8 @@ async def delete_terminal(terminal_id: int) -> dict:
 
 @app.get("/admin/settings", response_model=AdminSettingsResponse)
 async def get_admin_settings():
-    db = await get_db()
-    rows = await (await db.execute("SELECT key, value FROM admin_settings")).fetchall()
-    await db.close()
+    async with readers.connection() as db:
+        rows = await (await db.execute("SELECT key, value FROM admin_settings")).fetchall()
     s = {r["key"]: r["value"] for r in rows}
     return _build_admin_settings_response(s)
 
@@ -551,54 +1469,221 @@ def _build_admin_settings_response(s: dict) -> AdminSettingsResponse:
 
 @app.put("/admin/settings", response_model=AdminSettingsResponse)
 async def update_admin_settings(payload: AdminSettingsUpdateRequest):
-    db = await get_db()
     now = now_iso()
-    for key in _BOOL_SETTINGS + _INT_SETTINGS:
-        value = getattr(payload, key, None)
-        if value is not None:
-            stored = str(value).lower() if key in _BOOL_SETTINGS else str(value)
-            await db.execute(
-                "INSERT INTO admin_settings (key, value, updated_at) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET value = ?, updated_at = ?",
-                (key, stored, now, stored, now),
-            )
-    await db.commit()
-    rows = await (await db.execute("SELECT key, value FROM admin_settings")).fetchall()
-    await db.close()
+
+    async def write(db: aiosqlite.Connection) -> list[aiosqlite.Row]:
+        for key in _BOOL_SETTINGS + _INT_SETTINGS:
+            value = getattr(payload, key, None)
+            if value is not None:
+                stored = str(value).lower() if key in _BOOL_SETTINGS else str(value)
+                await db.execute(
+                    "INSERT INTO admin_settings (key, value, updated_at) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET value = ?, updated_at = ?",
+                    (key, stored, now, stored, now),
+                )
+        return await (await db.execute("SELECT key, value FROM admin_settings")).fetchall()
+
+    rows = await writer.submit(write)
     s = {r["key"]: r["value"] for r in rows}
     return _build_admin_settings_response(s)
 
 
-@app.get("/admin/invoice-stats", response_model=InvoiceStatsResponse)
-async def get_invoice_stats():
-    db = await get_db()
-    total_row = await (
-        await db.execute(
-            "SELECT COUNT(*) as cnt, COALESCE(SUM(total_amount), 0) as amt FROM transactions WHERE is_invoice = 1"
-        )
-    ).fetchone()
-    member_row = await (
-        await db.execute(
-            "SELECT COUNT(*) as cnt, COALESCE(SUM(total_amount), 0) as amt FROM transactions WHERE is_invoice = 1 AND membership_number IS NOT NULL"
-        )
-    ).fetchone()
-    non_member_row = await (
+@app.get("/admin/partitions", response_model=list[TransactionPartition])
+async def list_partitions() -> list[TransactionPartition]:
+    targets = await shards.covering()
+    results = await shards.fan_out(
+        lambda db: _partition_rows(db, "1 = 1", ()), targets
+    )
+    return _partitions(targets, results)
+
+
+async def _partition_rows(
+    db: aiosqlite.Connection, where: str, params: tuple
+) -> list[aiosqlite.Row]:
+    return await (
         await db.execute(
-            "SELECT COUNT(*) as cnt, COALESCE(SUM(total_amount), 0) as amt FROM transactions WHERE is_invoice = 1 AND membership_number IS NULL"
+            f"SELECT * FROM transaction_partitions WHERE {where} ORDER BY month", params
         )
-    ).fetchone()
-    settings_rows = await (
-        await db.execute("SELECT key, value FROM admin_settings")
     ).fetchall()
-    await db.close()
+
+
+def _partitions(
+    targets: list[shards.Shard], results: list[list[aiosqlite.Row]]
+) -> list[TransactionPartition]:
+    partitions = [
+        TransactionPartition(**dict(row), shard_id=shard.id)
+        for shard, rows in zip(targets, results)
+        for row in rows
+    ]
+    return sorted(partitions, key=lambda p: (p.month, p.shard_id))
+
+
+@app.post("/admin/partitions/archive", response_model=list[TransactionPartition])
+async def archive_partitions(
+    live_months: int | None = Query(default=None, ge=1),
+    export: bool = False,
+) -> list[TransactionPartition]:
+    """Seal every month older than the live window into its own table, in every store shard"""
+    cutoff = archive_cutoff(live_months or settings.partition_live_months)
+    targets = await shards.covering()
+    for shard in targets:
+        async with readers.connection(shard.path) as db:
+            months = await archivable_months(db, cutoff)
+        for month in months:
+            moved = await _archive_month(shard, month)
+            logger.info("Archived %d transactions for %s (shard %d)", moved, month, shard.id)
+            if export:
+                await _export_month(shard, month)
+    results = await shards.fan_out(
+        lambda db: _partition_rows(db, "month < ?", (cutoff,)), targets
+    )
+    return _partitions(targets, results)
+
+
+async def _archive_month(shard: shards.Shard, month: str) -> int:
+    """Move a month into its sealed table in bounded writer ops, like a purge."""
+
+    async def open_op(db: aiosqlite.Connection) -> None:
+        if await open_month(db, month):
+            shard.writer.after_commit(lambda: mark_sealed(shard.writer.database, month))
+
+    await shard.writer.submit(open_op)
+    moved = 0
+    while chunk := await shard.writer.submit(
+        lambda db: archive_chunk(db, month, settings.archive_chunk_size)
+    ):
+        moved += chunk
+        await asyncio.sleep(settings.archive_pause_ms / 1000)
+    await shard.writer.submit(lambda db: close_month(db, month))
+    return moved
+
+
+async def _export_month(shard: shards.Shard, month: str) -> None:
+    async with readers.connection(shard.path) as db:
+        path, size = await export_partition(db, month, shards.archive_dir(shard))
+    await shard.writer.submit(lambda db: record_export(db, month, path, size))
+
+
+@app.post("/admin/partitions/{month}/export", response_model=TransactionPartition)
+async def export_partition_endpoint(month: str, shard_id: int = 0) -> TransactionPartition:
+    shard = await shards.get(shard_id)
+    if shard is None:
+        raise HTTPException(status_code=404, detail=f"No store shard {shard_id}")
+    try:
+        await _export_month(shard, month)
+    except (LookupError, ValueError) as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    async with readers.connection(shard.path) as db:
+        row = await (
+            await db.execute("SELECT * FROM transaction_partitions WHERE month = ?", (month,))
+        ).fetchone()
+    return TransactionPartition(**dict(row), shard_id=shard.id)
+
+
+# Progress/report of the most recent payload compaction run
+_payload_compaction: dict = {"status": "idle"}
+
+
+async def _run_payload_compaction() -> None:
+    targets = await shards.covering()
+    try:
+        async with readers.snapshot() as snapshot:
+            trained = await train_dictionary(
+                [await snapshot.connection(shard.path) for shard in targets],
+                settings.payload_dictionary_size,
+                settings.payload_dictionary_samples,
+            )
+        _payload_compaction["dictionary_id"] = None
+        if trained is not None:
+            # One dictionary for all store shards, kept in the main database
+            _payload_compaction["dictionary_id"] = await writer.submit(
+                lambda db: store_dictionary(db, *trained)
+            )
+            async with readers.connection() as db:
+                await load_dictionaries(db)
+        for shard in targets:
+            async with readers.connection(shard.path) as db:
+                tables = ["transactions", *await partition_tables(db)]
+            await compact_payloads(shard.writer.submit, tables, progress=_payload_compaction)
+        _payload_compaction["status"] = "done"
+        logger.info("Payload compaction finished: %s", _payload_compaction)
+    except Exception:
+        _payload_compaction["status"] = "failed"
+        logger.exception("Payload compaction failed")
+    finally:
+        _payload_compaction["finished_at"] = now_iso()
+
+
+@app.post("/admin/payloads/compact", status_code=status.HTTP_202_ACCEPTED)
+async def start_payload_compaction() -> dict:
+    """Train a payload dictionary and repack legacy JSON payloads in the background"""
+    if _payload_compaction["status"] != "running":
+        _payload_compaction.clear()
+        _payload_compaction.update(status="running", started_at=now_iso())
+        _payload_compaction["task"] = asyncio.create_task(_run_payload_compaction())
+    return get_payload_compaction()
+
+
+@app.get("/admin/payloads/compact")
+def get_payload_compaction() -> dict:
+    return {k: v for k, v in _payload_compaction.items() if k != "task"}
+
+
+@app.get("/admin/maintenance", response_model=list[DatabaseHealth])
+async def get_maintenance() -> list[dict]:
+    """Size, WAL and free-page figures per database, with the last maintenance run."""
+    return await maintenance.health()
+
+
+@app.post("/admin/maintenance", response_model=list[DatabaseHealth])
+async def run_maintenance() -> list[dict]:
+    """Checkpoint, vacuum and analyze every database now, without waiting for a quiet period."""
+    await maintenance.run_once(force=True)
+    return await maintenance.health()
+
+
+@app.post("/admin/backups", status_code=status.HTTP_202_ACCEPTED)
+async def start_backup() -> dict:
+    """Back up every database online in the background, then verify and rotate"""
+    return backups.start()
+
+
+@app.get("/admin/backups")
+def get_backups() -> dict:
+    return {"last": backups.report(), "sets": backups.list_sets()}
+
+
+@app.get("/admin/invoice-stats", response_model=InvoiceStatsResponse)
+async def get_invoice_stats():
+    async def counts(db: aiosqlite.Connection) -> list[tuple[int, int]]:
+        rows = []
+        for where in ("", " AND membership_number IS NOT NULL", " AND membership_number IS NULL"):
+            row = await (
+                await db.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(total_ore), 0) FROM transactions_all WHERE is_invoice = 1{where}"
+                )
+            ).fetchone()
+            rows.append(tuple(row))
+        return rows
+
+    async with readers.snapshot() as snapshot:
+        results = await shards.fan_out(counts, snapshot=snapshot)
+        db = await snapshot.connection()
+        settings_rows = await (
+            await db.execute("SELECT key, value FROM admin_settings")
+        ).fetchall()
+    total_row, member_row, non_member_row = (
+        {"cnt": sum(r[i][0] for r in results), "amt": sum(r[i][1] for r in results)}
+        for i in range(3)
+    )
     s = {r["key"]: r["value"] for r in settings_rows}
     threshold = int(s.get("non_member_invoice_threshold", "10"))
     return InvoiceStatsResponse(
         total_invoices=total_row["cnt"],
-        total_invoice_amount=float(total_row["amt"]),
+        total_invoice_amount=from_ore(total_row["amt"]),
         member_invoices=member_row["cnt"],
-        member_invoice_amount=float(member_row["amt"]),
+        member_invoice_amount=from_ore(member_row["amt"]),
         non_member_invoices=non_member_row["cnt"],
-        non_member_invoice_amount=float(non_member_row["amt"]),
+        non_member_invoice_amount=from_ore(non_member_row["amt"]),
         non_member_invoice_threshold=threshold,
         auto_disabled=s.get("allow_invoice_non_members") != "true"
         and non_member_row["cnt"] >= threshold,
@@ -719,7 +1804,10 @@ async def mobile_checkout(
     db = await get_db()
     row = await (
         await db.execute(
-            "SELECT id, ecdsa_public_key FROM terminals WHERE terminal_code = ?",
+            """
+            SELECT id, store_name, ecdsa_public_key FROM terminals
+            WHERE terminal_code = ? AND deleted_at IS NULL
+            """,
             (terminal_code,),
         )
     ).fetchone()
@@ -743,46 +1831,75 @@ async def mobile_checkout(
         return HTMLResponse(content=_error_html("Invalid signature"), status_code=403)
 
     print(f"[DEBUG] Signature verification SUCCESS")
+    await db.close()
 
     # Create unpaid transaction
     idempotency_key = payload_data.get("idempotency_key")
-    total_amount = payload_data.get("total_amount", 0)
     items = payload_data.get("items", [])
+    try:
+        total_ore = _scan_pay_total(payload_data.get("total_amount", 0), items)
+    except (AttributeError, TypeError, ValueError) as e:
+        print(f"[DEBUG] Invalid amounts: {e}")
+        return HTMLResponse(content=_error_html("Invalid amount"), status_code=400)
+    total_amount = from_ore(total_ore)
+    store_name = row["store_name"]
+    shard = await shards.for_store(store_name)
+
+    async def write(db: aiosqlite.Connection) -> tuple[int, str]:
+        # Check if transaction already exists
+        existing = await (
+            await db.execute(
+                "SELECT id, payment_status FROM transactions WHERE terminal_id = ? AND idempotency_key = ?",
+                (terminal_id, idempotency_key),
+            )
+        ).fetchone()
 
-    # Check if transaction already exists
-    existing = await (
-        await db.execute(
-            "SELECT id, payment_status FROM transactions WHERE terminal_id = ? AND idempotency_key = ?",
-            (terminal_id, idempotency_key),
-        )
-    ).fetchone()
-
-    if existing:
-        tx_id = existing["id"]
-        payment_status = existing["payment_status"]
-    else:
-        # Create new transaction with pending status
-        item_count = sum(item.get("quantity", 1) for item in items)
-        cur = await db.execute(
-            """
-            INSERT INTO transactions (terminal_id, idempotency_key, total_amount, item_count, payload_json, occurred_at, created_at, payment_type, payment_status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, 'scan_pay', 'pending')
-            """,
-            (
+        if existing:
+            tx_id = existing["id"]
+            payment_status = existing["payment_status"]
+        else:
+            # Create new transaction with pending status
+            item_count = sum(item.get("quantity", 1) for item in items)
+            occurred_at = now_iso()
+            cur = await db.execute(
+                """
+                INSERT INTO transactions (terminal_id, idempotency_key, total_amount, total_ore, item_count, payload_json, payload_blob, occurred_at, occurred_us, created_at, created_us, payment_type, payment_status)
+                VALUES (?, ?, ?, ?, ?, '', ?, ?, ?, ?, ?, 'scan_pay', 'pending')
+                """,
+                (
+                    terminal_id,
+                    idempotency_key,
+                    total_amount,
+                    total_ore,
+                    item_count,
+                    encode_payload(items),
+                    occurred_at,
+                    iso_to_us(occurred_at),
+                    occurred_at,
+                    iso_to_us(occurred_at),
+                ),
+            )
+            tx_id = cur.lastrowid
+            await record_bucket(
+                db, terminal_id, idempotency_key, datetime.fromisoformat(occurred_at)
+            )
+            await insert_items(
+                db,
+                item_rows(tx_id, terminal_id, datetime.fromisoformat(occurred_at), items),
+            )
+            await record_sale(
+                db,
+                datetime.fromisoformat(occurred_at),
+                store_name,
                 terminal_id,
-                idempotency_key,
-                total_amount,
-                item_count,
-                json.dumps(items),
-                now_iso(),
-                now_iso(),
-            ),
-        )
-        await db.commit()
-        tx_id = cur.lastrowid
-        payment_status = "pending"
+                "scan_pay",
+                total_ore,
+                False,
+            )
+            payment_status = "pending"
+        return tx_id, payment_status
 
-    await db.close()
+    tx_id, payment_status = await shard.writer.submit(write)
 
     # Return shopping cart HTML page
     return HTMLResponse(
@@ -792,38 +1909,63 @@ async def mobile_checkout(
     )
 
 
+def _scan_pay_total(total_amount, items) -> int:
+    """Check a QR cart's amounts up front; returns the total in öre.
+
+    Raises ValueError (or TypeError/AttributeError for a malformed cart) on a
+    negative total, a price out of range, or a quantity that isn't 1..MAX_QUANTITY.
+    """
+    total_ore = to_ore(total_amount)
+    if total_ore < 0:
+        raise ValueError("total must not be negative")
+    for item in items:
+        to_ore(item.get("price", 0))
+        quantity = item.get("quantity", 1)
+        if not isinstance(quantity, int) or isinstance(quantity, bool):
+            raise TypeError("quantity must be an integer")
+        if not 0 < quantity <= MAX_QUANTITY:
+            raise ValueError(f"quantity must be 1..{MAX_QUANTITY}")
+    return total_ore
+
+
 @app.post("/mobile-checkout/{tx_id}/pay")
 async def process_mobile_payment(tx_id: int):
     """Process payment for mobile checkout transaction"""
-    db = await get_db()
+    shard = await shards.for_transaction(tx_id)
+    if shard is None:
+        raise HTTPException(status_code=404, detail="Transaction not found")
 
-    row = await (
-        await db.execute("SELECT * FROM transactions WHERE id = ?", (tx_id,))
-    ).fetchone()
+    async def write(db: aiosqlite.Connection) -> dict:
+        row = await (
+            await db.execute("SELECT payment_status FROM transactions WHERE id = ?", (tx_id,))
+        ).fetchone()
 
-    if not row:
-        await db.close()
-        raise HTTPException(status_code=404, detail="Transaction not found")
+        if not row:
+            raise HTTPException(status_code=404, detail="Transaction not found")
 
-    if row["payment_status"] == "completed":
-        await db.close()
-        return {"status": "already_paid", "tx_id": tx_id}
+        if row["payment_status"] == "completed":
+            return {"status": "already_paid", "tx_id": tx_id}
 
-    # Update payment status to completed
-    await db.execute(
-        "UPDATE transactions SET payment_status = 'completed', paid_at = ? WHERE id = ?",
-        (now_iso(), tx_id),
-    )
-    await db.commit()
-    await db.close()
+        # Update payment status to completed
+        paid_at = now_iso()
+        await db.execute(
+            "UPDATE transactions SET payment_status = 'completed', paid_at = ?, paid_us = ? WHERE id = ?",
+            (paid_at, iso_to_us(paid_at), tx_id),
+        )
+        return {"status": "success", "tx_id": tx_id}
 
-    return {"status": "success", "tx_id": tx_id}
+    return await shard.writer.submit(write)
 
 
 @app.get("/mobile-checkout/{tx_id}/verification", response_class=HTMLResponse)
 async def get_verification_page(tx_id: int):
     """Get verification page with QR code for terminal to scan"""
-    db = await get_db()
+    shard = await shards.for_transaction(tx_id)
+    if shard is None:
+        return HTMLResponse(
+            content=_error_html("Transaction not found"), status_code=404
+        )
+    db = await get_db(shard.path)
 
     row = await (
         await db.execute(
@@ -848,7 +1990,7 @@ async def get_verification_page(tx_id: int):
         "tx_id": row["id"],
         "terminal_code": row["terminal_code"],
         "idempotency_key": row["idempotency_key"],
-        "total_amount": row["total_amount"],
+        "total_amount": from_ore(row["total_ore"]),
         "payment_status": row["payment_status"],
     }
 
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import aiosqlite
+
+from . import coherence, metrics, shards
+from .config import settings
+from .database import get_db, now_iso
+
+logger = logging.getLogger(__name__)
+
+# Housekeeping for every database file (the main one and store shards),
+# every MAINTENANCE_INTERVAL_SECONDS:
+#
+#   - a PASSIVE checkpoint once the -wal file passes WAL_CHECKPOINT_BYTES; it
+#     copies what it can without waiting for readers or the writer
+#   - once nothing has been written for MAINTENANCE_QUIET_SECONDS: an
+#     incremental vacuum of up to VACUUM_PAGES_PER_RUN free pages, ANALYZE if
+#     ANALYZE_AFTER_WRITES writes have gone by since the last one, then a
+#     TRUNCATE checkpoint to shrink the -wal file back to nothing. TRUNCATE
+#     holds new writers back while it waits for readers, so it only runs when
+#     quiet and gives up after a short busy timeout.
+#
+# Vacuum and ANALYZE write, so they run as ops on the database's writer.
+
+
+@dataclass
+class _State:
+    db: aiosqlite.Connection  # Checkpoints and stats; never writes rows
+    data_version: int
+    changed_at: float
+    writes_at_analyze: int
+    last_checkpoint: dict | None = None
+    last_vacuum_at: str | None = None
+    vacuumed_pages: int = 0
+    last_analyze_at: str | None = None
+
+
+_states: dict[str, _State] = {}
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+async def _pragma(db: aiosqlite.Connection, name: str) -> int:
+    return (await (await db.execute(f"PRAGMA {name}")).fetchone())[0]
+
+
+async def _state(shard: shards.Shard) -> _State:
+    state = _states.get(shard.path)
+    if state is None:
+        db = await get_db(shard.path)
+        await db.execute("PRAGMA busy_timeout = 50")
+        state = _states[shard.path] = _State(
+            db, await coherence.data_version(db), time.monotonic(), shard.writer.committed_ops
+        )
+    return state
+
+
+async def _checkpoint(state: _State, mode: str) -> None:
+    started = time.perf_counter()
+    busy, log_frames, checkpointed = await (
+        await state.db.execute(f"PRAGMA wal_checkpoint({mode})")
+    ).fetchone()
+    duration_ms = (time.perf_counter() - started) * 1000
+    metrics.increment("maintenance.checkpoints")
+    metrics.observe("maintenance.checkpoint_ms", duration_ms)
+    state.last_checkpoint = {
+        "mode": mode.lower(),
+        "busy": bool(busy),
+        "log_frames": log_frames,
+        "checkpointed_frames": checkpointed,
+        "duration_ms": round(duration_ms, 3),
+        "at": now_iso(),
+    }
+
+
+async def _maintain(shard: shards.Shard, force: bool) -> None:
+    state = await _state(shard)
+    version = await coherence.data_version(state.db)
+    if version != state.data_version:
+        state.data_version, state.changed_at = version, time.monotonic()
+    quiet = force or time.monotonic() - state.changed_at >= settings.maintenance_quiet_seconds
+
+    if not quiet:
+        if _size(f"{shard.path}-wal") >= settings.wal_checkpoint_bytes:
+            await _checkpoint(state, "PASSIVE")
+        return
+
+    freelist = await _pragma(state.db, "freelist_count")
+    if freelist and await _pragma(state.db, "auto_vacuum") == 2:
+        pages = min(freelist, settings.vacuum_pages_per_run)
+
+        async def vacuum(db: aiosqlite.Connection) -> None:
+            # The sqlite3 module steps the pragma only once, which frees a
+            # single page and leaves it unfinished, so free them one at a time
+            for _ in range(pages):
+                await (await db.execute("PRAGMA incremental_vacuum(1)")).close()
+
+        await shard.writer.submit(vacuum)
+        metrics.increment("maintenance.vacuumed_pages", pages)
+        state.vacuumed_pages += pages
+        state.last_vacuum_at = now_iso()
+
+    writes = shard.writer.committed_ops
+    if force or writes - state.writes_at_analyze >= settings.analyze_after_writes:
+
+        async def analyze(db: aiosqlite.Connection) -> None:
+            # Sampled statistics: bounded cost however big the tables get
+            await db.execute("PRAGMA analysis_limit = 1000")
+            await db.execute("ANALYZE")
+
+        started = time.perf_counter()
+        await shard.writer.submit(analyze)
+        metrics.observe("maintenance.analyze_ms", (time.perf_counter() - started) * 1000)
+        state.writes_at_analyze = writes
+        state.last_analyze_at = now_iso()
+
+    if _size(f"{shard.path}-wal"):
+        await _checkpoint(state, "TRUNCATE")
+    # Our own vacuum and ANALYZE don't end the quiet period
+    state.data_version = await coherence.data_version(state.db)
+
+
+async def run_once(force: bool = False) -> None:
+    """One maintenance pass over every database; `force` treats them all as quiet."""
+    for shard in await shards.covering():
+        await _maintain(shard, force)
+
+
+async def run() -> None:
+    while True:
+        await asyncio.sleep(settings.maintenance_interval_seconds)
+        try:
+            await run_once()
+        except Exception:
+            logger.exception("Maintenance pass failed")
+
+
+async def health() -> list[dict]:
+    """File, WAL and free-page figures per database, with the last maintenance done."""
+    report = []
+    for shard in await shards.covering():
+        state = await _state(shard)
+        report.append(
+            {
+                "shard_id": shard.id,
+                "path": shard.path,
+                "file_bytes": _size(shard.path),
+                "wal_bytes": _size(f"{shard.path}-wal"),
+                "page_size": await _pragma(state.db, "page_size"),
+                "page_count": await _pragma(state.db, "page_count"),
+                "freelist_count": await _pragma(state.db, "freelist_count"),
+                "auto_vacuum": ("none", "full", "incremental")[
+                    await _pragma(state.db, "auto_vacuum")
+                ],
+                "last_checkpoint": state.last_checkpoint,
+                "last_vacuum_at": state.last_vacuum_at,
+                "vacuumed_pages": state.vacuumed_pages,
+                "last_analyze_at": state.last_analyze_at,
+            }
+        )
+    return report
+
+
+async def close() -> None:
+    for state in _states.values():
+        await state.db.close()
+    _states.clear()
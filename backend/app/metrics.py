@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+
+_started_at = time.time()
+_counters: dict[str, float] = defaultdict(float)
+_timings: dict[str, dict[str, float]] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Add to a monotonically increasing counter."""
+    _counters[name] += value
+
+
+def observe(name: str, value: float) -> None:
+    """Record one sample (latency, batch size, ...) into a summary."""
+    summary = _timings.get(name)
+    if summary is None:
+        _timings[name] = {"count": 1, "sum": value, "max": value}
+        return
+    summary["count"] += 1
+    summary["sum"] += value
+    if value > summary["max"]:
+        summary["max"] = value
+
+
+def snapshot() -> dict:
+    """Return a JSON-serialisable copy of all metrics in this process."""
+    return {
+        "uptime_seconds": round(time.time() - _started_at, 3),
+        "counters": dict(_counters),
+        "summaries": {
+            name: {**s, "avg": s["sum"] / s["count"] if s["count"] else 0.0}
+            for name, s in _timings.items()
+        },
+    }
+
+
+def ratio(
+    numerator: str, denominator: str, counters: dict | None = None
+) -> float | None:
+    """Ratio of two counters, or None while the denominator is still zero."""
+    counters = _counters if counters is None else counters
+    den = counters.get(denominator, 0)
+    if not den:
+        return None
+    return round(counters.get(numerator, 0) / den, 3)
+
+
+# With several worker processes each one writes its snapshot to a shared
+# directory; any worker can then answer for all of them.
+
+
+def write_snapshot(directory: str) -> None:
+    path = Path(directory) / f"worker-{os.getpid()}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(snapshot()))
+    tmp.replace(path)
+
+
+def remove_snapshot(directory: str) -> None:
+    (Path(directory) / f"worker-{os.getpid()}.json").unlink(missing_ok=True)
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def worker_snapshots(directory: str) -> list[dict]:
+    """Latest snapshot of every live worker; files of dead workers are removed."""
+    snapshots = []
+    for path in Path(directory).glob("worker-*.json"):
+        if not pid_alive(int(path.stem.removeprefix("worker-"))):
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # Being replaced right now
+    return snapshots
+
+
+def merge(snapshots: list[dict]) -> dict:
+    """Sum counters and combine summaries across worker snapshots."""
+    counters: dict[str, float] = defaultdict(float)
+    summaries: dict[str, dict[str, float]] = {}
+    for snap in snapshots:
+        for name, value in snap["counters"].items():
+            counters[name] += value
+        for name, s in snap["summaries"].items():
+            total = summaries.setdefault(name, {"count": 0, "sum": 0.0, "max": s["max"]})
+            total["count"] += s["count"]
+            total["sum"] += s["sum"]
+            total["max"] = max(total["max"], s["max"])
+    return {
+        "workers": len(snapshots),
+        "uptime_seconds": max((s["uptime_seconds"] for s in snapshots), default=0.0),
+        "counters": dict(counters),
+        "summaries": {
+            name: {**s, "avg": s["sum"] / s["count"] if s["count"] else 0.0}
+            for name, s in summaries.items()
+        },
+    }
@@ -1,7 +1,12 @@
 from datetime import datetime
-from typing import Literal
+from typing import Annotated, Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, WithJsonSchema
+
+from .money import MAX_QUANTITY, Kronor
+
+# ISO-8601 UTC text formatted straight from epoch-microsecond columns
+IsoTimestamp = Annotated[str, WithJsonSchema({"type": "string", "format": "date-time"})]
 
 
 # Payment type definitions
@@ -74,8 +79,8 @@ class TerminalResponse(BaseModel):
     terminal_code: str
     store_name: str
     active: bool
-    created_at: datetime
-    last_seen_at: datetime | None = None
+    created_at: IsoTimestamp
+    last_seen_at: IsoTimestamp | None = None
     status: Literal["online", "offline"]
     ecdsa_public_key: str | None = None
 
@@ -87,8 +92,8 @@ class TerminalCreateResponse(BaseModel):
     terminal_code: str
     store_name: str
     active: bool
-    created_at: datetime
-    last_seen_at: datetime | None = None
+    created_at: IsoTimestamp
+    last_seen_at: IsoTimestamp | None = None
     status: Literal["online", "offline"]
     ecdsa_private_key: str  # Only returned on creation
     ecdsa_public_key: str
@@ -99,15 +104,20 @@ class HeartbeatRequest(BaseModel):
 
 
 class TransactionItem(BaseModel):
+    # Money is held as integer öre; the API still speaks kronor under the old names
+    model_config = ConfigDict(validate_by_name=True, serialize_by_alias=True)
+
     product_id: str
     name: str
-    price: float
-    quantity: int = Field(gt=0)
+    price_ore: Kronor = Field(alias="price")
+    quantity: int = Field(gt=0, le=MAX_QUANTITY)
 
 
 class TransactionCreateRequest(BaseModel):
+    model_config = ConfigDict(validate_by_name=True, serialize_by_alias=True)
+
     idempotency_key: str
-    total_amount: float = Field(ge=0)
+    total_ore: Kronor = Field(alias="total_amount", ge=0)
     items: list[TransactionItem]
     occurred_at: datetime
     offline_created: bool = False
@@ -116,6 +126,38 @@ class TransactionCreateRequest(BaseModel):
 
 class SyncBatchRequest(BaseModel):
     transactions: list[TransactionCreateRequest]
+    # Base64 ECDSA P-256 signature (P1363 or DER) over the canonical batch,
+    # made with the terminal's private key; see batch_signing.canonical_batch
+    batch_signature: str | None = None
+
+
+SyncAckMode = Literal["full", "compact", "bitmap"]
+
+
+class SyncAck(BaseModel):
+    """Compact per-item acknowledgement for an offline sync batch"""
+
+    idempotency_key: str
+    id: int | None = None  # Server transaction id, None when rejected
+    status: Literal["created", "duplicate", "conflict", "rejected"]
+    reason: str | None = None  # Reason code for conflict/rejected
+    errors: list[dict] | None = None  # Validation errors when reason is "invalid"
+
+
+class SyncCompactAckResponse(BaseModel):
+    acks: list[SyncAck]
+
+
+class SyncBitmapAckResponse(BaseModel):
+    """Statuses as base64 bitmaps keyed by batch position (bit i = item i, LSB first)"""
+
+    count: int
+    created: str
+    duplicate: str
+    conflict: str  # Key already used for a different payload
+    rejected: str
+    ids: list[int | None]
+    reasons: dict[str, str]  # Batch position -> rejection reason code
 
 
 class TransactionResponse(BaseModel):
@@ -124,13 +166,14 @@ class TransactionResponse(BaseModel):
     idempotency_key: str
     total_amount: float
     item_count: int
-    occurred_at: datetime
-    created_at: datetime
+    occurred_at: IsoTimestamp
+    created_at: IsoTimestamp
     synced_from_offline: bool
     payment_type: PaymentType | None = None
     customer_email: str | None = None
     membership_number: str | None = None
     is_invoice: bool = False
+    signature_status: Literal["verified", "invalid"] | None = None
 
 
 class DashboardStatsResponse(BaseModel):
@@ -141,10 +184,49 @@ class DashboardStatsResponse(BaseModel):
     offline_terminals: int
 
 
+class HistoryBucket(BaseModel):
+    bucket: str  # "YYYY-MM-DDTHH" or "YYYY-MM-DD" (UTC)
+    total_sales: float
+    transactions: int
+
+
+class HistoryWindow(BaseModel):
+    start: datetime
+    end: datetime
+    total_sales: float
+    transactions: int
+    offline_transactions: int
+    by_payment_type: dict[str, float]
+    buckets: list[HistoryBucket]
+
+
+class HistoryComparisonResponse(BaseModel):
+    period: Literal["day", "week"]
+    granularity: Literal["hour", "day"]
+    current: HistoryWindow
+    previous: HistoryWindow
+    sales_change_pct: float | None = None
+    transactions_change_pct: float | None = None
+
+
+class TimeSeries(BaseModel):
+    timestamps: list[datetime]
+    values: list[float]
+
+
+class TimeSeriesResponse(BaseModel):
+    resolution: Literal["hour", "day"]
+    method: Literal["lttb", "minmax"]
+    start: datetime
+    end: datetime
+    source_points: int  # Buckets before downsampling
+    series: dict[str, TimeSeries]
+
+
 class SyncStatusResponse(BaseModel):
     terminal_code: str
     pending_sync_count: int
-    last_synced_at: datetime | None
+    last_synced_at: IsoTimestamp | None
 
 
 class AdminSettingsResponse(BaseModel):
@@ -188,3 +270,105 @@ class InvoiceStatsResponse(BaseModel):
     non_member_invoice_amount: float
     non_member_invoice_threshold: int
     auto_disabled: bool
+
+
+class TerminalDeletionResponse(BaseModel):
+    terminal_id: int
+    terminal_code: str
+    store_name: str
+    status: Literal["running", "cancelling", "cancelled", "done", "failed"]
+    rows_total: int  # Sales the terminal had when its deletion (re)started
+    rows_deleted: int
+    started_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None = None
+    error: str | None = None
+
+
+class TransactionPartition(BaseModel):
+    month: str
+    table_name: str
+    row_count: int
+    min_id: int | None = None
+    max_id: int | None = None
+    sealed_at: datetime
+    archive_path: str | None = None
+    archive_bytes: int | None = None
+    archived_at: datetime | None = None
+    shard_id: int = 0  # Store shard holding the month (0 = main database)
+
+
+class CheckpointResult(BaseModel):
+    mode: Literal["passive", "truncate"]
+    busy: bool  # Stopped short because of a reader or the writer
+    log_frames: int
+    checkpointed_frames: int
+    duration_ms: float
+    at: datetime
+
+
+class DatabaseHealth(BaseModel):
+    shard_id: int  # 0 = main database
+    path: str
+    file_bytes: int
+    wal_bytes: int
+    page_size: int
+    page_count: int
+    freelist_count: int
+    auto_vacuum: Literal["none", "full", "incremental"]
+    last_checkpoint: CheckpointResult | None = None
+    last_vacuum_at: datetime | None = None
+    vacuumed_pages: int
+    last_analyze_at: datetime | None = None
+
+
+class ProductSalesRow(BaseModel):
+    product_id: str
+    name: str
+    units: int
+    revenue: float
+    transactions: int
+
+
+class ProductSalesBucket(BaseModel):
+    bucket: str  # Store name, terminal code, "YYYY-MM-DDTHH" or "YYYY-MM-DD" (UTC)
+    units: int
+    revenue: float
+    transactions: int
+
+
+ReconciliationLevel = Literal["terminal", "day", "hour"]
+
+
+class ReconciliationDigest(BaseModel):
+    """XOR digest over the idempotency keys of one terminal bucket"""
+
+    terminal_id: int | None = None
+    bucket: str  # "all", "YYYY-MM-DD" or "YYYY-MM-DDTHH" (UTC)
+    tx_count: int
+    digest: str  # 32 hex chars
+
+
+class ReconciliationCompareRequest(BaseModel):
+    level: ReconciliationLevel = "day"
+    digests: list[ReconciliationDigest]
+
+
+class ReconciliationMismatch(BaseModel):
+    bucket: str
+    server_count: int
+    client_count: int
+    server_digest: str | None = None
+    client_digest: str | None = None
+
+
+class ReconciliationCompareResponse(BaseModel):
+    level: ReconciliationLevel
+    matched: int
+    mismatched: list[ReconciliationMismatch]
+
+
+class ReconciliationKeysResponse(BaseModel):
+    terminal_id: int
+    bucket: str
+    idempotency_keys: list[str]
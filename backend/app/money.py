@@ -0,0 +1,45 @@
+import math
+from typing import Annotated
+
+import aiosqlite
+from pydantic import BeforeValidator, PlainSerializer
+
+from .partitions import partition_tables, unsealed
+
+# Largest amount accepted, in öre (1 000 000 000 kr). With quantities capped
+# at MAX_QUANTITY every line total still fits SQLite's 64-bit integers.
+MAX_ORE = 100_000_000_000
+MAX_QUANTITY = 1_000_000
+
+
+def to_ore(value) -> int:
+    """Kronor as sent by the API (float, int or numeric string) to integer öre.
+
+    Rounds half up like the terminals' `Math.round(amount * 100)`, so amounts
+    agree with what a terminal signed in its batch.
+    """
+    if isinstance(value, bool):
+        raise ValueError("amount must be a number")
+    amount = float(value)
+    if not math.isfinite(amount):
+        raise ValueError("amount must be finite")
+    if abs(amount) > MAX_ORE / 100:
+        raise ValueError(f"amount must be at most {MAX_ORE // 100} in absolute value")
+    return math.floor(amount * 100 + 0.5)
+
+
+def from_ore(ore: int) -> float:
+    return ore / 100
+
+
+# Integer öre internally; accepted and serialised as kronor on the wire
+Kronor = Annotated[int, BeforeValidator(to_ore), PlainSerializer(from_ore, return_type=float)]
+
+
+async def backfill_total_ore(db: aiosqlite.Connection) -> None:
+    """Fill `total_ore` from the legacy REAL `total_amount`, live and sealed."""
+    sql = "UPDATE {table} SET total_ore = CAST(round(total_amount * 100) AS INTEGER) WHERE total_ore IS NULL"
+    await db.execute(sql.format(table="transactions"))
+    for table in await partition_tables(db):
+        async with unsealed(db, table):
+            await db.execute(sql.format(table=table))
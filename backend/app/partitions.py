@@ -0,0 +1,333 @@
+import base64
+import gzip
+import heapq
+import json
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import aiosqlite
+
+from . import coherence
+
+# Rows are assigned to a month by UTC `occurred_us` (epoch microseconds)
+_MONTH = "strftime('%Y-%m', occurred_us / 1000000, 'unixepoch')"
+VIEW = "transactions_all"
+
+# Months that have a sealed table, per database file, so ingest only probes
+# partitions that exist
+_sealed_months: dict[str, set[str]] = {}
+
+
+def table_for(month: str) -> str:
+    datetime.strptime(month, "%Y-%m")  # reject anything that isn't YYYY-MM
+    return "transactions_" + month.replace("-", "_")
+
+
+def _month_bounds(month: str) -> tuple[int, int]:
+    # [start, end) of a UTC month in epoch microseconds
+    start = datetime.strptime(month, "%Y-%m").replace(tzinfo=UTC)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return int(start.timestamp()) * 1_000_000, int(end.timestamp()) * 1_000_000
+
+
+async def _index(db: aiosqlite.Connection, table: str) -> None:
+    await db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_id ON {table} (id)")
+    await db.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS {table}_terminal_key
+        ON {table} (terminal_id, idempotency_key)
+        """
+    )
+    await db.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS {table}_terminal_occurred_us
+        ON {table} (terminal_id, occurred_us)
+        """
+    )
+    await db.execute(
+        f"CREATE INDEX IF NOT EXISTS {table}_occurred_us ON {table} (occurred_us, id)"
+    )
+    await db.execute(
+        f"CREATE INDEX IF NOT EXISTS {table}_created_us ON {table} (created_us, id)"
+    )
+
+
+def archive_cutoff(live_months: int, now: datetime | None = None) -> str:
+    """First month that stays live; everything before it may be archived."""
+    now = now or datetime.now(UTC)
+    index = now.year * 12 + now.month - 1 - live_months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+async def _columns(db: aiosqlite.Connection, table: str) -> list[str]:
+    rows = await (await db.execute(f"PRAGMA table_info({table})")).fetchall()
+    return [row[1] for row in rows]
+
+
+async def partition_tables(db: aiosqlite.Connection) -> list[str]:
+    """Sealed partition tables, newest month first."""
+    rows = await (
+        await db.execute(
+            "SELECT table_name FROM transaction_partitions ORDER BY month DESC"
+        )
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+async def _seal(db: aiosqlite.Connection, table: str) -> None:
+    for op in ("INSERT", "UPDATE", "DELETE"):
+        await db.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_sealed_{op.lower()}
+            BEFORE {op} ON {table}
+            BEGIN SELECT RAISE(ABORT, '{table} is sealed'); END
+            """
+        )
+
+
+async def _unseal(db: aiosqlite.Connection, table: str) -> None:
+    for op in ("insert", "update", "delete"):
+        await db.execute(f"DROP TRIGGER IF EXISTS {table}_sealed_{op}")
+
+
+@asynccontextmanager
+async def unsealed(db: aiosqlite.Connection, table: str):
+    """Lift the read-only triggers for a maintenance write, then restore them."""
+    await _unseal(db, table)
+    try:
+        yield
+    finally:
+        await _seal(db, table)
+
+
+async def load_sealed_months(db: aiosqlite.Connection, database: str) -> None:
+    months = await (await db.execute("SELECT month FROM transaction_partitions")).fetchall()
+    _sealed_months[database] = {row[0] for row in months}
+
+
+coherence.on_change("partitions", load_sealed_months)
+
+
+async def refresh_partitions(db: aiosqlite.Connection) -> None:
+    """Bring partitions up to the live schema and rebuild `transactions_all`.
+
+    Columns added to `transactions` by later migrations are added to every
+    partition too (as NULL), so the view is a plain UNION ALL.
+    """
+    live = await _columns(db, "transactions")
+    selects = [f"SELECT {', '.join(live)} FROM transactions"]
+    for table in await partition_tables(db):
+        existing = set(await _columns(db, table))
+        for column in live:
+            if column not in existing:
+                await db.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        await _index(db, table)
+        selects.append(f"SELECT {', '.join(live)} FROM {table}")
+    await db.execute(f"DROP VIEW IF EXISTS {VIEW}")
+    await db.execute(f"CREATE VIEW {VIEW} AS {' UNION ALL '.join(selects)}")
+
+
+async def archived_transaction(
+    db: aiosqlite.Connection,
+    database: str,
+    terminal_id: int,
+    idempotency_key: str,
+    occurred_at: datetime,
+) -> aiosqlite.Row | None:
+    """Find a key that was already moved into its month's sealed table in `database`."""
+    if occurred_at.tzinfo is None:
+        occurred_at = occurred_at.replace(tzinfo=UTC)
+    month = occurred_at.astimezone(UTC).strftime("%Y-%m")
+    if month not in _sealed_months.get(database, ()):
+        return None
+    return await (
+        await db.execute(
+            f"SELECT * FROM {table_for(month)} WHERE terminal_id = ? AND idempotency_key = ?",
+            (terminal_id, idempotency_key),
+        )
+    ).fetchone()
+
+
+async def archivable_months(db: aiosqlite.Connection, cutoff: str) -> list[str]:
+    rows = await (
+        await db.execute(
+            f"""
+            SELECT DISTINCT {_MONTH} AS month FROM transactions
+            WHERE occurred_us < ? AND payment_status != 'pending'
+            ORDER BY month
+            """,
+            (_month_bounds(cutoff)[0],),
+        )
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def mark_sealed(database: str, month: str) -> None:
+    """Note a newly registered month for `archived_transaction` in this process."""
+    _sealed_months.setdefault(database, set()).add(month)
+
+
+async def open_month(db: aiosqlite.Connection, month: str) -> bool:
+    """Create and register `month`'s sealed table if it is new; a writer op.
+
+    The month is registered (and in the view) before any row moves, so every
+    row stays visible, live or sealed, to reads and duplicate checks while
+    `archive_chunk` moves it. Returns whether the table was created.
+    """
+    table = table_for(month)
+    if await (
+        await db.execute("SELECT 1 FROM transaction_partitions WHERE month = ?", (month,))
+    ).fetchone():
+        return False
+    await db.execute(
+        f"CREATE TABLE IF NOT EXISTS {table} AS SELECT * FROM transactions WHERE 0"
+    )
+    await _index(db, table)
+    await _seal(db, table)
+    await db.execute(
+        "INSERT INTO transaction_partitions (month, table_name, sealed_at) VALUES (?, ?, ?)",
+        (month, table, datetime.now(UTC).isoformat()),
+    )
+    await refresh_partitions(db)
+    await coherence.bump(db, "partitions")
+    return True
+
+
+async def archive_chunk(db: aiosqlite.Connection, month: str, limit: int) -> int:
+    """Move up to `limit` of a month's settled live rows into its sealed table.
+
+    A writer op; call `open_month` first. Row ids are kept, so
+    `transaction_items`, rollups and reconciliation buckets stay valid.
+    Returns the number of rows moved, 0 once the month is drained.
+    """
+    table = table_for(month)
+    ids = await (
+        await db.execute(
+            """
+            SELECT id FROM transactions
+            WHERE occurred_us >= ? AND occurred_us < ? AND payment_status != 'pending'
+            ORDER BY occurred_us, id LIMIT ?
+            """,
+            (*_month_bounds(month), limit),
+        )
+    ).fetchall()
+    if not ids:
+        return 0
+    ids = [(row[0],) for row in ids]
+    columns = ", ".join(await _columns(db, "transactions"))
+    async with unsealed(db, table):
+        await db.executemany(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM transactions WHERE id = ?",
+            ids,
+        )
+    await db.executemany("DELETE FROM transactions WHERE id = ?", ids)
+    await db.execute(
+        f"""
+        UPDATE transaction_partitions SET
+            row_count = row_count + ?,
+            min_id = (SELECT MIN(id) FROM {table}),
+            max_id = (SELECT MAX(id) FROM {table})
+        WHERE month = ?
+        """,
+        (len(ids), month),
+    )
+    return len(ids)
+
+
+async def close_month(db: aiosqlite.Connection, month: str) -> None:
+    """Recount a drained month's sealed table and stamp it; the archive's last writer op."""
+    table = table_for(month)
+    await db.execute(
+        f"""
+        UPDATE transaction_partitions SET
+            (row_count, min_id, max_id) = (SELECT COUNT(*), MIN(id), MAX(id) FROM {table}),
+            sealed_at = ?
+        WHERE month = ?
+        """,
+        (datetime.now(UTC).isoformat(), month),
+    )
+    await coherence.bump(db, "partitions")
+
+
+def _b64(value: bytes) -> str:
+    # Packed payloads (see payloads.py) are archived as base64 strings
+    return base64.b64encode(value).decode("ascii")
+
+
+async def export_partition(
+    db: aiosqlite.Connection, month: str, directory: str
+) -> tuple[str, int]:
+    """Write a sealed month to `<directory>/<table>.json.gz` in columnar form.
+
+    The document is `{"month", "rows", "columns", "data": {column: [...]}}`,
+    written one column at a time so memory stays bounded by the cursor.
+    Only reads `db`, so it can be a reader snapshot; store the result with
+    `record_export`. Returns (path, compressed bytes).
+    """
+    table = table_for(month)
+    row = await (
+        await db.execute(
+            "SELECT row_count FROM transaction_partitions WHERE month = ?", (month,)
+        )
+    ).fetchone()
+    if not row:
+        raise LookupError(f"No sealed partition for {month}")
+
+    columns = await _columns(db, table)
+    path = Path(directory) / f"{table}.json.gz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as out:
+        out.write(
+            f'{{"month": "{month}", "rows": {row[0]}, '
+            f'"columns": {json.dumps(columns)}, "data": {{'
+        )
+        for i, column in enumerate(columns):
+            out.write(f"{', ' if i else ''}{json.dumps(column)}: [")
+            first = True
+            async with db.execute(f"SELECT {column} FROM {table} ORDER BY id") as cur:
+                async for value in cur:
+                    out.write(("" if first else ", ") + json.dumps(value[0], default=_b64))
+                    first = False
+            out.write("]")
+        out.write("}}")
+
+    return str(path), path.stat().st_size
+
+
+async def record_export(db: aiosqlite.Connection, month: str, path: str, size: int) -> None:
+    """Note where `export_partition` wrote a month; a writer op."""
+    await db.execute(
+        """
+        UPDATE transaction_partitions SET archive_path = ?, archive_bytes = ?, archived_at = ?
+        WHERE month = ?
+        """,
+        (path, size, datetime.now(UTC).isoformat(), month),
+    )
+
+
+def newest_first(row: aiosqlite.Row) -> tuple:
+    """Sort key for `recent_transactions` rows; merge them with reverse=True."""
+    return row["created_us"], row["id"]
+
+
+async def recent_transactions(
+    db: aiosqlite.Connection, limit: int, columns: str = "*"
+) -> list:
+    """Newest rows by (created_us, id) across live and sealed tables.
+
+    `columns` must include id and created_us. Each table is read newest-first
+    through its created_us index and the results are merged, rather than
+    sorting the whole `transactions_all` view.
+    """
+    streams = []
+    for table in ["transactions", *await partition_tables(db)]:
+        rows = await (
+            await db.execute(
+                f"SELECT {columns} FROM {table} ORDER BY created_us DESC, id DESC LIMIT ?",
+                (limit,),
+            )
+        ).fetchall()
+        streams.append(rows)
+    merged = heapq.merge(*streams, key=newest_first, reverse=True)
+    return [row for _, row in zip(range(limit), merged)]
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import struct
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+
+import aiosqlite
+
+from . import coherence
+from .config import settings
+from .money import from_ore, to_ore
+from .partitions import unsealed
+
+try:
+    import zstandard
+except ImportError:  # without zstd, payloads are packed but not compressed
+    zstandard = None
+
+# Stored payloads keep only what no other column has: the line items. Layout:
+#
+#   0x01 | varint n | n × item                        packed
+#   0x02 | varint dictionary_id | zstd(packed body)   dictionary-compressed
+#
+# item = flags byte, product_id, [name], price, varint quantity. Strings are
+# varint-length UTF-8. Prices are varint öre, or little-endian float64 kronor
+# when PRICE_FLOAT is set (negative prices, e.g. discount lines).
+PACKED = 0x01
+COMPRESSED = 0x02
+PRICE_FLOAT = 0x01
+NAME_IS_ID = 0x02
+
+_dictionaries: dict[int, "zstandard.ZstdCompressionDict"] = {}
+_active_dictionary: int | None = None
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_str(out: bytearray, value: str) -> None:
+    raw = value.encode("utf-8")
+    _write_varint(out, len(raw))
+    out += raw
+
+
+def _read_str(data: bytes, pos: int) -> tuple[str, int]:
+    size, pos = _read_varint(data, pos)
+    return data[pos : pos + size].decode("utf-8"), pos + size
+
+
+def normalise_items(items) -> list[tuple[str, str, int, int]]:
+    """(product_id, name, price_ore, quantity) from request models or raw dicts."""
+    rows = []
+    for item in items:
+        if isinstance(item, dict):
+            product_id = str(item.get("product_id") or item.get("id") or item.get("name"))
+            rows.append(
+                (
+                    product_id,
+                    item.get("name") or product_id,
+                    to_ore(item.get("price", 0)),
+                    int(item.get("quantity", 1)),
+                )
+            )
+        else:
+            rows.append((item.product_id, item.name, item.price_ore, item.quantity))
+    return rows
+
+
+def pack_items(items) -> bytes:
+    body = bytearray()
+    rows = normalise_items(items)
+    _write_varint(body, len(rows))
+    for product_id, name, price_ore, quantity in rows:
+        flags = NAME_IS_ID if name == product_id else 0
+        if price_ore < 0:
+            flags |= PRICE_FLOAT
+        body.append(flags)
+        _write_str(body, product_id)
+        if not flags & NAME_IS_ID:
+            _write_str(body, name)
+        if flags & PRICE_FLOAT:
+            body += struct.pack("<d", from_ore(price_ore))
+        else:
+            _write_varint(body, price_ore)
+        _write_varint(body, quantity)
+    return bytes(body)
+
+
+def unpack_items(body: bytes) -> list[dict]:
+    count, pos = _read_varint(body, 0)
+    items = []
+    for _ in range(count):
+        flags = body[pos]
+        product_id, pos = _read_str(body, pos + 1)
+        name = product_id
+        if not flags & NAME_IS_ID:
+            name, pos = _read_str(body, pos)
+        if flags & PRICE_FLOAT:
+            (price,) = struct.unpack_from("<d", body, pos)
+            pos += 8
+        else:
+            ore, pos = _read_varint(body, pos)
+            price = from_ore(ore)
+        quantity, pos = _read_varint(body, pos)
+        items.append(
+            {"product_id": product_id, "name": name, "price": price, "quantity": quantity}
+        )
+    return items
+
+
+# Older rows stored the whole sale request; these keys have columns of their own
+REDUNDANT_KEYS = {"idempotency_key", "total_amount", "occurred_at", "offline_created", "payment"}
+
+
+def _packable(payload: dict | list) -> list | None:
+    """The payload's items if packing them loses nothing, else None.
+
+    Packing keeps only product_id, name, price and quantity; the request
+    fields in REDUNDANT_KEYS are dropped. Payloads with any other keys (or
+    prices finer than an öre) stay in `payload_json`.
+    """
+    if isinstance(payload, dict):
+        if set(payload) - {"items"} - REDUNDANT_KEYS:
+            return None
+        items = payload.get("items", [])
+    else:
+        items = payload
+    try:
+        if unpack_items(pack_items(items)) != items:
+            return None
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return items
+
+
+def encode_payload(items) -> bytes:
+    """Pack items, compressing with the active dictionary when that is smaller."""
+    body = pack_items(items)
+    if _active_dictionary is not None:
+        header = bytearray([COMPRESSED])
+        _write_varint(header, _active_dictionary)
+        compressed = zstandard.ZstdCompressor(
+            level=3, dict_data=_dictionaries[_active_dictionary], write_content_size=True
+        ).compress(body)
+        if len(header) + len(compressed) < len(body):
+            return bytes(header) + compressed
+    return bytes([PACKED]) + body
+
+
+def decode_payload(blob: bytes) -> dict:
+    """Inverse of `encode_payload`, shaped like the old `payload_json`."""
+    if blob[0] == COMPRESSED:
+        dictionary_id, pos = _read_varint(blob, 1)
+        body = zstandard.ZstdDecompressor(
+            dict_data=_dictionaries[dictionary_id]
+        ).decompress(blob[pos:])
+    else:
+        body = blob[1:]
+    return {"items": unpack_items(body)}
+
+
+async def load_dictionaries(db: aiosqlite.Connection) -> None:
+    """Cache every trained dictionary; the newest one compresses new rows."""
+    global _active_dictionary
+    if zstandard is None:
+        return
+    rows = await (
+        await db.execute("SELECT id, dict_data FROM payload_dictionaries ORDER BY id")
+    ).fetchall()
+    for row in rows:
+        _dictionaries[row[0]] = zstandard.ZstdCompressionDict(row[1])
+    _active_dictionary = rows[-1][0] if rows else None
+
+
+async def _reload_dictionaries(db: aiosqlite.Connection, database: str) -> None:
+    await load_dictionaries(db)
+
+
+coherence.on_change("payload_dictionaries", _reload_dictionaries)
+
+
+async def read_payload(
+    db: aiosqlite.Connection, payload_blob: bytes | None, payload_json: str
+) -> dict | list:
+    """Decode a stored payload, whichever format the row was written in.
+
+    Dictionaries always live in the main database, whichever file `db` is.
+    """
+    if payload_blob is None:
+        return json.loads(payload_json)
+    if payload_blob[0] == COMPRESSED and _read_varint(payload_blob, 1)[0] not in _dictionaries:
+        main = await aiosqlite.connect(settings.database_path)
+        try:
+            await load_dictionaries(main)
+        finally:
+            await main.close()
+    return decode_payload(payload_blob)
+
+
+async def train_dictionary(
+    sources: list[aiosqlite.Connection], size: int, samples: int
+) -> tuple[bytes, int] | None:
+    """Train a zstd dictionary on recent packed payloads; only reads.
+
+    Samples are split evenly across `sources` (store shards). Returns the
+    dictionary and its sample count for `store_dictionary`, or None without
+    zstd or enough samples.
+    """
+    if zstandard is None:
+        return None
+    packed = []
+    for source in sources:
+        async with source.execute(
+            "SELECT payload_blob, payload_json FROM transactions ORDER BY id DESC LIMIT ?",
+            (max(1, samples // len(sources)),),
+        ) as cur:
+            async for row in cur:
+                payload = await read_payload(source, row[0], row[1])
+                items = payload.get("items", []) if isinstance(payload, dict) else payload
+                packed.append(pack_items(items))
+    try:
+        trained = zstandard.train_dictionary(size, packed)
+    except zstandard.ZstdError:
+        return None  # too few or too uniform samples
+    return trained.as_bytes(), len(packed)
+
+
+async def store_dictionary(db: aiosqlite.Connection, data: bytes, sample_count: int) -> int:
+    """Save a trained dictionary in the main database; a writer op. Returns its id.
+
+    It becomes the active one once `load_dictionaries` runs after the commit
+    (other processes reload it through coherence).
+    """
+    cursor = await db.execute(
+        "INSERT INTO payload_dictionaries (dict_data, sample_count, created_at) VALUES (?, ?, ?)",
+        (data, sample_count, datetime.now(UTC).isoformat()),
+    )
+    await coherence.bump(db, "payload_dictionaries")
+    return cursor.lastrowid
+
+
+async def _compact_batch(
+    db: aiosqlite.Connection, table: str, after_id: int, batch_size: int
+) -> dict | None:
+    # One writer op: repack the next batch of legacy rows in `table`
+    rows = await (
+        await db.execute(
+            f"""
+            SELECT id, payload_json FROM {table}
+            WHERE payload_blob IS NULL AND id > ? ORDER BY id LIMIT ?
+            """,
+            (after_id, batch_size),
+        )
+    ).fetchall()
+    if not rows:
+        return None
+    counts = {"rows": 0, "skipped": 0, "bytes_before": 0, "bytes_after": 0}
+    updates = []
+    for row in rows:
+        items = _packable(json.loads(row[1]))
+        if items is None:
+            counts["skipped"] += 1
+            continue
+        blob = encode_payload(items)
+        updates.append((blob, row[0]))
+        counts["bytes_before"] += len(row[1].encode("utf-8"))
+        counts["bytes_after"] += len(blob)
+    sql = f"UPDATE {table} SET payload_blob = ?, payload_json = '' WHERE id = ?"
+    if table == "transactions":
+        await db.executemany(sql, updates)
+    else:
+        async with unsealed(db, table):
+            await db.executemany(sql, updates)
+    counts["rows"] = len(updates)
+    return {**counts, "last_id": rows[-1][0]}
+
+
+async def compact_payloads(
+    submit: Callable[[Callable[[aiosqlite.Connection], Awaitable]], Awaitable],
+    tables: list[str],
+    batch_size: int = 500,
+    progress: dict | None = None,
+) -> dict:
+    """Rewrite legacy `payload_json` rows of `tables` into `payload_blob`.
+
+    Each batch is one op through `submit` (the database's writer), so it
+    commits with the group it lands in and checkout writes go in between.
+    Rows that packing can't hold losslessly are left as they are and
+    counted as skipped. Returns a bytes-saved report; passing the same
+    `progress` dict for several databases adds their counts up.
+    """
+    report = progress if progress is not None else {}
+    for key in ("rows", "skipped", "bytes_before", "bytes_after"):
+        report.setdefault(key, 0)
+    for table in tables:
+        last_id = 0
+        while batch := await submit(lambda db: _compact_batch(db, table, last_id, batch_size)):
+            last_id = batch.pop("last_id")
+            for key, value in batch.items():
+                report[key] += value
+            await asyncio.sleep(0)
+    report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+    return report
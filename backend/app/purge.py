@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import os
+
+import aiosqlite
+
+from . import coherence, metrics, shards
+from .batch_signing import forget_public_key
+from .config import settings
+from .database import get_db, now_iso
+from .idempotency import recent_keys
+from .partitions import partition_tables, unsealed
+from .reconciliation import remove_from_buckets
+from .rollups import remove_sales
+from .writer import writer
+
+logger = logging.getLogger(__name__)
+
+# Deleting a terminal soft-deletes it at once (inactive, `deleted_at` set:
+# it can't log in or sell and drops out of the terminal lists) and leaves the
+# sales to a background purge. The purge removes PURGE_CHUNK_SIZE sales per
+# writer op, live or sealed, together with their line items, rollup and
+# reconciliation contributions, so every commit leaves the aggregates
+# matching the rows that remain, and pauses PURGE_PAUSE_MS between chunks
+# so checkout never queues behind it for long. The terminal row goes last.
+#
+# Progress lives in `terminal_purges` (main database), so any worker can
+# report or cancel a purge, and purges of a worker that died are resumed.
+# A cancelled purge leaves the terminal soft-deleted with what is left of
+# its history; deleting it again carries on.
+
+PURGE_COLUMNS = (
+    "terminal_id, terminal_code, store_name, status, rows_total, rows_deleted, "
+    "started_at, updated_at, finished_at, error"
+)
+
+_tasks: dict[int, asyncio.Task] = {}
+
+
+async def _delete_chunk(
+    db: aiosqlite.Connection, terminal_id: int, store_name: str, limit: int
+) -> int:
+    for table in ("transactions", *await partition_tables(db)):
+        rows = await (
+            await db.execute(
+                f"""
+                SELECT id, idempotency_key, occurred_at, payment_type, total_ore,
+                       synced_from_offline
+                FROM {table} WHERE terminal_id = ? LIMIT ?
+                """,
+                (terminal_id, limit),
+            )
+        ).fetchall()
+        if rows:
+            break
+    else:
+        return 0
+
+    ids = [(row["id"],) for row in rows]
+    await db.executemany("DELETE FROM transaction_items WHERE transaction_id = ?", ids)
+    if table == "transactions":
+        await db.executemany("DELETE FROM transactions WHERE id = ?", ids)
+    else:
+        async with unsealed(db, table):
+            await db.executemany(f"DELETE FROM {table} WHERE id = ?", ids)
+        await db.execute(
+            f"""
+            UPDATE transaction_partitions SET
+                row_count = row_count - ?,
+                min_id = (SELECT MIN(id) FROM {table}),
+                max_id = (SELECT MAX(id) FROM {table})
+            WHERE table_name = ?
+            """,
+            (len(rows), table),
+        )
+    await remove_sales(db, store_name, terminal_id, rows)
+    await remove_from_buckets(db, terminal_id, rows)
+    return len(rows)
+
+
+async def _remove_terminal(db: aiosqlite.Connection, terminal_id: int) -> None:
+    # Nothing of its sales is left by now; clear whatever derived rows remain
+    await db.execute("DELETE FROM reconciliation_buckets WHERE terminal_id = ?", (terminal_id,))
+    for table in ("sales_rollup_hourly", "sales_rollup_daily"):
+        await db.execute(f"DELETE FROM {table} WHERE terminal_id = ?", (terminal_id,))
+    await db.execute("DELETE FROM terminals WHERE id = ?", (terminal_id,))
+    await coherence.bump(db, "terminals")
+
+
+async def _set_status(terminal_id: int, status: str, error: str | None = None) -> None:
+    async def write(db: aiosqlite.Connection) -> None:
+        now = now_iso()
+        await db.execute(
+            """
+            UPDATE terminal_purges SET status = ?, error = ?, updated_at = ?, finished_at = ?
+            WHERE terminal_id = ?
+            """,
+            (status, error, now, now, terminal_id),
+        )
+
+    await writer.submit(write)
+
+
+async def _purge(terminal_id: int, store_name: str) -> None:
+    targets = list(reversed(await shards.covering(store_name)))  # Store shard first
+    try:
+        for shard in targets:
+            while True:
+                deleted = await shard.writer.submit(
+                    lambda db: _delete_chunk(db, terminal_id, store_name, settings.purge_chunk_size)
+                )
+                if not deleted:
+                    break
+                metrics.increment("purge.deleted_rows", deleted)
+
+                async def progress(db: aiosqlite.Connection) -> bool:
+                    await db.execute(
+                        """
+                        UPDATE terminal_purges
+                        SET rows_deleted = rows_deleted + ?, updated_at = ?
+                        WHERE terminal_id = ?
+                        """,
+                        (deleted, now_iso(), terminal_id),
+                    )
+                    # Deleting it again before we got here takes the cancel back
+                    cancelled = await (
+                        await db.execute(
+                            """
+                            UPDATE terminal_purges SET status = 'cancelled', finished_at = ?
+                            WHERE terminal_id = ? AND status = 'cancelling'
+                            RETURNING 1
+                            """,
+                            (now_iso(), terminal_id),
+                        )
+                    ).fetchall()
+                    return bool(cancelled)
+
+                if await writer.submit(progress):
+                    logger.info("Purge of terminal %s cancelled", terminal_id)
+                    return
+                await asyncio.sleep(settings.purge_pause_ms / 1000)
+
+        for shard in targets:
+            await shard.writer.submit(lambda db: _remove_terminal(db, terminal_id))
+        recent_keys.forget_terminal(terminal_id)
+        forget_public_key(terminal_id)
+        await _set_status(terminal_id, "done")
+        logger.info("Purge of terminal %s finished", terminal_id)
+    except Exception as exc:
+        logger.exception("Purge of terminal %s failed", terminal_id)
+        await _set_status(terminal_id, "failed", repr(exc))
+    finally:
+        if _tasks.get(terminal_id) is asyncio.current_task():
+            del _tasks[terminal_id]
+
+
+def _alive(pid: int | None) -> bool:
+    return pid is not None and metrics.pid_alive(pid)
+
+
+def _spawn(terminal_id: int, store_name: str) -> None:
+    _tasks[terminal_id] = asyncio.create_task(_purge(terminal_id, store_name))
+
+
+async def _count_rows(terminal_id: int, store_name: str) -> int:
+    async def count(db: aiosqlite.Connection) -> int:
+        return (
+            await (
+                await db.execute(
+                    "SELECT COUNT(*) FROM transactions_all WHERE terminal_id = ?", (terminal_id,)
+                )
+            ).fetchone()
+        )[0]
+
+    return sum(await shards.fan_out(count, await shards.covering(store_name)))
+
+
+async def start(terminal: aiosqlite.Row) -> None:
+    """Soft-delete `terminal` and purge its sales in the background (or carry on purging)."""
+    terminal_id, store_name = terminal["id"], terminal["store_name"]
+    remaining = await _count_rows(terminal_id, store_name)
+    deleted: aiosqlite.Row | None = None
+
+    async def claim(db: aiosqlite.Connection) -> bool:
+        nonlocal deleted
+        now = now_iso()
+        deleted = await (
+            await db.execute(
+                """
+                UPDATE terminals SET active = 0, deleted_at = COALESCE(deleted_at, ?), updated_at = ?
+                WHERE id = ?
+                RETURNING *
+                """,
+                (now, now, terminal_id),
+            )
+        ).fetchone()
+        row = await (
+            await db.execute(
+                "SELECT status, worker_pid FROM terminal_purges WHERE terminal_id = ?",
+                (terminal_id,),
+            )
+        ).fetchone()
+        if row and row["status"] in ("running", "cancelling") and _alive(row["worker_pid"]):
+            await db.execute(
+                "UPDATE terminal_purges SET status = 'running' WHERE terminal_id = ?",
+                (terminal_id,),
+            )
+            return row["worker_pid"] != os.getpid() or terminal_id in _tasks
+        await db.execute(
+            f"""
+            INSERT INTO terminal_purges ({PURGE_COLUMNS}, worker_pid)
+            VALUES (?, ?, ?, 'running', ?, 0, ?, ?, NULL, NULL, ?)
+            ON CONFLICT(terminal_id) DO UPDATE SET
+                status = 'running',
+                rows_total = rows_deleted + excluded.rows_total,
+                updated_at = excluded.updated_at,
+                finished_at = NULL,
+                error = NULL,
+                worker_pid = excluded.worker_pid
+            """,
+            (
+                terminal_id,
+                terminal["terminal_code"],
+                store_name,
+                remaining,
+                now,
+                now,
+                os.getpid(),
+            ),
+        )
+        return False
+
+    claimed = await writer.submit(claim)
+    await shards.mirror_terminal(deleted)
+    if not claimed:
+        _spawn(terminal_id, store_name)
+
+
+async def cancel(terminal_id: int) -> None:
+    """Ask a running purge to stop after its current chunk."""
+
+    async def write(db: aiosqlite.Connection) -> None:
+        await db.execute(
+            """
+            UPDATE terminal_purges SET status = 'cancelling', updated_at = ?
+            WHERE terminal_id = ? AND status = 'running'
+            """,
+            (now_iso(), terminal_id),
+        )
+
+    await writer.submit(write)
+
+
+async def resume() -> None:
+    """Take over purges whose worker is gone (after a restart or crash)."""
+    db = await get_db()
+    rows = await (
+        await db.execute(
+            """
+            SELECT terminal_id, store_name, worker_pid FROM terminal_purges
+            WHERE status IN ('running', 'cancelling')
+            """
+        )
+    ).fetchall()
+    await db.close()
+    for row in rows:
+        if _alive(row["worker_pid"]):
+            continue
+
+        async def claim(db: aiosqlite.Connection, row=row) -> bool:
+            taken = await (
+                await db.execute(
+                    """
+                    UPDATE terminal_purges SET worker_pid = ?
+                    WHERE terminal_id = ? AND worker_pid IS ?
+                    RETURNING 1
+                    """,
+                    (os.getpid(), row["terminal_id"], row["worker_pid"]),
+                )
+            ).fetchall()
+            return bool(taken)
+
+        if await writer.submit(claim):
+            logger.info("Resuming purge of terminal %s", row["terminal_id"])
+            _spawn(row["terminal_id"], row["store_name"])
+
+
+async def stop() -> None:
+    """Stop purges in this worker; the next start resumes them."""
+    for task in list(_tasks.values()):
+        task.cancel()
+    await asyncio.gather(*_tasks.values(), return_exceptions=True)
+    _tasks.clear()
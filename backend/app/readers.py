@@ -0,0 +1,116 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+from . import metrics
+from .config import settings
+from .storage import engine
+
+# Dashboard, admin and export reads use read-only connections of their own
+# (`mode=ro`, `query_only`), never the writer's. In WAL mode a reader works
+# from the snapshot its transaction started on: it doesn't wait for the
+# writer or a checkpoint and holds neither up, so analytics can't block
+# checkout inserts. A Snapshot pins one read transaction per database for
+# the length of a request, so everything the request reads from that
+# database agrees. Shards are separate files with snapshots of their own.
+#
+# The memory engine has no WAL (memdb), and an open read transaction there
+# would keep the writer from committing, so its reads run per statement.
+
+
+class ReaderPool:
+    """Read-only connections to one database; up to `size` idle ones are kept."""
+
+    def __init__(self, path: str, size: int) -> None:
+        self.path = path
+        self.size = size
+        self._idle: list[aiosqlite.Connection] = []
+
+    async def acquire(self) -> aiosqlite.Connection:
+        if self._idle:
+            return self._idle.pop()
+        metrics.increment("readers.opened")
+        db = await engine.connect_reader(self.path)
+        db.row_factory = aiosqlite.Row
+        await db.execute("PRAGMA query_only = 1")
+        return db
+
+    async def release(self, db: aiosqlite.Connection) -> None:
+        if db.in_transaction:
+            await db.rollback()
+        if len(self._idle) < self.size:
+            self._idle.append(db)
+        else:
+            await db.close()
+
+    async def close(self) -> None:
+        while self._idle:
+            await self._idle.pop().close()
+
+
+_pools: dict[str, ReaderPool] = {}
+
+
+def _pool(path: str) -> ReaderPool:
+    pool = _pools.get(path)
+    if pool is None:
+        pool = _pools[path] = ReaderPool(path, settings.reader_pool_size)
+    return pool
+
+
+class Snapshot:
+    """One read transaction per database, begun on first use and ended on close."""
+
+    def __init__(self) -> None:
+        self._open: dict[str, asyncio.Future] = {}
+        self._started = time.perf_counter()
+
+    async def _begin(self, path: str) -> aiosqlite.Connection:
+        db = await _pool(path).acquire()
+        if engine.snapshot_reads:
+            await db.execute("BEGIN")
+            # The snapshot is taken by the first read, so take it now
+            await db.execute("SELECT 1 FROM sqlite_schema LIMIT 1")
+        return db
+
+    async def connection(self, path: str | None = None) -> aiosqlite.Connection:
+        """The snapshot's connection to `path` (the main database by default)."""
+        path = path or settings.database_path
+        pending = self._open.get(path)
+        if pending is None:
+            pending = self._open[path] = asyncio.ensure_future(self._begin(path))
+        return await pending
+
+    async def close(self) -> None:
+        for path, pending in self._open.items():
+            try:
+                db = await pending
+            except Exception:
+                continue
+            await _pool(path).release(db)
+        self._open.clear()
+        metrics.observe("readers.snapshot_ms", (time.perf_counter() - self._started) * 1000)
+
+
+@asynccontextmanager
+async def snapshot():
+    snap = Snapshot()
+    try:
+        yield snap
+    finally:
+        await snap.close()
+
+
+@asynccontextmanager
+async def connection(path: str | None = None):
+    """A read-only connection to `path` with a snapshot of its own."""
+    async with snapshot() as snap:
+        yield await snap.connection(path)
+
+
+async def close() -> None:
+    for pool in _pools.values():
+        await pool.close()
+    _pools.clear()
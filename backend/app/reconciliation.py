@@ -0,0 +1,235 @@
+import hashlib
+from datetime import UTC, datetime, timedelta
+
+import aiosqlite
+
+from .timestamps import to_us
+
+_MASK64 = (1 << 64) - 1
+_BUCKET_FORMATS = {4: "%Y", 7: "%Y-%m", 10: "%Y-%m-%d", 13: "%Y-%m-%dT%H"}
+
+
+def bucket_hour(occurred_at: datetime) -> str:
+    """Return the UTC hour bucket ("YYYY-MM-DDTHH") a transaction belongs to."""
+    if occurred_at.tzinfo is None:
+        occurred_at = occurred_at.replace(tzinfo=UTC)
+    return occurred_at.astimezone(UTC).strftime("%Y-%m-%dT%H")
+
+
+def key_lanes(idempotency_key: str) -> tuple[int, int]:
+    """Hash an idempotency key into two signed 64-bit lanes.
+
+    SQLite integers are signed, so the lanes are stored in two's complement.
+    """
+    digest = hashlib.sha256(idempotency_key.encode("utf-8")).digest()
+    hi = int.from_bytes(digest[:8], byteorder="big", signed=True)
+    lo = int.from_bytes(digest[8:16], byteorder="big", signed=True)
+    return hi, lo
+
+
+def format_digest(hi: int, lo: int) -> str:
+    """Render a bucket digest as a 32-character hex string."""
+    return f"{((hi & _MASK64) << 64) | (lo & _MASK64):032x}"
+
+
+def compute_digest(idempotency_keys) -> tuple[int, str]:
+    """Compute (count, digest) for a set of keys the same way the buckets do.
+
+    Useful for terminals and auditors building their side of the comparison.
+    """
+    count, hi, lo = 0, 0, 0
+    for key in idempotency_keys:
+        k_hi, k_lo = key_lanes(key)
+        hi ^= k_hi
+        lo ^= k_lo
+        count += 1
+    return count, format_digest(hi, lo)
+
+
+async def record_bucket(
+    db: aiosqlite.Connection,
+    terminal_id: int,
+    idempotency_key: str,
+    occurred_at: datetime,
+) -> None:
+    """Fold a newly inserted transaction into its hour bucket.
+
+    Digests are XOR-combined, so the update is order-independent and runs in
+    the same SQLite transaction as the INSERT it accounts for. SQLite has no
+    XOR operator, hence `(a | b) & ~(a & b)`.
+    """
+    hi, lo = key_lanes(idempotency_key)
+    await db.execute(
+        """
+        INSERT INTO reconciliation_buckets (terminal_id, bucket_hour, tx_count, digest_hi, digest_lo)
+        VALUES (?, ?, 1, ?, ?)
+        ON CONFLICT(terminal_id, bucket_hour) DO UPDATE SET
+            tx_count = tx_count + 1,
+            digest_hi = (digest_hi | excluded.digest_hi) & ~(digest_hi & excluded.digest_hi),
+            digest_lo = (digest_lo | excluded.digest_lo) & ~(digest_lo & excluded.digest_lo)
+        """,
+        (terminal_id, bucket_hour(occurred_at), hi, lo),
+    )
+
+
+async def remove_from_buckets(
+    db: aiosqlite.Connection, terminal_id: int, rows: list
+) -> None:
+    """Fold deleted transactions (`idempotency_key`, `occurred_at`) back out.
+
+    XOR is its own inverse, so removing a key is folding it in again with a
+    count of -1. Buckets left empty are dropped.
+    """
+    buckets: dict[str, list[int]] = {}
+    for row in rows:
+        hi, lo = key_lanes(row["idempotency_key"])
+        acc = buckets.setdefault(bucket_hour(datetime.fromisoformat(row["occurred_at"])), [0, 0, 0])
+        acc[0] -= 1
+        acc[1] ^= hi
+        acc[2] ^= lo
+
+    await db.executemany(
+        """
+        UPDATE reconciliation_buckets SET
+            tx_count = tx_count + ?3,
+            digest_hi = (digest_hi | ?4) & ~(digest_hi & ?4),
+            digest_lo = (digest_lo | ?5) & ~(digest_lo & ?5)
+        WHERE terminal_id = ?1 AND bucket_hour = ?2
+        """,
+        [(terminal_id, bucket, *acc) for bucket, acc in buckets.items()],
+    )
+    await db.executemany(
+        "DELETE FROM reconciliation_buckets WHERE terminal_id = ? AND bucket_hour = ? AND tx_count <= 0",
+        [(terminal_id, bucket) for bucket in buckets],
+    )
+
+
+async def rebuild_buckets(db: aiosqlite.Connection) -> int:
+    """Recompute every bucket from live and sealed transactions. Returns rows folded."""
+    await db.execute("DELETE FROM reconciliation_buckets")
+    buckets: dict[tuple[int, str], list[int]] = {}
+    async with db.execute(
+        "SELECT terminal_id, idempotency_key, occurred_at FROM transactions_all"
+    ) as cur:
+        async for row in cur:
+            key = (row[0], bucket_hour(datetime.fromisoformat(row[2])))
+            hi, lo = key_lanes(row[1])
+            acc = buckets.setdefault(key, [0, 0, 0])
+            acc[0] += 1
+            acc[1] ^= hi
+            acc[2] ^= lo
+
+    await db.executemany(
+        """
+        INSERT INTO reconciliation_buckets (terminal_id, bucket_hour, tx_count, digest_hi, digest_lo)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        [(t, b, c, hi, lo) for (t, b), (c, hi, lo) in buckets.items()],
+    )
+    return sum(acc[0] for acc in buckets.values())
+
+
+async def bucket_digests(
+    db: aiosqlite.Connection,
+    level: str,
+    terminal_id: int | None = None,
+    start: str | None = None,
+    end: str | None = None,
+) -> list[dict]:
+    """Fold hour buckets up to the requested level.
+
+    `level` is "terminal" (one root per terminal), "day" or "hour". `start`
+    and `end` are inclusive hour/day prefixes, e.g. "2026-10-19".
+    """
+    clauses, params = [], []
+    if terminal_id is not None:
+        clauses.append("terminal_id = ?")
+        params.append(terminal_id)
+    if start:
+        clauses.append("bucket_hour >= ?")
+        params.append(start)
+    if end:
+        # Pad so that a day prefix includes all of its hours
+        clauses.append("bucket_hour <= ?")
+        params.append(end + "~")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    rows = await (
+        await db.execute(
+            f"""
+            SELECT terminal_id, bucket_hour, tx_count, digest_hi, digest_lo
+            FROM reconciliation_buckets {where}
+            ORDER BY terminal_id, bucket_hour
+            """,
+            params,
+        )
+    ).fetchall()
+
+    folded: dict[tuple[int, str], list[int]] = {}
+    for row in rows:
+        if level == "terminal":
+            bucket = "all"
+        elif level == "day":
+            bucket = row["bucket_hour"][:10]
+        else:
+            bucket = row["bucket_hour"]
+        acc = folded.setdefault((row["terminal_id"], bucket), [0, 0, 0])
+        acc[0] += row["tx_count"]
+        acc[1] ^= row["digest_hi"]
+        acc[2] ^= row["digest_lo"]
+
+    return [
+        {
+            "terminal_id": t,
+            "bucket": b,
+            "tx_count": c,
+            "digest": format_digest(hi, lo),
+        }
+        for (t, b), (c, hi, lo) in folded.items()
+    ]
+
+
+def merge_digests(results: list[list[dict]]) -> list[dict]:
+    """Combine `bucket_digests` of several store shards (XOR digests, add counts)."""
+    merged: dict[tuple[int, str], list[int]] = {}
+    for digests in results:
+        for d in digests:
+            acc = merged.setdefault((d["terminal_id"], d["bucket"]), [0, 0])
+            acc[0] += d["tx_count"]
+            acc[1] ^= int(d["digest"], 16)
+    return [
+        {"terminal_id": t, "bucket": b, "tx_count": c, "digest": f"{digest:032x}"}
+        for (t, b), (c, digest) in sorted(merged.items())
+    ]
+
+
+def bucket_range_us(bucket: str) -> tuple[int, int]:
+    """[start, end) in epoch microseconds of a year, month, day or hour bucket."""
+    if len(bucket) not in _BUCKET_FORMATS:
+        raise ValueError(f"Unrecognised bucket: {bucket}")
+    start = datetime.strptime(bucket, _BUCKET_FORMATS[len(bucket)]).replace(tzinfo=UTC)
+    if len(bucket) == 4:
+        end = start.replace(year=start.year + 1)
+    elif len(bucket) == 7:
+        end = (start + timedelta(days=32)).replace(day=1)
+    elif len(bucket) == 10:
+        end = start + timedelta(days=1)
+    else:
+        end = start + timedelta(hours=1)
+    return to_us(start), to_us(end)
+
+
+async def bucket_keys(
+    db: aiosqlite.Connection, terminal_id: int, bucket: str
+) -> list[str]:
+    """List the idempotency keys behind one day or hour bucket."""
+    rows = await (
+        await db.execute(
+            """
+            SELECT idempotency_key FROM transactions_all
+            WHERE terminal_id = ? AND occurred_us >= ? AND occurred_us < ?
+            """,
+            (terminal_id, *bucket_range_us(bucket)),
+        )
+    ).fetchall()
+    return sorted(row["idempotency_key"] for row in rows)
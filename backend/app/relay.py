@@ -0,0 +1,205 @@
+import asyncio
+import gzip
+import json
+import logging
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import aiosqlite
+
+from . import metrics, shards
+from .config import settings
+from .database import get_db, now_iso
+from .security import create_access_token
+from .timestamps import now_us
+
+if TYPE_CHECKING:
+    import httpx  # Imported by run(), so only in relay mode
+
+logger = logging.getLogger(__name__)
+
+# Relay mode (RELAY_UPSTREAM_URL set): the app runs in the store as the
+# kiosks' backend. Sales are stored as usual and, in the same transaction,
+# queued in `relay_outbox`; the forwarder drains the outbox into the
+# upstream backend's /sync/offline, one large batch per terminal, and backs
+# off a terminal whose uploads fail. Upstream accepts the relay's tokens
+# because the two share JWT_SECRET, and knows the terminals under the same
+# codes. Sales upstream answers conflict/rejected move to `relay_dead_letters`.
+
+status: dict = {
+    "forwarded": 0,
+    "dead_lettered": 0,
+    "last_forwarded_at": None,
+    "last_error": None,
+    "retry_in_seconds": {},
+}
+
+# terminal code -> (monotonic time of its next attempt, current delay)
+_backoff: dict[str, tuple[float, float]] = {}
+
+
+def enabled() -> bool:
+    return bool(settings.relay_upstream_url)
+
+
+async def enqueue(
+    db: aiosqlite.Connection, terminal_code: str, idempotency_key: str, fields: dict
+) -> None:
+    """Queue a newly stored sale (its request dump) for upstream. Does not commit."""
+    await db.execute(
+        """
+        INSERT INTO relay_outbox (terminal_code, idempotency_key, body, queued_us)
+        VALUES (?, ?, ?, ?)
+        """,
+        (terminal_code, idempotency_key, json.dumps(fields, default=datetime.isoformat), now_us()),
+    )
+
+
+async def _count(table: str) -> int:
+    async def count(db: aiosqlite.Connection) -> int:
+        return (await (await db.execute(f"SELECT COUNT(*) FROM {table}")).fetchone())[0]
+
+    return sum(await shards.fan_out(count))
+
+
+async def backlog() -> int:
+    return await _count("relay_outbox")
+
+
+async def dead_letters() -> int:
+    return await _count("relay_dead_letters")
+
+
+def _failed(code: str) -> None:
+    _, delay = _backoff.get(code, (0.0, settings.relay_interval_seconds / 2))
+    delay = min(delay * 2, settings.relay_max_backoff_seconds)
+    _backoff[code] = (time.monotonic() + delay, delay)
+    status["retry_in_seconds"][code] = delay
+
+
+def _succeeded(code: str) -> None:
+    _backoff.pop(code, None)
+    status["retry_in_seconds"].pop(code, None)
+
+
+async def _upload(client: "httpx.AsyncClient", terminal_code: str, bodies: list[str]) -> list[dict]:
+    # Bodies are stored as JSON already, so the batch is spliced, not re-encoded
+    payload = ('{"transactions":[' + ",".join(bodies) + "]}").encode("utf-8")
+    started = time.perf_counter()
+    response = await client.post(
+        "/sync/offline",
+        params={"ack": "compact"},
+        content=gzip.compress(payload),
+        headers={
+            "Authorization": f"Bearer {create_access_token(terminal_code)}",
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        },
+    )
+    response.raise_for_status()
+    metrics.observe("relay.upload_ms", (time.perf_counter() - started) * 1000)
+    return response.json()["acks"]
+
+
+async def _forward_shard(client: "httpx.AsyncClient", shard: shards.Shard) -> tuple[int, int]:
+    import httpx
+
+    now = time.monotonic()
+    db = await get_db(shard.path)
+    try:
+        terminals = [
+            row[0]
+            for row in await (
+                await db.execute("SELECT DISTINCT terminal_code FROM relay_outbox")
+            ).fetchall()
+            if _backoff.get(row[0], (0.0,))[0] <= now
+        ]
+        batches = {
+            code: await (
+                await db.execute(
+                    "SELECT id, idempotency_key, body FROM relay_outbox WHERE terminal_code = ? ORDER BY id LIMIT ?",
+                    (code, settings.relay_batch_size),
+                )
+            ).fetchall()
+            for code in terminals
+        }
+    finally:
+        await db.close()
+
+    sent = failed = 0
+    for code, rows in batches.items():
+        # One terminal failing (say, unknown upstream) backs off only that one
+        try:
+            acks = await _upload(client, code, [row["body"] for row in rows])
+        except httpx.HTTPError as exc:
+            failed += 1
+            _failed(code)
+            metrics.increment("relay.failures")
+            status["last_error"] = f"{code}: {exc!r}"
+            logger.warning("Relay upload for terminal %s failed: %r", code, exc)
+            continue
+        _succeeded(code)
+        dead = []
+        for row, ack in zip(rows, acks):
+            if ack["status"] in ("conflict", "rejected"):
+                metrics.increment(f"relay.{ack['status']}")
+                logger.warning(
+                    "Upstream %s sale %s from terminal %s (%s)",
+                    ack["status"],
+                    row["idempotency_key"],
+                    code,
+                    ack.get("reason"),
+                )
+                dead.append((row["id"], ack["status"], ack.get("reason"), now_us()))
+        ids = [(row["id"],) for row in rows]
+
+        async def remove(db: aiosqlite.Connection) -> None:
+            await db.executemany(
+                """
+                INSERT INTO relay_dead_letters
+                    (terminal_code, idempotency_key, body, queued_us, status, reason, failed_us)
+                SELECT terminal_code, idempotency_key, body, queued_us, ?, ?, ?
+                FROM relay_outbox WHERE id = ?
+                """,
+                [(ack_status, reason, failed_us, id_) for id_, ack_status, reason, failed_us in dead],
+            )
+            await db.executemany("DELETE FROM relay_outbox WHERE id = ?", ids)
+
+        await shard.writer.submit(remove)
+        status["dead_lettered"] += len(dead)
+        sent += len(rows)
+        metrics.increment("relay.batches")
+        metrics.increment("relay.forwarded", len(rows))
+        metrics.observe("relay.batch_size", len(rows))
+    return sent, failed
+
+
+async def forward(client: "httpx.AsyncClient") -> tuple[int, int]:
+    """Upload one batch per terminal from every shard; returns (sales sent, batches failed)."""
+    sent = failed = 0
+    for shard in await shards.covering():
+        shard_sent, shard_failed = await _forward_shard(client, shard)
+        sent += shard_sent
+        failed += shard_failed
+    if sent:
+        status["forwarded"] += sent
+        status["last_forwarded_at"] = now_iso()
+    return sent, failed
+
+
+async def run() -> None:
+    """Forward until cancelled: drain while uploads succeed; failing terminals back off."""
+    import httpx
+
+    async with httpx.AsyncClient(base_url=settings.relay_upstream_url, timeout=30) as client:
+        while True:
+            try:
+                sent, _ = await forward(client)
+            except Exception as exc:
+                logger.exception("Relay forwarding failed")
+                status["last_error"] = repr(exc)
+                sent = 0
+            if sent:
+                continue  # More may be waiting; terminals backing off are skipped
+            await asyncio.sleep(settings.relay_interval_seconds)
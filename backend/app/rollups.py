@@ -0,0 +1,222 @@
+from datetime import UTC, datetime, timedelta
+
+import aiosqlite
+
+from .money import from_ore
+
+_UPSERT = """
+    INSERT INTO {table}
+    (bucket, store_name, terminal_id, payment_type, tx_count, total_ore, offline_count, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(bucket, store_name, terminal_id, payment_type) DO UPDATE SET
+        tx_count = tx_count + excluded.tx_count,
+        total_ore = total_ore + excluded.total_ore,
+        offline_count = offline_count + excluded.offline_count,
+        updated_at = excluded.updated_at
+"""
+
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+async def record_sale(
+    db: aiosqlite.Connection,
+    occurred_at: datetime,
+    store_name: str,
+    terminal_id: int,
+    payment_type: str | None,
+    total_ore: int,
+    offline: bool,
+) -> None:
+    """Add one sale to its hourly and daily buckets.
+
+    Buckets are keyed on when the sale happened, not when it arrived, so a
+    late offline sync lands in (and bumps `updated_at` on) the past bucket.
+    """
+    occurred = _utc(occurred_at)
+    values = (
+        store_name,
+        terminal_id,
+        payment_type or "",
+        1,
+        total_ore,
+        1 if offline else 0,
+        datetime.now(UTC).isoformat(),
+    )
+    await db.execute(
+        _UPSERT.format(table="sales_rollup_hourly"),
+        (occurred.strftime("%Y-%m-%dT%H"), *values),
+    )
+    await db.execute(
+        _UPSERT.format(table="sales_rollup_daily"),
+        (occurred.strftime("%Y-%m-%d"), *values),
+    )
+
+
+async def rebuild_rollups(db: aiosqlite.Connection) -> None:
+    """Recompute both rollup tables from `transactions_all`."""
+    await db.execute("DELETE FROM sales_rollup_hourly")
+    await db.execute("DELETE FROM sales_rollup_daily")
+    hourly: dict[tuple, list] = {}
+    daily: dict[tuple, list] = {}
+    async with db.execute(
+        """
+        SELECT tx.occurred_at, t.store_name, tx.terminal_id, tx.payment_type,
+               tx.total_ore, tx.synced_from_offline
+        FROM transactions_all tx JOIN terminals t ON t.id = tx.terminal_id
+        """
+    ) as cur:
+        async for row in cur:
+            occurred = _utc(datetime.fromisoformat(row[0]))
+            key = (row[1], row[2], row[3] or "")
+            for buckets, bucket in (
+                (hourly, occurred.strftime("%Y-%m-%dT%H")),
+                (daily, occurred.strftime("%Y-%m-%d")),
+            ):
+                acc = buckets.setdefault((bucket, *key), [0, 0, 0])
+                acc[0] += 1
+                acc[1] += row[4]
+                acc[2] += 1 if row[5] else 0
+
+    now = datetime.now(UTC).isoformat()
+    for table, buckets in (
+        ("sales_rollup_hourly", hourly),
+        ("sales_rollup_daily", daily),
+    ):
+        await db.executemany(
+            _UPSERT.format(table=table),
+            [(*key, *acc, now) for key, acc in buckets.items()],
+        )
+
+
+async def remove_sales(
+    db: aiosqlite.Connection, store_name: str, terminal_id: int, rows: list
+) -> None:
+    """Take deleted sales back out of their buckets, dropping buckets left empty.
+
+    `rows` carry `occurred_at`, `payment_type`, `total_ore` and
+    `synced_from_offline` of the deleted transactions.
+    """
+    hourly: dict[tuple, list] = {}
+    daily: dict[tuple, list] = {}
+    for row in rows:
+        occurred = _utc(datetime.fromisoformat(row["occurred_at"]))
+        for buckets, bucket in (
+            (hourly, occurred.strftime("%Y-%m-%dT%H")),
+            (daily, occurred.strftime("%Y-%m-%d")),
+        ):
+            acc = buckets.setdefault((bucket, row["payment_type"] or ""), [0, 0, 0])
+            acc[0] -= 1
+            acc[1] -= row["total_ore"]
+            acc[2] -= 1 if row["synced_from_offline"] else 0
+
+    now = datetime.now(UTC).isoformat()
+    for table, buckets in (
+        ("sales_rollup_hourly", hourly),
+        ("sales_rollup_daily", daily),
+    ):
+        keys = [(bucket, store_name, terminal_id, payment_type) for bucket, payment_type in buckets]
+        await db.executemany(
+            _UPSERT.format(table=table),
+            [(*key, *acc, now) for key, acc in zip(keys, buckets.values())],
+        )
+        await db.executemany(
+            f"""
+            DELETE FROM {table}
+            WHERE bucket = ? AND store_name = ? AND terminal_id = ? AND payment_type = ?
+              AND tx_count <= 0
+            """,
+            keys,
+        )
+
+
+async def window_rows(
+    db: aiosqlite.Connection,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    store_name: str | None = None,
+    terminal_id: int | None = None,
+    payment_type: str | None = None,
+) -> list[aiosqlite.Row]:
+    """Rollup rows per bucket and payment type for [start, end)."""
+    table = "sales_rollup_hourly" if granularity == "hour" else "sales_rollup_daily"
+    fmt = "%Y-%m-%dT%H" if granularity == "hour" else "%Y-%m-%d"
+    clauses = ["bucket >= ?", "bucket < ?"]
+    params: list = [_utc(start).strftime(fmt), _utc(end).strftime(fmt)]
+    if store_name:
+        clauses.append("store_name = ?")
+        params.append(store_name)
+    if terminal_id is not None:
+        clauses.append("terminal_id = ?")
+        params.append(terminal_id)
+    if payment_type:
+        clauses.append("payment_type = ?")
+        params.append(payment_type)
+
+    return await (
+        await db.execute(
+            f"""
+            SELECT bucket, payment_type, SUM(tx_count) AS tx_count,
+                   SUM(total_ore) AS total_ore, SUM(offline_count) AS offline_count
+            FROM {table}
+            WHERE {" AND ".join(clauses)}
+            GROUP BY bucket, payment_type
+            ORDER BY bucket
+            """,
+            params,
+        )
+    ).fetchall()
+
+
+def window_summary(rows: list, start: datetime, end: datetime) -> dict:
+    """Totals and per-bucket series for [start, end) from `window_rows`.
+
+    Rows may come from several store shards; buckets are added up.
+    """
+    # Summed exactly in öre and converted to kronor only for the response
+    buckets: dict[str, dict] = {}
+    by_payment_type: dict[str, int] = {}
+    summary = {"total_sales": 0, "transactions": 0, "offline_transactions": 0}
+    for row in sorted(rows, key=lambda row: row["bucket"]):
+        b = buckets.setdefault(
+            row["bucket"], {"bucket": row["bucket"], "total_sales": 0, "transactions": 0}
+        )
+        b["total_sales"] += row["total_ore"]
+        b["transactions"] += row["tx_count"]
+        ptype = row["payment_type"] or "unknown"
+        by_payment_type[ptype] = by_payment_type.get(ptype, 0) + row["total_ore"]
+        summary["total_sales"] += row["total_ore"]
+        summary["transactions"] += row["tx_count"]
+        summary["offline_transactions"] += row["offline_count"]
+    for b in buckets.values():
+        b["total_sales"] = from_ore(b["total_sales"])
+    summary["total_sales"] = from_ore(summary["total_sales"])
+
+    return {
+        "start": _utc(start),
+        "end": _utc(end),
+        **summary,
+        "by_payment_type": {k: from_ore(v) for k, v in by_payment_type.items()},
+        "buckets": list(buckets.values()),
+    }
+
+
+def comparison_windows(
+    period: str, reference: datetime | None
+) -> tuple[str, tuple[datetime, datetime], tuple[datetime, datetime]]:
+    """(granularity, current window, same window one week earlier)."""
+    ref = _utc(reference or datetime.now(UTC))
+    if period == "day":
+        start = ref.replace(hour=0, minute=0, second=0, microsecond=0)
+        current = (start, start + timedelta(days=1))
+        granularity = "hour"
+    else:
+        end = ref.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        current = (end - timedelta(days=7), end)
+        granularity = "day"
+    week = timedelta(days=7)
+    return granularity, current, (current[0] - week, current[1] - week)
@@ -0,0 +1,84 @@
+import json
+
+from .timestamps import format_us, now_us
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is the fallback
+    orjson = None
+
+# Hot list endpoints select these columns and encode the tuples straight to
+# JSON bytes, skipping per-row model construction and response_model
+# validation. The output matches the response models (tests/test_serialization.py
+# checks that); benchmarks/serialization.py measures the per-row cost.
+TRANSACTION_COLUMNS = (
+    "id, terminal_id, idempotency_key, total_ore, item_count, occurred_us, created_us, "
+    "synced_from_offline, payment_type, customer_email, membership_number, is_invoice, "
+    "signature_status"
+)
+TERMINAL_COLUMNS = (
+    "id, terminal_code, store_name, active, created_us, last_seen_us, ecdsa_public_key"
+)
+SYNC_STATUS_COLUMNS = "terminal_code, pending_sync_count, last_synced_us"
+
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def transactions_json(rows) -> bytes:
+    return dumps(
+        [
+            {
+                "id": r[0],
+                "terminal_id": r[1],
+                "idempotency_key": r[2],
+                "total_amount": r[3] / 100,
+                "item_count": r[4],
+                "occurred_at": format_us(r[5]),
+                "created_at": format_us(r[6]),
+                "synced_from_offline": bool(r[7]),
+                "payment_type": r[8],
+                "customer_email": r[9],
+                "membership_number": r[10],
+                "is_invoice": bool(r[11]),
+                "signature_status": r[12],
+            }
+            for r in rows
+        ]
+    )
+
+
+def terminals_json(rows) -> bytes:
+    # One clock reading for the whole page
+    online_after = now_us() - 30_000_000
+    return dumps(
+        [
+            {
+                "id": r[0],
+                "terminal_code": r[1],
+                "store_name": r[2],
+                "active": bool(r[3]),
+                "created_at": format_us(r[4]),
+                "last_seen_at": format_us(r[5]),
+                "status": "online" if r[5] is not None and r[5] >= online_after else "offline",
+                "ecdsa_public_key": r[6],
+            }
+            for r in rows
+        ]
+    )
+
+
+def sync_status_json(rows) -> bytes:
+    return dumps(
+        [
+            {
+                "terminal_code": r[0],
+                "pending_sync_count": r[1],
+                "last_synced_at": format_us(r[2]),
+            }
+            for r in rows
+        ]
+    )
@@ -0,0 +1,239 @@
+import asyncio
+import os
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import TypeVar
+
+import aiosqlite
+
+from . import readers
+from .config import settings
+from .database import get_db, init_db, now_iso
+from .writer import Writer, writer
+
+# With SHARD_DIR set, each store's sales (transactions, items, rollups,
+# reconciliation buckets, partitions) live in a database file of their own,
+# so stores don't queue behind each other's writes. The main database stays
+# the catalog: terminals, admin settings, payload dictionaries and
+# `store_shards`, which numbers the shard files. Shards copy their store's
+# terminal rows (without credentials) so per-shard queries can still join
+# `terminals`; a soft delete updates the copy too. Sales stored before sharding was switched on stay in the main
+# database, which is shard 0 and is always read alongside the others.
+#
+# Each shard hands out transaction ids from its own range of ID_SPAN, so an
+# id alone says which shard holds it.
+ID_SPAN = 10**12
+
+T = TypeVar("T")
+
+
+@dataclass
+class Shard:
+    id: int
+    path: str
+    writer: Writer
+    store_name: str | None = None  # None for the main database
+
+
+main = Shard(0, settings.database_path, writer)
+_shards: dict[int, Shard] = {0: main}
+_by_store: dict[str, Shard] = {}
+_lock = asyncio.Lock()
+
+
+def enabled() -> bool:
+    return bool(settings.shard_dir)
+
+
+def _path(shard_id: int) -> str:
+    return os.path.join(settings.shard_dir, f"store_{shard_id:04d}.db")
+
+
+def archive_dir(shard: Shard) -> str:
+    """Where a shard's sealed months are exported."""
+    if shard is main:
+        return settings.archive_dir
+    return os.path.join(settings.archive_dir, f"store_{shard.id:04d}")
+
+
+_MIRROR_TERMINAL = """
+    INSERT INTO terminals
+        (id, terminal_code, password_hash, store_name, active, deleted_at,
+         created_at, created_us, updated_at)
+    VALUES (?, ?, '', ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        active = excluded.active,
+        deleted_at = excluded.deleted_at,
+        updated_at = excluded.updated_at
+"""
+
+
+async def _open(shard_id: int, store_name: str) -> Shard:
+    path = _path(shard_id)
+    os.makedirs(settings.shard_dir, exist_ok=True)
+    await init_db(path)
+
+    catalog = await get_db()
+    terminals = await (
+        await catalog.execute(
+            """
+            SELECT id, terminal_code, store_name, active, deleted_at,
+                   created_at, created_us, updated_at
+            FROM terminals WHERE store_name = ?
+            """,
+            (store_name,),
+        )
+    ).fetchall()
+    await catalog.close()
+
+    db = await get_db(path)
+    try:
+        await db.execute("BEGIN IMMEDIATE")
+        await db.execute(
+            """
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'transactions', ? WHERE NOT EXISTS
+                (SELECT 1 FROM sqlite_sequence WHERE name = 'transactions')
+            """,
+            (shard_id * ID_SPAN,),
+        )
+        await db.executemany(_MIRROR_TERMINAL, [tuple(row) for row in terminals])
+        await db.commit()
+    finally:
+        await db.close()
+
+    shard = Shard(
+        shard_id,
+        path,
+        Writer(settings.writer_max_batch, settings.writer_max_delay_ms / 1000, path),
+        store_name,
+    )
+    await shard.writer.start()
+    _shards[shard_id] = shard
+    _by_store[store_name] = shard
+    return shard
+
+
+async def _load() -> None:
+    # Open shards added to the catalog since we last looked (by any worker)
+    db = await get_db()
+    rows = await (await db.execute("SELECT id, store_name FROM store_shards")).fetchall()
+    await db.close()
+    for row in rows:
+        if row["id"] not in _shards:
+            await _open(row["id"], row["store_name"])
+
+
+async def start() -> None:
+    if enabled():
+        async with _lock:
+            await _load()
+
+
+async def stop() -> None:
+    """Stop the shard writers (the main writer is stopped by the app)."""
+    for shard in list(_shards.values()):
+        if shard is not main:
+            await shard.writer.stop()
+    _shards.clear()
+    _shards[0] = main
+    _by_store.clear()
+
+
+async def for_store(store_name: str) -> Shard:
+    """The shard new sales from `store_name` go to, created on first use."""
+    if not enabled():
+        return main
+    shard = _by_store.get(store_name)
+    if shard is not None:
+        return shard
+    async with _lock:
+        if store_name not in _by_store:
+
+            async def register(db: aiosqlite.Connection) -> int:
+                await db.execute(
+                    """
+                    INSERT INTO store_shards (store_name, created_at) VALUES (?, ?)
+                    ON CONFLICT(store_name) DO NOTHING
+                    """,
+                    (store_name, now_iso()),
+                )
+                row = await (
+                    await db.execute(
+                        "SELECT id FROM store_shards WHERE store_name = ?", (store_name,)
+                    )
+                ).fetchone()
+                return row[0]
+
+            await _open(await writer.submit(register), store_name)
+    return _by_store[store_name]
+
+
+async def get(shard_id: int) -> Shard | None:
+    if shard_id not in _shards and enabled():
+        async with _lock:
+            await _load()
+    return _shards.get(shard_id)
+
+
+async def for_transaction(transaction_id: int) -> Shard | None:
+    """The shard holding a transaction id, or None if no such shard exists."""
+    return await get(transaction_id // ID_SPAN)
+
+
+async def covering(store_name: str | None = None) -> list[Shard]:
+    """Shards that may hold sales of `store_name` (of every store when None)."""
+    if not enabled():
+        return [main]
+    async with _lock:
+        await _load()
+    if store_name is None:
+        return list(_shards.values())
+    shard = _by_store.get(store_name)
+    return [main] if shard is None else [main, shard]
+
+
+async def mirror_terminal(row: aiosqlite.Row) -> None:
+    """Copy a catalog terminal into its store's shard, or bring the copy up to date."""
+    shard = await for_store(row["store_name"])
+    if shard is main:
+        return
+
+    async def insert(db: aiosqlite.Connection) -> None:
+        await db.execute(
+            _MIRROR_TERMINAL,
+            (
+                row["id"],
+                row["terminal_code"],
+                row["store_name"],
+                row["active"],
+                row["deleted_at"],
+                row["created_at"],
+                row["created_us"],
+                row["updated_at"],
+            ),
+        )
+
+    await shard.writer.submit(insert)
+
+
+async def fan_out(
+    read: Callable[[aiosqlite.Connection], Awaitable[T]],
+    targets: list[Shard] | None = None,
+    snapshot: readers.Snapshot | None = None,
+) -> list[T]:
+    """Run `read` on every shard (or `targets`) in parallel on read-only connections.
+
+    Reads go through `snapshot` when given, so they agree with the caller's
+    other reads; otherwise through a snapshot of their own.
+    """
+    if targets is None:
+        targets = await covering()
+    if snapshot is None:
+        async with readers.snapshot() as snapshot:
+            return await fan_out(read, targets, snapshot)
+
+    async def run(shard: Shard) -> T:
+        return await read(await snapshot.connection(shard.path))
+
+    return await asyncio.gather(*(run(shard) for shard in targets))
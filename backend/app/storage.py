@@ -0,0 +1,105 @@
+import logging
+import os
+import sqlite3
+import time
+
+import aiosqlite
+
+from . import metrics
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Selectable SQLite engine behind `database.get_db`. This is not a repository
+# layer: the SQL stays inline where it is used, and both engines run it
+# unchanged against the same schema. Only where the pages live differs:
+#
+#   sqlite   database files on disk (the default)
+#   memory   SQLite's `memdb` VFS: every database lives in process memory and
+#            its path is only where snapshots go. The snapshot is loaded on
+#            startup and rewritten every SNAPSHOT_SECONDS and on shutdown, so
+#            a crash loses at most that much. One process only.
+
+
+class SQLiteEngine:
+    name = "sqlite"
+    snapshot_reads = True  # WAL: readers and the writer don't block each other
+
+    async def open(self, path: str) -> None:
+        pass
+
+    async def connect(self, path: str) -> aiosqlite.Connection:
+        return await aiosqlite.connect(path)
+
+    async def connect_reader(self, path: str) -> aiosqlite.Connection:
+        return await aiosqlite.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+
+    async def snapshot(self) -> None:
+        pass  # Committed writes are already on disk
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryEngine:
+    name = "memory"
+    snapshot_reads = False  # No WAL: an open read transaction holds up commits
+
+    def __init__(self) -> None:
+        # One connection per database keeps its memory alive between requests
+        self._anchors: dict[str, sqlite3.Connection] = {}
+
+    @staticmethod
+    def _uri(path: str) -> str:
+        # memdb names starting with "/" are shared by every connection in the process
+        return f"file:{os.path.abspath(path)}?vfs=memdb"
+
+    async def open(self, path: str) -> None:
+        """Create the in-memory database for `path`, loaded from its snapshot if any."""
+        if path in self._anchors:
+            return
+        anchor = sqlite3.connect(self._uri(path), uri=True, check_same_thread=False)
+        if os.path.exists(path):
+            source = sqlite3.connect(path)
+            try:
+                source.backup(anchor)
+            finally:
+                source.close()
+            logger.info("Loaded %s into memory", path)
+        self._anchors[path] = anchor
+
+    async def connect(self, path: str) -> aiosqlite.Connection:
+        await self.open(path)
+        return await aiosqlite.connect(self._uri(path), uri=True)
+
+    async def connect_reader(self, path: str) -> aiosqlite.Connection:
+        await self.open(path)
+        return await aiosqlite.connect(f"{self._uri(path)}&mode=ro", uri=True)
+
+    async def snapshot(self) -> None:
+        """Copy every in-memory database to its path, replacing the old snapshot atomically."""
+        for path in list(self._anchors):
+            started = time.perf_counter()
+            temporary = f"{path}.snapshot"
+            source = await self.connect(path)
+            try:
+                target = await aiosqlite.connect(temporary)
+                try:
+                    await source.backup(target)
+                finally:
+                    await target.close()
+            finally:
+                await source.close()
+            os.replace(temporary, path)
+            metrics.observe("storage.snapshot_ms", (time.perf_counter() - started) * 1000)
+
+    async def close(self) -> None:
+        await self.snapshot()
+        for anchor in self._anchors.values():
+            anchor.close()
+        self._anchors.clear()
+
+
+ENGINES = {engine.name: engine for engine in (SQLiteEngine, MemoryEngine)}
+
+engine: SQLiteEngine | MemoryEngine = ENGINES[settings.storage_engine]()
@@ -0,0 +1,139 @@
+import json
+from datetime import datetime
+from typing import NamedTuple
+
+from pydantic import ConfigDict, Field, TypeAdapter, ValidationError
+from pydantic.dataclasses import dataclass
+
+from .models import PaymentType
+from .money import MAX_QUANTITY, Kronor
+
+# Offline sync batches are validated by one compiled adapter into slotted
+# records instead of a BaseModel graph per sale. The records mirror
+# TransactionCreateRequest and friends field for field (same aliases, same
+# dump), so ingest, signing and payload hashing treat both alike.
+_CONFIG = ConfigDict(validate_by_name=True, serialize_by_alias=True)
+
+
+@dataclass(slots=True, kw_only=True, config=_CONFIG)
+class ItemRecord:
+    product_id: str
+    name: str
+    price_ore: Kronor = Field(alias="price")
+    quantity: int = Field(gt=0, le=MAX_QUANTITY)
+
+
+@dataclass(slots=True, kw_only=True, config=_CONFIG)
+class CreditCardRecord:
+    card_number: str | None = None
+    card_type: str | None = None
+    expiry_month: int | None = None
+    expiry_year: int | None = None
+
+
+@dataclass(slots=True, kw_only=True, config=_CONFIG)
+class SwishRecord:
+    phone_number: str | None = None
+    transaction_id: str | None = None
+
+
+@dataclass(slots=True, kw_only=True, config=_CONFIG)
+class MobilePayRecord:
+    device_id: str | None = None
+    transaction_token: str | None = None
+
+
+@dataclass(slots=True, kw_only=True, config=_CONFIG)
+class InvoiceRecord:
+    customer_email: str | None = None
+    membership_number: str | None = None
+    is_member: bool = False
+
+
+@dataclass(slots=True, kw_only=True, config=_CONFIG)
+class PaymentRecord:
+    payment_type: PaymentType
+    credit_card: CreditCardRecord | None = None
+    swish: SwishRecord | None = None
+    mobile_pay: MobilePayRecord | None = None
+    invoice: InvoiceRecord | None = None
+    cash_tendered: float | None = None
+    cash_change: float | None = None
+
+
+@dataclass(slots=True, kw_only=True, config=_CONFIG)
+class TransactionRecord:
+    idempotency_key: str
+    total_ore: Kronor = Field(alias="total_amount", ge=0)
+    items: list[ItemRecord]
+    occurred_at: datetime
+    offline_created: bool = False
+    payment: PaymentRecord | None = None
+
+
+@dataclass(slots=True, kw_only=True, config=_CONFIG)
+class BatchRecord:
+    transactions: list[TransactionRecord]
+    batch_signature: str | None = None
+
+
+class InvalidItem(NamedTuple):
+    """A batch position that failed validation; `errors` locs are item-relative."""
+
+    idempotency_key: str
+    errors: list[dict]
+
+
+class SyncBatch(NamedTuple):
+    transactions: list[TransactionRecord | InvalidItem]  # In batch order
+    batch_signature: str | None
+
+    @property
+    def valid(self) -> list[TransactionRecord]:
+        return [tx for tx in self.transactions if not isinstance(tx, InvalidItem)]
+
+
+_BATCH = TypeAdapter(BatchRecord)
+_TRANSACTIONS = TypeAdapter(list[TransactionRecord])
+
+
+def validate_sync_batch(body: bytes) -> SyncBatch:
+    """Validate a raw `/sync/offline` body in one pass.
+
+    Invalid sales become `InvalidItem`s in place; only the valid ones are
+    validated again. Problems with the envelope itself (bad JSON, missing
+    `transactions`) raise the ValidationError.
+    """
+    try:
+        batch = _BATCH.validate_json(body)
+    except ValidationError as exc:
+        item_errors: dict[int, list[dict]] = {}
+        for error in exc.errors(include_url=False, include_context=False, include_input=False):
+            loc = error["loc"]
+            if len(loc) < 2 or loc[0] != "transactions" or not isinstance(loc[1], int):
+                raise
+            item_errors.setdefault(loc[1], []).append({**error, "loc": loc[2:]})
+
+        raw = json.loads(body)
+        raw_transactions = raw["transactions"]
+        records = iter(
+            _TRANSACTIONS.validate_python(
+                [tx for i, tx in enumerate(raw_transactions) if i not in item_errors]
+            )
+        )
+        transactions = []
+        for i, tx in enumerate(raw_transactions):
+            if i not in item_errors:
+                transactions.append(next(records))
+                continue
+            key = tx.get("idempotency_key") if isinstance(tx, dict) else None
+            transactions.append(
+                InvalidItem(key if isinstance(key, str) else "", item_errors[i])
+            )
+        return SyncBatch(transactions, raw.get("batch_signature"))
+    return SyncBatch(batch.transactions, batch.batch_signature)
+
+
+def dump_transactions(records: list[TransactionRecord]) -> list[dict]:
+    """Request-shaped dicts (kronor, aliases) for a run of records, in one call."""
+    return _TRANSACTIONS.dump_python(records)
@@ -0,0 +1,146 @@
+from datetime import UTC, datetime, timedelta
+
+import aiosqlite
+import numpy as np
+
+_STEP_SECONDS = {"hour": 3600, "day": 86400}
+
+# Largest grid load_grid builds; longer ranges must use a coarser resolution
+MAX_BUCKETS = 100_000
+
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+def pick_resolution(start: datetime, end: datetime) -> str:
+    return "hour" if end - start <= timedelta(days=14) else "day"
+
+
+def _bounds(resolution: str, start: datetime, end: datetime) -> tuple[int, int, int]:
+    step = _STEP_SECONDS[resolution]
+    origin = int(_utc(start).timestamp()) // step * step
+    size = max(0, -(-(int(_utc(end).timestamp()) - origin) // step))
+    return step, origin, size
+
+
+def bucket_count(resolution: str, start: datetime, end: datetime) -> int:
+    """Number of grid buckets load_grid allocates for [start, end)."""
+    return _bounds(resolution, start, end)[2]
+
+
+async def load_grid(
+    db: aiosqlite.Connection,
+    resolution: str,
+    start: datetime,
+    end: datetime,
+    store_name: str | None = None,
+    terminal_id: int | None = None,
+) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """Dense, zero-filled arrays over [start, end) from the rollup tables.
+
+    Returns (epoch_seconds, {"sales", "transactions", "offline"}); rows are
+    scattered into the grid in one vectorised step.
+    """
+    table = "sales_rollup_hourly" if resolution == "hour" else "sales_rollup_daily"
+    fmt = "%Y-%m-%dT%H" if resolution == "hour" else "%Y-%m-%d"
+    start, end = _utc(start), _utc(end)
+    step, origin, size = _bounds(resolution, start, end)
+    if size > MAX_BUCKETS:
+        raise ValueError(f"{size} {resolution} buckets exceed the limit of {MAX_BUCKETS}")
+
+    clauses = ["bucket >= ?", "bucket < ?"]
+    params: list = [start.strftime(fmt), end.strftime(fmt)]
+    if store_name:
+        clauses.append("store_name = ?")
+        params.append(store_name)
+    if terminal_id is not None:
+        clauses.append("terminal_id = ?")
+        params.append(terminal_id)
+    rows = await (
+        await db.execute(
+            f"""
+            SELECT bucket, SUM(total_ore) / 100.0, SUM(tx_count), SUM(offline_count)
+            FROM {table} WHERE {" AND ".join(clauses)}
+            GROUP BY bucket
+            """,
+            params,
+        )
+    ).fetchall()
+
+    timestamps = origin + np.arange(size, dtype=np.int64) * step
+    grid = {name: np.zeros(size) for name in ("sales", "transactions", "offline")}
+    if rows and size:
+        # Bucket keys are fixed-width, so parse them as numpy datetimes in bulk
+        keys = np.array(
+            [r[0] + (":00" if resolution == "hour" else "") for r in rows],
+            dtype="datetime64[s]",
+        ).astype(np.int64)
+        idx = (keys - origin) // step
+        values = np.array([r[1:] for r in rows], dtype=float)
+        valid = (idx >= 0) & (idx < size)
+        for col, name in enumerate(("sales", "transactions", "offline")):
+            np.add.at(grid[name], idx[valid], values[valid, col])
+    return timestamps, grid
+
+
+def derive(metric: str, grid: dict[str, np.ndarray]) -> np.ndarray:
+    if metric == "offline_share":
+        tx = grid["transactions"]
+        return np.divide(grid["offline"], tx, out=np.zeros_like(tx), where=tx > 0)
+    return grid[metric]
+
+
+def minmax_downsample(
+    x: np.ndarray, y: np.ndarray, points: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Keep the min and max of each of `points // 2` equal-width bins."""
+    n = len(y)
+    if n <= points or points < 2:
+        return x, y
+    bins = points // 2
+    width = -(-n // bins)
+    pad = bins * width - n
+    # Pad with edge values so padding can't become a new min/max
+    padded = np.pad(y, (0, pad), mode="edge").reshape(bins, width)
+    base = np.arange(bins) * width
+    lo = np.minimum(base + padded.argmin(axis=1), n - 1)
+    hi = np.minimum(base + padded.argmax(axis=1), n - 1)
+    keep = np.unique(np.concatenate([lo, hi]))
+    return x[keep], y[keep]
+
+
+def lttb_downsample(
+    x: np.ndarray, y: np.ndarray, points: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets: keeps the visually significant points."""
+    n = len(y)
+    if n <= points or points < 3:
+        return x, y
+    xf = x.astype(float)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    keep = np.empty(points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        nxt_lo, nxt_hi = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = xf[nxt_lo:max(nxt_hi, nxt_lo + 1)].mean()
+        avg_y = y[nxt_lo:max(nxt_hi, nxt_lo + 1)].mean()
+        area = np.abs(
+            (xf[prev] - avg_x) * (y[lo:hi] - y[prev])
+            - (xf[prev] - xf[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(area.argmax())
+        keep[i + 1] = prev
+    return x[keep], y[keep]
+
+
+def downsample(
+    method: str, x: np.ndarray, y: np.ndarray, points: int
+) -> tuple[np.ndarray, np.ndarray]:
+    if method == "minmax":
+        return minmax_downsample(x, y, points)
+    return lttb_downsample(x, y, points)
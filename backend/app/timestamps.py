@@ -0,0 +1,97 @@
+import time
+from datetime import UTC, datetime
+from functools import lru_cache
+
+import aiosqlite
+
+from .partitions import partition_tables, unsealed
+
+US_PER_SECOND = 1_000_000
+US_PER_DAY = 86_400 * US_PER_SECOND
+
+# ISO text column -> epoch-microsecond twin
+EPOCH_COLUMNS = {
+    "transactions": {"occurred_at": "occurred_us", "created_at": "created_us", "paid_at": "paid_us"},
+    "terminals": {
+        "created_at": "created_us",
+        "last_seen_at": "last_seen_us",
+        "last_synced_at": "last_synced_us",
+    },
+}
+
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+
+def to_us(value: datetime) -> int:
+    """Epoch microseconds; naive datetimes are taken as UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    delta = value - datetime(1970, 1, 1, tzinfo=UTC)
+    return (delta.days * 86_400 + delta.seconds) * US_PER_SECOND + delta.microseconds
+
+
+def iso_to_us(value: str | None) -> int | None:
+    return to_us(datetime.fromisoformat(value)) if value else None
+
+
+@lru_cache(maxsize=4096)
+def _date_prefix(days: int) -> str:
+    # Days since the epoch to "YYYY-MM-DDT" (Hinnant's civil_from_days)
+    z = days + 719_468
+    era = z // 146_097
+    doe = z - era * 146_097
+    yoe = (doe - doe // 1460 + doe // 36_524 - doe // 146_096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 if mp < 10 else mp - 9
+    year = yoe + era * 400 + (month <= 2)
+    return f"{year:04d}-{month:02d}-{day:02d}T"
+
+
+def format_us(us: int | None) -> str | None:
+    """ISO-8601 UTC ("...Z") straight from epoch microseconds.
+
+    Same output as pydantic's datetime serialisation, without building a
+    datetime per row; the date part is cached per day.
+    """
+    if us is None:
+        return None
+    days, rem = divmod(us, US_PER_DAY)
+    seconds, micros = divmod(rem, US_PER_SECOND)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    text = f"{_date_prefix(days)}{hour:02d}:{minute:02d}:{second:02d}"
+    return f"{text}.{micros:06d}Z" if micros else f"{text}Z"
+
+
+async def backfill_epoch_columns(
+    db: aiosqlite.Connection, base: str, batch_size: int = 1000
+) -> None:
+    """Fill `base`'s *_us columns from their ISO text twins (sealed months too)."""
+    sources, targets = zip(*EPOCH_COLUMNS[base].items())
+    tables = [base]
+    if base == "transactions":
+        tables += await partition_tables(db)
+
+    for table in tables:
+        update = f"UPDATE {table} SET {', '.join(f'{t} = ?' for t in targets)} WHERE id = ?"
+        last_id = 0
+        while True:
+            rows = await (
+                await db.execute(
+                    f"SELECT id, {', '.join(sources)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                )
+            ).fetchall()
+            if not rows:
+                break
+            values = [(*(iso_to_us(v) for v in row[1:]), row[0]) for row in rows]
+            if table.startswith("transactions_"):
+                async with unsealed(db, table):
+                    await db.executemany(update, values)
+            else:
+                await db.executemany(update, values)
+            last_id = rows[-1][0]
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+import aiosqlite
+
+from . import coherence, metrics
+from .config import settings
+from .database import get_db
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+WriteOp = Callable[[aiosqlite.Connection], Awaitable[T]]
+
+
+class Writer:
+    """The one task that writes to SQLite, with group commit.
+
+    Request handlers `submit` an async function of the writer's connection.
+    Ops run one at a time, each inside its own savepoint, and everything
+    queued within `max_delay` seconds of the first op (up to `max_batch`
+    ops) shares one transaction and one fsync. Callers are resolved only
+    once their group has committed; an op that raises is rolled back to
+    its savepoint without affecting the rest of the group.
+
+    There is one writer per database file. Ops must not commit, and should only read what they need to write.
+    Once it holds the write lock, the writer reloads caches that another
+    process has invalidated (see coherence), so ops never act on stale ones.
+    """
+
+    def __init__(self, max_batch: int, max_delay: float, database: str | None = None) -> None:
+        self.database = database or settings.database_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._db: aiosqlite.Connection | None = None
+        self._after_commit: list[Callable[[], None]] = []
+        self._data_version: int | None = None
+        self.committed_ops = 0  # Ops committed since start (maintenance uses it)
+
+    async def start(self) -> None:
+        self._db = await get_db(self.database)
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Finish what is queued, then close the connection."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        await self._db.close()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def submit(self, op: WriteOp[T]) -> T:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future, time.perf_counter()))
+        return await future
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Run `callback` once the current op's group has committed."""
+        self._after_commit.append(callback)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            group = [item]
+            deadline = loop.time() + self.max_delay
+            while len(group) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except TimeoutError:
+                        break
+                if item is None:
+                    await self._queue.put(None)  # Stop after this group
+                    break
+                group.append(item)
+            await self._write(group)
+
+    async def _write(self, group: list) -> None:
+        db = self._db
+        outcomes = []
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+            version = await coherence.data_version(db)
+            if version != self._data_version:
+                self._data_version = version
+                for name in await coherence.sync(db, self.database):
+                    metrics.increment(f"coherence.reloads.{name}")
+            for op, future, queued_at in group:
+                metrics.observe("writer.queue_ms", (time.perf_counter() - queued_at) * 1000)
+                callbacks = len(self._after_commit)
+                await db.execute("SAVEPOINT op")
+                try:
+                    result = await op(db)
+                except Exception as exc:
+                    await db.execute("ROLLBACK TO op")
+                    await db.execute("RELEASE op")
+                    del self._after_commit[callbacks:]
+                    metrics.increment("writer.op_errors")
+                    outcomes.append((future, exc, True))
+                    continue
+                await db.execute("RELEASE op")
+                outcomes.append((future, result, False))
+
+            started = time.perf_counter()
+            await db.commit()
+            metrics.observe("writer.commit_ms", (time.perf_counter() - started) * 1000)
+        except Exception as exc:
+            # The group's transaction is lost: fail every caller in it
+            logger.exception("Group commit of %d writes failed", len(group))
+            await db.rollback()
+            self._after_commit = []
+            metrics.increment("writer.failed_commits")
+            for _, future, _ in group:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        metrics.increment("writer.commits")
+        metrics.increment("writer.ops", len(group))
+        self.committed_ops += len(group)
+        metrics.observe("writer.batch_size", len(group))
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("After-commit callback failed")
+        for future, value, failed in outcomes:
+            if future.done():
+                continue  # Caller went away; the write still happened
+            if failed:
+                future.set_exception(value)
+            else:
+                future.set_result(value)
+
+
+writer = Writer(settings.writer_max_batch, settings.writer_max_delay_ms / 1000)
@@ -0,0 +1,69 @@
+"""Cost per sale through the whole `/transactions` path, on disk or in memory.
+
+The memory engine takes page writes and fsync out of the picture, so the
+difference between the two runs is storage cost and what is left of the
+memory run is CPU: validation, ingest, rollups and group commit.
+
+    python benchmarks/ingest.py [sqlite|memory] [sales] [concurrency]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+engine = sys.argv[1] if len(sys.argv) > 1 else "sqlite"
+os.environ["STORAGE_ENGINE"] = engine
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+
+from app.main import app, lifespan  # noqa: E402
+
+
+def sale() -> dict:
+    return {
+        "idempotency_key": str(uuid.uuid4()),
+        "total_amount": 62.5,
+        "items": [
+            {"product_id": f"p{j}", "name": f"Product {j}", "price": 12.5, "quantity": 1}
+            for j in range(5)
+        ],
+        "occurred_at": "2026-10-19T10:15:00+02:00",
+        "payment": {"payment_type": "swish", "swish": {"phone_number": "0701234567"}},
+    }
+
+
+async def main() -> None:
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        await c.post(
+            "/terminals",
+            json={"terminal_code": "bench", "password": "secret1", "store_name": "Bench"},
+        )
+        login = await c.post("/auth/login", json={"terminal_code": "bench", "password": "secret1"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        sales = [sale() for _ in range(n)]
+
+        async def client(chunk: list[dict]) -> None:
+            for body in chunk:
+                r = await c.post("/transactions", json=body, headers=headers)
+                r.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(sales[i::concurrency]) for i in range(concurrency)))
+        seconds = time.perf_counter() - started
+    print(
+        f"{engine:6s} {n} sales, {concurrency} clients: "
+        f"{n / seconds:8.0f} sales/s, {seconds / n * 1e6:6.1f} µs/sale"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
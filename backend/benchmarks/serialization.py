@@ -0,0 +1,110 @@
+"""Per-row cost of the list endpoints' JSON path vs. per-row pydantic models.
+
+tests/test_serialization.py checks that both produce the same JSON.
+
+    python benchmarks/serialization.py [rows]
+"""
+
+import random
+import sys
+import timeit
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.models import SyncStatusResponse, TerminalResponse, TransactionResponse  # noqa: E402
+from app.serialization import (  # noqa: E402
+    sync_status_json,
+    terminals_json,
+    transactions_json,
+)
+from app.timestamps import format_us, now_us  # noqa: E402
+
+
+def transaction_rows(n: int) -> list[tuple]:
+    base = now_us()
+    return [
+        (
+            i,
+            random.randint(1, 20),
+            f"key-{i:08d}",
+            random.randint(100, 250_000),
+            random.randint(1, 30),
+            base - random.randint(0, 10**11),
+            base - random.randint(0, 10**9),
+            random.randint(0, 1),
+            random.choice(["cash", "swish", "credit_card", None]),
+            None,
+            random.choice([None, "M-1234"]),
+            random.randint(0, 1),
+            random.choice([None, "verified"]),
+        )
+        for i in range(n)
+    ]
+
+
+def terminal_rows(n: int) -> list[tuple]:
+    base = now_us()
+    return [
+        (i, f"t{i:03d}", f"Store {i % 7}", 1, base - 10**10, base - random.randint(0, 10**8), "PEM")
+        for i in range(n)
+    ]
+
+
+def sync_rows(n: int) -> list[tuple]:
+    return [(f"t{i:03d}", random.randint(0, 5), random.choice([None, now_us()])) for i in range(n)]
+
+
+def model_path(model, adapter: TypeAdapter, rows, build) -> bytes:
+    # What the endpoints did before: a model per row, then response_model validation
+    return adapter.dump_json(adapter.validate_python([model(**build(r)) for r in rows]))
+
+
+def tx_fields(r: tuple) -> dict:
+    return dict(
+        id=r[0], terminal_id=r[1], idempotency_key=r[2], total_amount=r[3] / 100,
+        item_count=r[4], occurred_at=format_us(r[5]), created_at=format_us(r[6]),
+        synced_from_offline=bool(r[7]), payment_type=r[8], customer_email=r[9],
+        membership_number=r[10], is_invoice=bool(r[11]), signature_status=r[12],
+    )
+
+
+def terminal_fields(r: tuple) -> dict:
+    return dict(
+        id=r[0], terminal_code=r[1], store_name=r[2], active=bool(r[3]),
+        created_at=format_us(r[4]), last_seen_at=format_us(r[5]),
+        status="online" if now_us() - r[5] <= 30_000_000 else "offline",
+        ecdsa_public_key=r[6],
+    )
+
+
+def sync_fields(r: tuple) -> dict:
+    return dict(terminal_code=r[0], pending_sync_count=r[1], last_synced_at=format_us(r[2]))
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    cases = [
+        ("transactions", TransactionResponse, transaction_rows(n), transactions_json, tx_fields),
+        ("terminals", TerminalResponse, terminal_rows(n), terminals_json, terminal_fields),
+        ("sync-status", SyncStatusResponse, sync_rows(n), sync_status_json, sync_fields),
+    ]
+    for name, model, rows, fast, build in cases:
+        adapter = TypeAdapter(list[model])
+        loops = max(1, 20_000 // n)
+        fast_s = min(timeit.repeat(lambda: fast(rows), number=loops, repeat=5)) / loops
+        slow_s = min(
+            timeit.repeat(
+                lambda: model_path(model, adapter, rows, build), number=loops, repeat=5
+            )
+        ) / loops
+        print(
+            f"{name:13s} {n} rows: fast {fast_s / n * 1e6:6.2f} µs/row, "
+            f"models {slow_s / n * 1e6:6.2f} µs/row ({slow_s / fast_s:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
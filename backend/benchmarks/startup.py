@@ -0,0 +1,71 @@
+"""Time from a cold process to serving: importing the app, then the lifespan.
+
+Runs each start in a fresh interpreter: once on a new database (full
+migration) and then on the existing one, the restart case. Pass a
+Couchbase connection string to start against a cloud that doesn't answer
+(say couchbase://10.255.255.1): startup should not wait for it.
+
+    python benchmarks/startup.py [restarts] [couchbase connection string]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def child() -> None:
+    started = time.perf_counter()
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    import asyncio
+
+    import httpx
+
+    from app.main import app, lifespan
+
+    imported = time.perf_counter()
+
+    async def serve() -> float:
+        transport = httpx.ASGITransport(app=app)
+        async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://b") as c:
+            (await c.get("/health")).raise_for_status()
+            return time.perf_counter()
+
+    serving = asyncio.run(serve())
+    print(json.dumps({"import_ms": (imported - started) * 1000, "startup_ms": (serving - imported) * 1000}))
+
+
+def start(env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, __file__, "--child"], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    restarts = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    env = dict(
+        os.environ,
+        DATABASE_PATH=os.path.join(tempfile.mkdtemp(), "bench.db"),
+        COUCHBASE_CONNECTION_STRING=sys.argv[2] if len(sys.argv) > 2 else "",
+        COUCHBASE_USERNAME="bench",
+        COUCHBASE_PASSWORD="bench",
+        COUCHBASE_BUCKET="bench",
+    )
+    first = start(env)
+    print(f"new database: import {first['import_ms']:.0f} ms, startup {first['startup_ms']:.0f} ms")
+    runs = [start(env) for _ in range(restarts)]
+    for key in ("import_ms", "startup_ms"):
+        values = [run[key] for run in runs]
+        print(
+            f"restart {key[:-3]}: median {statistics.median(values):.0f} ms, "
+            f"max {max(values):.0f} ms over {restarts} runs"
+        )
+
+
+if __name__ == "__main__":
+    child() if sys.argv[1:2] == ["--child"] else main()
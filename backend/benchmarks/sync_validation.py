@@ -0,0 +1,72 @@
+"""Cost of validating an offline sync batch: BaseModel graph vs. bulk records.
+
+Both sides include the request dumps ingest needs (hash, payment JSON,
+Couchbase items): three `model_dump()`s per sale before, one batch dump now.
+
+    python benchmarks/sync_validation.py [transactions] [items_per_transaction]
+"""
+
+import json
+import sys
+import timeit
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.idempotency import payload_hash  # noqa: E402
+from app.models import SyncBatchRequest  # noqa: E402
+from app.sync_validation import dump_transactions, validate_sync_batch  # noqa: E402
+
+
+def batch_body(n: int, items: int) -> bytes:
+    return json.dumps(
+        {
+            "transactions": [
+                {
+                    "idempotency_key": str(uuid.uuid4()),
+                    "total_amount": 12.5 * items,
+                    "items": [
+                        {"product_id": f"p{j}", "name": f"Product {j}", "price": 12.5, "quantity": 1}
+                        for j in range(items)
+                    ],
+                    "occurred_at": "2026-10-19T10:15:00+02:00",
+                    "payment": {"payment_type": "swish", "swish": {"phone_number": "0701234567"}},
+                }
+                for _ in range(n)
+            ]
+        }
+    ).encode("utf-8")
+
+
+def model_path(body: bytes) -> None:
+    for tx in SyncBatchRequest.model_validate_json(body).transactions:
+        payload_hash(tx.model_dump())
+        tx.payment.model_dump()
+        [it.model_dump() for it in tx.items]
+
+
+def bulk_path(body: bytes) -> None:
+    for fields in dump_transactions(validate_sync_batch(body).valid):
+        payload_hash(fields)
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    body = batch_body(n, items)
+
+    # Both paths must hash a sale identically, or retries would look like conflicts
+    records = validate_sync_batch(body).valid
+    models = SyncBatchRequest.model_validate_json(body).transactions
+    assert [payload_hash(f) for f in dump_transactions(records)] == [
+        payload_hash(m.model_dump()) for m in models
+    ]
+
+    for name, fn in (("models", model_path), ("bulk", bulk_path)):
+        seconds = min(timeit.repeat(lambda: fn(body), number=5, repeat=5)) / 5
+        print(f"{name:6s} {n} × {items} items: {seconds * 1e3:7.2f} ms/batch, {seconds / n * 1e6:6.1f} µs/sale")
+
+
+if __name__ == "__main__":
+    main()
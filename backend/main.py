@@ -1,12 +1,46 @@
 #!/usr/bin/env python3
-"""Entry point for running the backend server."""
+"""Entry point for running the backend server.
+
+    python main.py                # development: one process with auto-reload
+    python main.py --workers 4    # production: four worker processes
+"""
+
+import argparse
+import os
+import tempfile
 
 import uvicorn
 
+from app.config import settings
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the edge checkout backend")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--reload",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="auto-reload on code changes (default: only with a single worker)",
+    )
+    args = parser.parse_args()
+
+    reload = args.workers == 1 if args.reload is None else args.reload
+    if args.workers > 1:
+        if reload:
+            parser.error("--reload needs a single worker")
+        if settings.storage_engine == "memory":
+            parser.error("the memory storage engine needs a single worker")
+        if settings.relay_upstream_url:
+            parser.error("an edge relay needs a single worker")
+        # Workers publish metrics here so /dashboard/metrics covers all of them
+        os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="edge-checkout-metrics-"))
+
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        reload=reload,
     )
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import uuid
+from pathlib import Path
+
+# Settings are read at import, so point them at a scratch database first
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_PATH"] = os.path.join(_tmp, "test.db")
+os.environ["ARCHIVE_DIR"] = os.path.join(_tmp, "archive")
+os.environ["BACKUP_DIR"] = os.path.join(_tmp, "backups")
+os.environ["MAINTENANCE_INTERVAL_SECONDS"] = "0"
+os.environ["COUCHBASE_CONNECTION_STRING"] = ""
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app, raise_server_exceptions=False) as c:
+        yield c
+
+
+@pytest.fixture
+def terminal(client):
+    """A new terminal of its own; returns its code and auth headers."""
+    code = f"t{uuid.uuid4().hex[:8]}"
+    r = client.post(
+        "/terminals",
+        json={"terminal_code": code, "password": "secret1", "store_name": "Test"},
+    )
+    r.raise_for_status()
+    login = client.post("/auth/login", json={"terminal_code": code, "password": "secret1"})
+    return code, {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+def sale(key: str | None = None, amount: float = 25.0) -> dict:
+    return {
+        "idempotency_key": key or str(uuid.uuid4()),
+        "total_amount": amount,
+        "items": [{"product_id": "banan", "name": "Banan", "price": amount, "quantity": 1}],
+        "occurred_at": "2026-10-19T10:15:00+02:00",
+        "payment": {"payment_type": "cash"},
+    }
+
+
+def run_in_fresh_app(script: str, **env: str) -> str:
+    """Run `script` in a new interpreter against an app of its own; returns stdout.
+
+    For settings read at import (SHARD_DIR, STORAGE_ENGINE). The script gets a
+    `client` and the `sale` helper; a failed assert fails the run.
+    """
+    tmp = tempfile.mkdtemp()
+    env = {
+        **os.environ,
+        "DATABASE_PATH": os.path.join(tmp, "test.db"),
+        "ARCHIVE_DIR": os.path.join(tmp, "archive"),
+        "BACKUP_DIR": os.path.join(tmp, "backups"),
+        **env,
+    }
+    program = (
+        "from fastapi.testclient import TestClient\n"
+        "from app.main import app\n"
+        "from tests.conftest import sale\n"
+        "with TestClient(app) as client:\n" + textwrap.indent(textwrap.dedent(script), "    ")
+    )
+    done = subprocess.run(
+        [sys.executable, "-c", program],
+        cwd=Path(__file__).resolve().parents[1],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert done.returncode == 0, done.stderr[-3000:]
+    return done.stdout
@@ -0,0 +1,77 @@
+import base64
+import json
+import uuid
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from app.batch_signing import canonical_batch
+from app.sync_validation import validate_sync_batch
+
+from .conftest import sale
+
+
+def _records(transactions: list[dict]):
+    return validate_sync_batch(json.dumps({"transactions": transactions}).encode()).valid
+
+
+def _sign(private_key_pem: str, transactions: list[dict]) -> str:
+    key = serialization.load_pem_private_key(private_key_pem.encode(), password=None)
+    signature = key.sign(canonical_batch(_records(transactions)), ec.ECDSA(hashes.SHA256()))
+    return base64.b64encode(signature).decode()
+
+
+def test_values_cannot_run_into_each_other():
+    # Both were "a:1:100,b:1:0" when fields were joined with separators
+    one, two = sale("k"), sale("k")
+    one["items"] = [
+        {"product_id": "a:1:100,b", "name": "A", "price": 0.0, "quantity": 1},
+    ]
+    two["items"] = [
+        {"product_id": "a", "name": "A", "price": 1.0, "quantity": 1},
+        {"product_id": "b", "name": "A", "price": 0.0, "quantity": 1},
+    ]
+    assert canonical_batch(_records([one])) != canonical_batch(_records([two]))
+
+
+def test_every_stored_field_is_signed():
+    base = sale("k")
+    base["payment"] = {
+        "payment_type": "invoice",
+        "invoice": {"customer_email": "a@example.se", "is_member": False},
+    }
+    signed = canonical_batch(_records([base]))
+    changes = [
+        ("items", [{**base["items"][0], "name": "Other"}]),
+        ("payment", {**base["payment"], "invoice": {"customer_email": "b@example.se"}}),
+        ("payment", {"payment_type": "cash", "cash_tendered": 50.0}),
+        ("payment", {"payment_type": "cash", "cash_tendered": 100.0}),
+    ]
+    for field, value in changes:
+        assert canonical_batch(_records([{**base, field: value}])) != signed, field
+
+
+def test_signed_batch_is_verified_and_tampering_detected(client):
+    code = f"t{uuid.uuid4().hex[:8]}"
+    created = client.post(
+        "/terminals", json={"terminal_code": code, "password": "secret1", "store_name": "Test"}
+    ).json()
+    token = client.post(
+        "/auth/login", json={"terminal_code": code, "password": "secret1"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    batch = [sale()]
+    signature = _sign(created["ecdsa_private_key"], batch)
+    r = client.post(
+        "/sync/offline", json={"transactions": batch, "batch_signature": signature}, headers=headers
+    )
+    assert r.json()[0]["signature_status"] == "verified"
+
+    tampered = [{**sale(), "items": [{**batch[0]["items"][0], "name": "Other"}]}]
+    tampered[0]["idempotency_key"] = str(uuid.uuid4())
+    signature = _sign(created["ecdsa_private_key"], [{**tampered[0], "items": batch[0]["items"]}])
+    r = client.post(
+        "/sync/offline", json={"transactions": tampered, "batch_signature": signature}, headers=headers
+    )
+    assert r.json()[0]["signature_status"] == "invalid"
@@ -0,0 +1,40 @@
+import gzip
+
+import pytest
+
+from app.compression import BodyTooLarge, decompress, zstandard
+
+BODY = b'{"transactions": []}' * 50
+CODECS = [("gzip", gzip.compress)]
+if zstandard is not None:
+    CODECS.append(("zstd", lambda data: zstandard.ZstdCompressor().compress(data)))
+
+
+@pytest.mark.parametrize("encoding, pack", CODECS)
+def test_every_member_or_frame_is_decoded(encoding, pack):
+    assert decompress(pack(BODY) + pack(BODY), encoding, 10_000) == BODY * 2
+
+
+@pytest.mark.parametrize("encoding, pack", CODECS)
+def test_truncated_or_trailing_bytes_are_rejected(encoding, pack):
+    packed = pack(BODY)
+    for body in (packed[:-4], packed[: len(packed) // 2], packed + b"junk"):
+        with pytest.raises(Exception) as raised:
+            decompress(body, encoding, 10_000)
+        assert not isinstance(raised.value, BodyTooLarge)
+
+
+@pytest.mark.parametrize("encoding, pack", CODECS)
+def test_inflating_past_the_limit_is_too_large(encoding, pack):
+    with pytest.raises(BodyTooLarge):
+        decompress(pack(BODY) + pack(BODY), encoding, len(BODY) + 1)
+
+
+def test_truncated_sync_upload_is_400(client, terminal):
+    _, headers = terminal
+    r = client.post(
+        "/sync/offline",
+        content=gzip.compress(b'{"transactions": []}')[:-4],
+        headers={**headers, "Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert r.status_code == 400
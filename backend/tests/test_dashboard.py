@@ -0,0 +1,11 @@
+from .conftest import sale
+
+
+def test_recent_transactions_are_newest_first(client, terminal):
+    _, headers = terminal
+    keys = [sale()["idempotency_key"] for _ in range(3)]
+    for key in keys:
+        client.post("/transactions", json=sale(key), headers=headers).raise_for_status()
+    rows = client.get("/dashboard/transactions?limit=3").json()
+    assert [r["idempotency_key"] for r in rows] == keys[::-1]
+    assert [r["created_at"] for r in rows] == sorted((r["created_at"] for r in rows), reverse=True)
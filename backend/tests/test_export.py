@@ -0,0 +1,53 @@
+import asyncio
+
+import aiosqlite
+
+from app.export import COLUMNS, export_batches
+from app.timestamps import EPOCH_COLUMNS
+
+TX_COLUMNS = [
+    EPOCH_COLUMNS["transactions"].get(c, c)
+    for c in COLUMNS
+    if c not in ("terminal_code", "store_name")
+]
+
+
+async def _export(rows_by_table: dict[str, list[tuple[int, int]]]) -> list[tuple]:
+    async with aiosqlite.connect(":memory:") as db:
+        await db.execute("CREATE TABLE transaction_partitions (table_name TEXT, month TEXT)")
+        await db.execute("CREATE TABLE terminals (id INTEGER PRIMARY KEY, terminal_code, store_name)")
+        await db.execute("INSERT INTO terminals VALUES (1, 't1', 'Store A')")
+        for month, (table, rows) in enumerate(rows_by_table.items()):
+            await db.execute(
+                f"CREATE TABLE {table} ({', '.join(TX_COLUMNS)}, terminal_id)"
+            )
+            await db.executemany(
+                f"INSERT INTO {table} (id, terminal_id, occurred_us) VALUES (?, 1, ?)", rows
+            )
+            if table != "transactions":
+                await db.execute(
+                    "INSERT INTO transaction_partitions VALUES (?, ?)", (table, f"2026-0{month}")
+                )
+        return [row async for batch in export_batches([db], batch_size=2) for row in batch]
+
+
+def test_live_and_sealed_rows_are_merged_oldest_first():
+    rows = asyncio.run(
+        _export(
+            {
+                "transactions": [(5, 300), (6, 100)],
+                "transactions_2026_01": [(1, 200), (2, 400)],
+                "transactions_2026_02": [(3, 100), (4, 250)],
+            }
+        )
+    )
+    assert [row[0] for row in rows] == [3, 6, 1, 4, 5, 2]
+
+
+def test_timestamps_come_from_the_epoch_columns_as_utc():
+    # Sold at 10:15 local time (+02:00)
+    occurred_us = 1_792_397_700_000_000
+    (row,) = asyncio.run(_export({"transactions": [(1, occurred_us)]}))
+    exported = dict(zip(COLUMNS, row))
+    assert exported["occurred_at"] == "2026-10-19T08:15:00Z"
+    assert exported["created_at"] is None and exported["paid_at"] is None
@@ -0,0 +1,39 @@
+from app import main
+
+from .conftest import sale
+
+
+def test_duplicate_of_rolled_back_sale_is_not_cached(client, terminal, monkeypatch):
+    _, headers = terminal
+    record_sale = main.record_sale
+
+    async def failing_record_sale(db, occurred_at, store, terminal_id, payment, total_ore, *a):
+        if total_ore == 99_900:
+            raise RuntimeError("boom")
+        return await record_sale(db, occurred_at, store, terminal_id, payment, total_ore, *a)
+
+    # The second K is a duplicate of the first, which the failing sale rolls back
+    monkeypatch.setattr(main, "record_sale", failing_record_sale)
+    batch = [sale("K"), sale("K"), sale(amount=999.0)]
+    r = client.post("/sync/offline?ack=compact", json={"transactions": batch}, headers=headers)
+    assert r.status_code == 500
+    monkeypatch.setattr(main, "record_sale", record_sale)
+
+    r = client.post("/sync/offline?ack=compact", json={"transactions": [sale("K")]}, headers=headers)
+    ack = r.json()["acks"][0]
+    assert ack["status"] == "created"
+    stored = client.get("/dashboard/transactions").json()
+    assert [t["id"] for t in stored if t["idempotency_key"] == "K"] == [ack["id"]]
+
+
+def test_duplicate_in_committed_batch_is_cached(client, terminal):
+    _, headers = terminal
+    batch = [sale("D"), sale("D")]
+    acks = client.post(
+        "/sync/offline?ack=compact", json={"transactions": batch}, headers=headers
+    ).json()["acks"]
+    assert [a["status"] for a in acks] == ["created", "duplicate"]
+    retry = client.post(
+        "/sync/offline?ack=compact", json={"transactions": [sale("D")]}, headers=headers
+    ).json()["acks"]
+    assert retry == [{**acks[0], "status": "duplicate"}]
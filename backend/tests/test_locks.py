@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+from app import backups
+from app.config import settings
+from app.locks import fcntl, file_lock
+
+
+@pytest.mark.skipif(fcntl is None, reason="flock is POSIX only")
+def test_second_backup_is_busy_while_the_lock_is_held(client):
+    os.makedirs(settings.backup_dir, exist_ok=True)
+    with file_lock(os.path.join(settings.backup_dir, ".lock")):
+        with pytest.raises(backups.BackupBusy):
+            with backups._lock():
+                pass
+    with backups._lock():
+        pass
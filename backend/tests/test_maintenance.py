@@ -0,0 +1,16 @@
+from .conftest import sale
+
+
+def test_forced_maintenance_checkpoints_and_analyzes(client, terminal):
+    _, headers = terminal
+    client.post("/transactions", json=sale(), headers=headers).raise_for_status()
+
+    r = client.post("/admin/maintenance")
+    assert r.status_code == 200
+    main = r.json()[0]
+    assert main["last_analyze_at"]
+    assert main["last_checkpoint"]["mode"] == "truncate"
+    assert main["last_checkpoint"]["busy"] == 0
+    assert main["page_count"] > 0 and main["auto_vacuum"] == "incremental"
+
+    assert client.get("/admin/maintenance").json()[0]["last_analyze_at"] == main["last_analyze_at"]
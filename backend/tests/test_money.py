@@ -0,0 +1,60 @@
+import base64
+import json
+import uuid
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from .conftest import sale
+
+
+def test_out_of_range_amount_rejects_only_that_sale(client, terminal):
+    _, headers = terminal
+    batch = [sale(), sale(amount=1e20), {**sale(), "total_amount": 1e308}]
+    acks = client.post(
+        "/sync/offline?ack=compact", json={"transactions": batch}, headers=headers
+    ).json()["acks"]
+    assert [(a["status"], a["reason"]) for a in acks] == [
+        ("created", None),
+        ("rejected", "invalid"),
+        ("rejected", "invalid"),
+    ]
+
+
+def test_out_of_range_amount_is_422(client, terminal):
+    _, headers = terminal
+    assert client.post("/transactions", json=sale(amount=1e20), headers=headers).status_code == 422
+    big_quantity = sale()
+    big_quantity["items"][0]["quantity"] = 10**12
+    assert client.post("/transactions", json=big_quantity, headers=headers).status_code == 422
+
+
+def test_scan_and_pay_with_a_bad_amount_is_a_400_page(client):
+    code = f"t{uuid.uuid4().hex[:8]}"
+    created = client.post(
+        "/terminals", json={"terminal_code": code, "password": "secret1", "store_name": "Test"}
+    ).json()
+    key = serialization.load_pem_private_key(created["ecdsa_private_key"].encode(), password=None)
+    item = {"product_id": "banan", "name": "Banan", "price": 4.5, "quantity": 1}
+
+    def checkout(total, items):
+        cart = json.dumps(
+            {"terminal_code": code, "idempotency_key": str(uuid.uuid4()), "total_amount": total, "items": items}
+        )
+        signature = base64.b64encode(key.sign(cart.encode(), ec.ECDSA(hashes.SHA256())))
+        return client.get(
+            "/mobile-checkout",
+            params={"payload": base64.b64encode(cart.encode()).decode(), "signature": signature.decode()},
+        )
+
+    assert checkout(4.5, [item]).status_code == 200
+    for total, items in [
+        ("lots", [item]),
+        (1e20, [item]),
+        (4.5, [{**item, "price": "NaN"}]),
+        (4.5, [{**item, "price": 1e20}]),
+        (4.5, [{**item, "quantity": 10**12}]),
+        (4.5, ["banan"]),
+    ]:
+        r = checkout(total, items)
+        assert (r.status_code, r.headers["content-type"].split(";")[0]) == (400, "text/html")
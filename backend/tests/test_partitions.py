@@ -0,0 +1,46 @@
+import os
+import sqlite3
+
+import pytest
+
+from app.config import settings
+
+from .conftest import sale
+
+
+def test_month_is_archived_in_chunks_and_stays_deduplicated(client, terminal, monkeypatch):
+    _, headers = terminal
+    monkeypatch.setattr(settings, "archive_chunk_size", 2)
+    old = [{**sale(), "occurred_at": f"2020-01-0{day}T12:00:00+00:00"} for day in range(1, 6)]
+    ids = [
+        client.post("/transactions", json=tx, headers=headers).json()["id"] for tx in old
+    ]
+
+    r = client.post("/admin/partitions/archive?live_months=1&export=true")
+    assert r.status_code == 200
+    (partition,) = [p for p in r.json() if p["month"] == "2020-01"]
+    assert (partition["row_count"], partition["min_id"], partition["max_id"]) == (5, min(ids), max(ids))
+    assert os.path.exists(partition["archive_path"])
+
+    # Re-sending an archived sale finds it in the sealed table
+    again = client.post("/sync/offline?ack=compact", json={"transactions": old}, headers=headers)
+    assert [(a["status"], a["id"]) for a in again.json()["acks"]] == [("duplicate", i) for i in ids]
+    listed = client.get("/admin/partitions").json()
+    assert [p["row_count"] for p in listed if p["month"] == "2020-01"] == [5]
+
+
+def test_sealed_tables_refuse_writes(client, terminal):
+    _, headers = terminal
+    client.post(
+        "/transactions", json={**sale(), "occurred_at": "2020-02-03T12:00:00+00:00"}, headers=headers
+    ).raise_for_status()
+    client.post("/admin/partitions/archive?live_months=1").raise_for_status()
+
+    with sqlite3.connect(settings.database_path) as db:
+        for statement in (
+            "UPDATE transactions_2020_02 SET total_ore = 0",
+            "DELETE FROM transactions_2020_02",
+            "INSERT INTO transactions_2020_02 SELECT * FROM transactions_2020_02",
+        ):
+            with pytest.raises(sqlite3.IntegrityError, match="sealed"):
+                db.execute(statement)
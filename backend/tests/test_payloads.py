@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+import aiosqlite
+
+from app.payloads import compact_payloads, read_payload
+
+PLAIN = {"items": [{"product_id": "banan", "name": "Banan", "price": 4.5, "quantity": 2}]}
+EXTRA_KEY = {"items": [{**PLAIN["items"][0], "barcode": "7310865004703"}]}
+SUB_ORE = {"items": [{**PLAIN["items"][0], "price": 4.505}]}
+# What older POS sales stored: the whole request dump
+BASELINE = {
+    "idempotency_key": "k1",
+    "total_amount": 9.0,
+    "items": PLAIN["items"],
+    "occurred_at": "2026-03-01 10:00:00",
+    "offline_created": False,
+    "payment": {"payment_type": "cash", "card": None, "invoice": None},
+}
+UNKNOWN_KEY = {**BASELINE, "loyalty_points": 12}
+
+
+async def _compact(payloads: list[dict]) -> tuple[dict, list]:
+    async with aiosqlite.connect(":memory:") as db:
+        await db.execute(
+            "CREATE TABLE transactions (id INTEGER PRIMARY KEY, payload_json TEXT, payload_blob BLOB)"
+        )
+        await db.executemany(
+            "INSERT INTO transactions (payload_json) VALUES (?)",
+            [(json.dumps(p),) for p in payloads],
+        )
+        report = await compact_payloads(lambda op: op(db), ["transactions"])
+        rows = await (
+            await db.execute("SELECT payload_blob, payload_json FROM transactions ORDER BY id")
+        ).fetchall()
+        return report, [(await read_payload(db, *row), row[0] is None) for row in rows]
+
+
+def test_compaction_keeps_what_packing_would_lose():
+    report, rows = asyncio.run(_compact([PLAIN, EXTRA_KEY, SUB_ORE, UNKNOWN_KEY]))
+    assert (report["rows"], report["skipped"]) == (1, 3)
+    assert rows == [(PLAIN, False), (EXTRA_KEY, True), (SUB_ORE, True), (UNKNOWN_KEY, True)]
+
+
+def test_request_fields_with_columns_of_their_own_are_dropped():
+    report, rows = asyncio.run(_compact([BASELINE] * 100))
+    assert (report["rows"], report["skipped"]) == (100, 0)
+    assert report["bytes_saved"] > 0
+    assert rows == [(PLAIN, False)] * 100
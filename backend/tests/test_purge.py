@@ -0,0 +1,63 @@
+import time
+
+from app import purge
+from app.config import settings
+from app.database import now_iso
+from app.writer import writer
+
+from .conftest import sale
+
+
+def _wait_for(client, terminal_id: int, status: str) -> dict:
+    for _ in range(200):
+        deletion = client.get(f"/dashboard/terminals/{terminal_id}/deletion").json()
+        if deletion["status"] == status:
+            return deletion
+        time.sleep(0.02)
+    raise AssertionError(f"deletion stuck at {deletion}")
+
+
+def _sell(client, headers, count: int) -> int:
+    for _ in range(count):
+        r = client.post("/transactions", json=sale(), headers=headers)
+    return r.json()["terminal_id"]
+
+
+def test_cancelled_purge_resumes_when_deleted_again(client, terminal, monkeypatch):
+    code, headers = terminal
+    terminal_id = _sell(client, headers, 5)
+    monkeypatch.setattr(settings, "purge_chunk_size", 1)
+    monkeypatch.setattr(settings, "purge_pause_ms", 100)
+
+    assert client.delete(f"/dashboard/terminals/{terminal_id}").status_code == 202
+    # Deactivated at once: it can no longer log in
+    login = client.post("/auth/login", json={"terminal_code": code, "password": "secret1"})
+    assert login.status_code in (401, 403)
+    client.post(f"/dashboard/terminals/{terminal_id}/deletion/cancel").raise_for_status()
+    cancelled = _wait_for(client, terminal_id, "cancelled")
+    assert 0 < cancelled["rows_deleted"] < 5
+
+    monkeypatch.setattr(settings, "purge_pause_ms", 0)
+    client.delete(f"/dashboard/terminals/{terminal_id}").raise_for_status()
+    done = _wait_for(client, terminal_id, "done")
+    assert (done["rows_deleted"], done["rows_total"]) == (5, 5)
+    assert terminal_id not in [t["id"] for t in client.get("/dashboard/terminals").json()]
+
+
+def test_purge_of_a_dead_worker_is_resumed(client, terminal):
+    _, headers = terminal
+    terminal_id = _sell(client, headers, 3)
+
+    async def orphan(db):
+        # What a worker that died mid-purge leaves behind
+        await db.execute(
+            f"""
+            INSERT INTO terminal_purges ({purge.PURGE_COLUMNS}, worker_pid)
+            VALUES (?, ?, 'Test', 'running', 3, 0, ?, ?, NULL, NULL, ?)
+            """,
+            (terminal_id, "gone", now_iso(), now_iso(), 2**22 + 1),  # above any pid_max
+        )
+
+    client.portal.call(writer.submit, orphan)
+    client.portal.call(purge.resume)
+    assert _wait_for(client, terminal_id, "done")["rows_deleted"] == 3
@@ -0,0 +1,52 @@
+from app.reconciliation import compute_digest
+
+from .conftest import sale
+
+
+def test_digests_match_terminal_side_and_drill_down_to_keys(client, terminal):
+    code, headers = terminal
+    for key in ("rec-1", "rec-2"):
+        client.post("/transactions", json=sale(key), headers=headers).raise_for_status()
+    count, digest = compute_digest(["rec-1", "rec-2"])
+
+    days = client.get(
+        "/dashboard/reconciliation/digests", params={"level": "day", "terminal_code": code}
+    ).json()
+    assert [(d["bucket"], d["tx_count"], d["digest"]) for d in days] == [
+        ("2026-10-19", count, digest)
+    ]
+    # 10:15+02:00 lands in the 08 UTC hour
+    keys = client.get(
+        "/dashboard/reconciliation/keys", params={"terminal_code": code, "bucket": "2026-10-19T08"}
+    ).json()
+    assert keys["idempotency_keys"] == ["rec-1", "rec-2"]
+
+    matched = client.post(
+        "/reconciliation/compare",
+        json={
+            "level": "day",
+            "digests": [{"bucket": "2026-10-19", "tx_count": count, "digest": digest}],
+        },
+        headers=headers,
+    ).json()
+    assert matched["matched"] == 1 and matched["mismatched"] == []
+
+    one_count, one_digest = compute_digest(["rec-1"])
+    r = client.post(
+        "/reconciliation/compare",
+        json={
+            "level": "hour",
+            "digests": [{"bucket": "2026-10-19T08", "tx_count": one_count, "digest": one_digest}],
+        },
+        headers=headers,
+    ).json()
+    assert r["matched"] == 0
+    assert r["mismatched"] == [
+        {
+            "bucket": "2026-10-19T08",
+            "server_count": 2,
+            "client_count": 1,
+            "server_digest": digest,
+            "client_digest": one_digest,
+        }
+    ]
@@ -0,0 +1,32 @@
+import httpx
+
+from app import relay, shards
+
+
+def _upstream(request: httpx.Request) -> httpx.Response:
+    if "bad" in request.headers["Authorization"]:
+        return httpx.Response(503)
+    return httpx.Response(200, json={"acks": [{"status": "rejected", "reason": "invalid"}]})
+
+
+def test_failing_terminal_backs_off_alone_and_rejects_are_kept(client, monkeypatch):
+    async def scenario():
+        async def queue(db):
+            await relay.enqueue(db, "relay-bad", "k1", {"idempotency_key": "k1"})
+            await relay.enqueue(db, "relay-ok", "k2", {"idempotency_key": "k2"})
+
+        await shards.main.writer.submit(queue)
+        transport = httpx.MockTransport(_upstream)
+        async with httpx.AsyncClient(transport=transport, base_url="http://up") as upstream:
+            first = await relay.forward(upstream)
+            second = await relay.forward(upstream)
+        return first, second, await relay.backlog(), await relay.dead_letters()
+
+    # The token stands in for the terminal, so upstream can tell them apart
+    monkeypatch.setattr(relay, "create_access_token", lambda code: code)
+    first, second, backlog, dead = client.portal.call(scenario)
+    assert first == (1, 1)
+    # The failed terminal waits out its backoff; nothing else was held back
+    assert second == (0, 0)
+    assert list(relay.status["retry_in_seconds"]) == ["relay-bad"]
+    assert (backlog, dead) == (1, 1)
@@ -0,0 +1,25 @@
+from .conftest import sale
+
+
+def test_history_compares_rollups_with_the_week_before(client, terminal):
+    code, headers = terminal
+    swish = {**sale(amount=10.0), "payment": {"payment_type": "swish"}}
+    earlier = {**sale(amount=40.0), "occurred_at": "2026-10-12T09:00:00+00:00"}
+    for body in (sale(), swish, earlier):
+        client.post("/transactions", json=body, headers=headers).raise_for_status()
+
+    r = client.get(
+        "/dashboard/history",
+        params={"period": "day", "reference": "2026-10-19T12:00:00Z", "terminal_code": code},
+    ).json()
+    assert r["granularity"] == "hour"
+    current, previous = r["current"], r["previous"]
+    assert current["total_sales"] == 35.0 and current["transactions"] == 2
+    assert current["by_payment_type"] == {"cash": 25.0, "swish": 10.0}
+    # 10:15+02:00 is bucketed by UTC hour
+    assert current["buckets"] == [
+        {"bucket": "2026-10-19T08", "total_sales": 35.0, "transactions": 2}
+    ]
+    assert previous["total_sales"] == 40.0 and previous["transactions"] == 1
+    assert r["sales_change_pct"] == -12.5
+    assert r["transactions_change_pct"] == 100.0
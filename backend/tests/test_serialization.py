@@ -0,0 +1,81 @@
+import json
+
+import pytest
+from pydantic import TypeAdapter
+
+from app import serialization
+from app.models import SyncStatusResponse, TerminalResponse, TransactionResponse
+from app.serialization import sync_status_json, terminals_json, transactions_json
+from app.timestamps import format_us, now_us
+
+BASE = 1_792_400_000_000_000  # 2026-10-19T08:53:20Z
+
+TRANSACTION_ROWS = [
+    (1, 3, "k-1", 2500, 1, BASE, BASE + 1, 0, "cash", None, None, 0, None),
+    (2, 3, "k-2", 1, 2, BASE + 123_456, BASE + 999_999, 1, "swish", "a@b.se", "M-1", 1, "verified"),
+    (3, 4, "k-3", 1999, 30, BASE - 86_400_000_000, BASE, 1, None, None, None, 0, "invalid"),
+    (4, 4, "k-4", 25_000_000, 1, 0, BASE + 10, 0, "invoice", None, "M-2", 1, None),
+]
+
+
+def terminal_rows() -> list[tuple]:
+    now = now_us()
+    return [
+        (1, "t-1", "Store A", 1, BASE, now, "PEM"),
+        (2, "t-2", "Store B", 0, BASE + 5, None, None),
+        (3, "t-3", "Store B", 1, BASE, now - 60_000_000, None),
+    ]
+
+
+SYNC_ROWS = [("t-1", 0, None), ("t-2", 5, BASE + 42)]
+
+
+def transaction_model(r: tuple) -> TransactionResponse:
+    return TransactionResponse(
+        id=r[0], terminal_id=r[1], idempotency_key=r[2], total_amount=r[3] / 100,
+        item_count=r[4], occurred_at=format_us(r[5]), created_at=format_us(r[6]),
+        synced_from_offline=bool(r[7]), payment_type=r[8], customer_email=r[9],
+        membership_number=r[10], is_invoice=bool(r[11]), signature_status=r[12],
+    )
+
+
+def terminal_model(r: tuple) -> TerminalResponse:
+    online = r[5] is not None and now_us() - r[5] <= 30_000_000
+    return TerminalResponse(
+        id=r[0], terminal_code=r[1], store_name=r[2], active=bool(r[3]),
+        created_at=format_us(r[4]), last_seen_at=format_us(r[5]),
+        status="online" if online else "offline", ecdsa_public_key=r[6],
+    )
+
+
+def sync_model(r: tuple) -> SyncStatusResponse:
+    return SyncStatusResponse(
+        terminal_code=r[0], pending_sync_count=r[1], last_synced_at=format_us(r[2])
+    )
+
+
+CASES = [
+    (TransactionResponse, lambda: TRANSACTION_ROWS, transactions_json, transaction_model),
+    (TerminalResponse, terminal_rows, terminals_json, terminal_model),
+    (SyncStatusResponse, lambda: SYNC_ROWS, sync_status_json, sync_model),
+]
+
+
+@pytest.mark.parametrize(
+    "model, rows, encode, build", CASES, ids=["transactions", "terminals", "sync-status"]
+)
+@pytest.mark.parametrize("encoder", ["orjson", "stdlib"])
+def test_fast_encoding_matches_response_models(model, rows, encode, build, encoder, monkeypatch):
+    if encoder == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    rows = rows()
+    adapter = TypeAdapter(list[model])
+    encoded = encode(rows)
+
+    # The same JSON response_model serialisation of the same rows gives, and
+    # it validates back into the models unchanged
+    expected = adapter.dump_json([build(r) for r in rows])
+    assert json.loads(encoded) == json.loads(expected)
+    assert adapter.dump_json(adapter.validate_json(encoded)) == expected
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import tempfile
+
+from .conftest import run_in_fresh_app
+
+
+def test_stores_get_their_own_files_and_reads_fan_out():
+    shard_dir = tempfile.mkdtemp()
+    run_in_fresh_app(
+        """
+        ids = {}
+        for store in ("Store A", "Store B"):
+            code = "t-" + store[-1]
+            client.post(
+                "/terminals", json={"terminal_code": code, "password": "secret1", "store_name": store}
+            ).raise_for_status()
+            token = client.post(
+                "/auth/login", json={"terminal_code": code, "password": "secret1"}
+            ).json()["access_token"]
+            r = client.post("/transactions", json=sale(), headers={"Authorization": "Bearer " + token})
+            ids[store] = r.json()["id"]
+
+        # Ids carry the shard number, one shard per store
+        assert len({i // 10**12 for i in ids.values()}) == 2 and min(ids.values()) > 10**12
+        listed = client.get("/dashboard/transactions").json()
+        assert sorted(t["id"] for t in listed) == sorted(ids.values())
+        assert client.get("/dashboard/stats").json()["total_transactions"] == 2
+        one_store = client.get("/export/transactions", params={"store_name": "Store B"}).text
+        assert len(one_store.splitlines()) == 2 and "Store B" in one_store
+        """,
+        SHARD_DIR=shard_dir,
+    )
+    files = sorted(name for name in os.listdir(shard_dir) if name.endswith(".db"))
+    assert files == ["store_0001.db", "store_0002.db"]
+
+
+def test_soft_deleted_terminal_is_updated_in_its_shard():
+    shard_dir = tempfile.mkdtemp()
+    run_in_fresh_app(
+        """
+        import time
+        from app.config import settings
+        client.post(
+            "/terminals",
+            json={"terminal_code": "t-del", "password": "secret1", "store_name": "Store A"},
+        ).raise_for_status()
+        token = client.post(
+            "/auth/login", json={"terminal_code": "t-del", "password": "secret1"}
+        ).json()["access_token"]
+        headers = {"Authorization": "Bearer " + token}
+        for _ in range(3):
+            r = client.post("/transactions", json=sale(), headers=headers)
+        terminal_id = r.json()["terminal_id"]
+
+        # Stop the purge after its first chunk, so the terminal stays soft-deleted
+        settings.purge_chunk_size, settings.purge_pause_ms = 1, 200
+        client.delete(f"/dashboard/terminals/{terminal_id}").raise_for_status()
+        client.post(f"/dashboard/terminals/{terminal_id}/deletion/cancel").raise_for_status()
+        for _ in range(100):
+            deletion = client.get(f"/dashboard/terminals/{terminal_id}/deletion").json()
+            if deletion["status"] == "cancelled":
+                break
+            time.sleep(0.02)
+        """,
+        SHARD_DIR=shard_dir,
+    )
+    with sqlite3.connect(os.path.join(shard_dir, "store_0001.db")) as db:
+        active, deleted_at = db.execute("SELECT active, deleted_at FROM terminals").fetchone()
+    assert active == 0 and deleted_at
@@ -0,0 +1,42 @@
+import os
+import sqlite3
+import tempfile
+
+from .conftest import run_in_fresh_app
+
+LOGIN = """
+client.post(
+    "/terminals", json={"terminal_code": "t-mem", "password": "secret1", "store_name": "Test"}
+)
+token = client.post(
+    "/auth/login", json={"terminal_code": "t-mem", "password": "secret1"}
+).json()["access_token"]
+headers = {"Authorization": "Bearer " + token}
+"""
+
+
+def test_memory_engine_snapshots_on_shutdown_and_loads_on_startup():
+    path = os.path.join(tempfile.mkdtemp(), "memory.db")
+    out = run_in_fresh_app(
+        LOGIN
+        + """
+print(client.post("/transactions", json=sale("kept"), headers=headers).json()["id"])
+""",
+        STORAGE_ENGINE="memory",
+        DATABASE_PATH=path,
+    )
+    first_id = int(out.split()[-1])
+    # Shutdown wrote the snapshot as an ordinary SQLite file
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT id FROM transactions").fetchall() == [(first_id,)]
+
+    run_in_fresh_app(
+        LOGIN
+        + f"""
+r = client.post("/transactions", json=sale("kept"), headers=headers)
+assert r.json()["id"] == {first_id}, r.text
+assert client.get("/dashboard/stats").json()["total_transactions"] == 1
+""",
+        STORAGE_ENGINE="memory",
+        DATABASE_PATH=path,
+    )
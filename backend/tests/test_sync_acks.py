@@ -0,0 +1,18 @@
+from app.models import SyncBitmapAckResponse, SyncCompactAckResponse
+
+from .conftest import sale
+
+
+def test_compact_and_bitmap_acks_match_their_models(client, terminal):
+    _, headers = terminal
+    first = sale()
+    batch = {"transactions": [first, sale(amount=-1.0)]}
+    compact = client.post("/sync/offline?ack=compact", json=batch, headers=headers).json()
+    SyncCompactAckResponse.model_validate(compact)
+    created, rejected = compact["acks"]
+    assert "errors" not in created and rejected["errors"]
+
+    batch = {"transactions": [first, {**sale(), "total_amount": "x"}]}
+    bitmap = client.post("/sync/offline?ack=bitmap", json=batch, headers=headers).json()
+    assert SyncBitmapAckResponse.model_validate(bitmap).model_dump() == bitmap
+    assert (bitmap["duplicate"], bitmap["rejected"], bitmap["reasons"]) == ("AQ==", "Ag==", {"1": "invalid"})
@@ -0,0 +1,20 @@
+def test_range_too_long_is_rejected(client):
+    r = client.get(
+        "/dashboard/timeseries",
+        params={"resolution": "hour", "start": "0001-01-01T00:00:00Z", "end": "9999-12-31T00:00:00Z"},
+    )
+    assert r.status_code == 422
+    r = client.get(
+        "/dashboard/timeseries",
+        params={"start": "0001-01-01T00:00:00Z", "end": "9999-12-31T00:00:00Z"},
+    )
+    assert r.status_code == 422
+
+
+def test_range_within_limit(client):
+    r = client.get(
+        "/dashboard/timeseries",
+        params={"resolution": "day", "start": "2000-01-01T00:00:00Z", "end": "2026-01-01T00:00:00Z"},
+    )
+    assert r.status_code == 200
+    assert r.json()["source_points"] == 9497
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from app import metrics
+from app.writer import Writer
+
+
+def _insert(value: int, callbacks: list, writer: Writer, path: str):
+    async def op(db):
+        await db.execute("INSERT INTO t (v) VALUES (?)", (value,))
+        if value < 0:
+            raise ValueError("bad value")
+        # Runs only after the group commits: another connection sees the row then
+        writer.after_commit(
+            lambda: callbacks.append(
+                sqlite3.connect(path).execute("SELECT COUNT(*) FROM t WHERE v = ?", (value,)).fetchone()[0]
+            )
+        )
+        return value
+
+    return op
+
+
+async def _scenario(path: str):
+    writer = Writer(max_batch=10, max_delay=0.05, database=path)
+    await writer.start()
+    try:
+        commits = metrics.snapshot()["counters"].get("writer.commits", 0)
+        callbacks: list = []
+        results = await asyncio.gather(
+            *(writer.submit(_insert(v, callbacks, writer, path)) for v in (1, -1, 2)),
+            return_exceptions=True,
+        )
+        grouped = metrics.snapshot()["counters"]["writer.commits"] - commits
+    finally:
+        await writer.stop()
+    return results, callbacks, grouped
+
+
+def test_group_commits_once_and_rolls_back_only_the_failed_op():
+    path = os.path.join(tempfile.mkdtemp(), "writer.db")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE cache_generations (name TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+        db.execute("CREATE TABLE t (v INTEGER)")
+    results, callbacks, grouped = asyncio.run(_scenario(path))
+    assert results[0] == 1 and results[2] == 2
+    with pytest.raises(ValueError):
+        raise results[1]
+    assert grouped == 1
+    # Both good ops' callbacks saw their row committed; the failed op's never ran
+    assert callbacks == [1, 1]
+    rows = sqlite3.connect(path).execute("SELECT v FROM t ORDER BY rowid").fetchall()
+    assert rows == [(1,), (2,)]
@@ -84,7 +84,7 @@ export function DashboardApp() {
         return
       }
 
-      setNotice(`Terminal "${terminalCode}" deleted successfully.`)
+      setNotice(`Terminal "${terminalCode}" deactivated; its transactions are being deleted in the background.`)
       load()
     } catch {
       setNotice('Failed to delete terminal.')
@@ -121,6 +121,55 @@ const generatePaymentDetails = (paymentType, totalAmount) => {
   return payment
 }
 
+// Canonical form of an offline batch for its signature; must match
+// canonical_batch in backend/app/batch_signing.py token for token
+const PAYMENT_GROUPS = [
+  ['credit_card', ['card_number', 'card_type', 'expiry_month', 'expiry_year']],
+  ['swish', ['phone_number', 'transaction_id']],
+  ['mobile_pay', ['device_id', 'transaction_token']],
+  ['invoice', ['customer_email', 'membership_number', 'is_member']]
+]
+
+const canonicalField = (value) => {
+  if (value === null || value === undefined) return '-'
+  const text = String(typeof value === 'boolean' ? Number(value) : value)
+  return `${new TextEncoder().encode(text).length}:${text}`
+}
+
+const toOre = (amount) => (amount === null || amount === undefined ? null : Math.round(amount * 100))
+
+const canonicalBatch = (transactions) => {
+  const tokens = [canonicalField('batch-v2'), canonicalField(transactions.length)]
+  for (const tx of transactions) {
+    tokens.push(
+      canonicalField(tx.idempotency_key),
+      canonicalField(toOre(tx.total_amount)),
+      canonicalField(Date.parse(tx.occurred_at)),
+      canonicalField(tx.items.length)
+    )
+    for (const item of tx.items) {
+      tokens.push(
+        canonicalField(item.product_id),
+        canonicalField(item.name),
+        canonicalField(item.quantity),
+        canonicalField(toOre(item.price))
+      )
+    }
+    const payment = tx.payment
+    if (!payment) {
+      tokens.push('-')
+      continue
+    }
+    tokens.push('+' + canonicalField(payment.payment_type))
+    for (const [name, fields] of PAYMENT_GROUPS) {
+      const group = payment[name]
+      tokens.push(group ? '+' + fields.map((field) => canonicalField(group[field])).join('') : '-')
+    }
+    tokens.push(canonicalField(toOre(payment.cash_tendered)), canonicalField(toOre(payment.cash_change)))
+  }
+  return tokens.join('')
+}
+
 export function App() {
   const [terminalCode, setTerminalCode] = useState(localStorage.getItem(TERMINAL_CODE_KEY) || 'terminal001')
   const [password, setPassword] = useState('password')
@@ -303,13 +352,17 @@ export function App() {
       if (!queue.length) return
 
       try {
+        // Signed with the terminal key when one is stored (see Terminal Info)
+        const batch_signature = localStorage.getItem(PRIVATE_KEY_KEY)
+          ? await signData(canonicalBatch(queue))
+          : undefined
         const res = await fetch(`${API_BASE}/sync/offline`, {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
             Authorization: `Bearer ${token}`
           },
-          body: JSON.stringify({ transactions: queue })
+          body: JSON.stringify({ transactions: queue, batch_signature })
         })
 
         if (res.ok) {